@@ -0,0 +1,304 @@
+import math
+import random
+import threading
+
+from classify_logic import TechniqueLimits, classify_sequence, matches_targets
+from constructive_generater import digit_base_count
+
+# 1世代（分布を更新する単位）で引く候補数
+GENERATION_SIZE = 200
+# 目標に近い順に上位何割を、次の分布の手本（エリート）にするか
+ELITE_FRACTION = 0.1
+# 1回の更新で、エリートの頻度にどれだけ寄せるか（残りは今の分布を保つ）
+SMOOTHING = 0.5
+# どの選び方も引ける確率を残すため、常に一様分布をこの割合で混ぜる
+UNIFORM_FLOOR = 0.01
+# シード指定の生成で使う分布を学習する世代数（学習した分布は固定して、すべての問題番号で共有する）
+WARMUP_GENERATIONS = 40
+# 学習中に、1世代の一致率がこれを超えたら学習を打ち切る
+WARMUP_MATCH_RATE = 0.2
+# 作った AdaptiveSampler を設定と目標ごとに残しておく数
+SAMPLER_CACHE_SIZE = 8
+
+_sampler_cache = {}
+_sampler_cache_lock = threading.Lock()
+
+
+class AdaptiveSampler:
+    """
+    目標に一致した候補（まだ無ければ目標に近い候補）から、数字・0の位置・マイナスの位置の選び方を学習し、
+    目標の技法カウントが出やすい候補を多く引く（クロスエントロピー法）
+    候補は1口ずつ、どの口を0の項・マイナスの項にするか、0をどの位に置くか、各位の数字を学習した分布から選んで作る
+    数字は create_digits_pool と同じく1～9をそれぞれ base_count 回以上使うように、残りの位が足りない数字の数と
+    同じになったら、足りない数字だけから選ぶ
+    各位の数字は、その位の珠の状態（累積和のその位の数字。下の位からの繰り上がり・繰り下がりを含む）と
+    符号ごとに分布を持つ（どの技法が起きるかは、その位の珠の状態と足し引きする数字で決まるため）
+    （最初は一様で、GENERATION_SIZE 個引くごとにエリートの頻度に寄せる）
+
+    一致した候補はすべて使うので、目標に一致する問題の中での出方は学習した分布に偏る
+    （偏りのない出方が必要なら、ランダム生成か厳密抽出を使う）
+    """
+
+    def __init__(self, num_digits, num_lines, zero_count, minus_count, targets):
+        if num_digits < 2:
+            raise ValueError(f"AdaptiveSampler は {num_digits} 桁に対応していません。")
+        if minus_count >= num_lines or zero_count > num_lines:
+            raise ValueError("マイナスの数・0の数が口数に対して多すぎます。")
+        if isinstance(targets, dict):
+            targets = TechniqueLimits(**targets)
+        self.num_digits = num_digits
+        self.num_lines = num_lines
+        self.zero_count = zero_count
+        self.minus_count = minus_count
+        self.targets = targets
+        self.base_count = digit_base_count(num_digits, num_lines, zero_count)
+        self.learning = True
+        # 学習する分布（どれも確率のリスト）
+        # digits[位][符号][珠の状態]: 数字1～9の確率（位は0が一の位、符号は0が足し算・1が引き算、珠の状態は0～9）
+        self.digits = [[[_uniform(9) for _ in range(10)] for _ in range(2)] for _ in range(num_digits)]
+        # 0を置く位（最上位以外）
+        self.zero_places = _uniform(num_digits - 1)
+        # 0の項にする口と、マイナスにする口（最初の口は正なので、口1～から選ぶ）
+        self.zero_lines = _uniform(num_lines)
+        self.minus_lines = _uniform(num_lines - 1)
+        self.generations = 0
+        self.drawn = 0
+        self.matched = 0
+        self._generation = []
+        self._generation_drawn = 0
+        self._lock = threading.Lock()
+        self._cumulative = None
+        self._refresh()
+
+    def _refresh(self):
+        # rng.choices 用に累積確率を作り直す
+        self._cumulative = (
+            [[[_cumulate(probs) for probs in states] for states in signs] for signs in self.digits],
+            _cumulate(self.zero_places),
+        )
+
+    def draw(self, rng=None):
+        """
+        候補を1つ引いて判定する
+        戻り値: (数列, TechniqueCounts)（条件を満たさない候補なら None）
+        目標との一致は matches_targets(counts, self.targets) で確かめる（学習中なら結果を学習にも使う）
+        """
+        rng = rng or random
+        num_digits = self.num_digits
+        with self._lock:
+            if self.learning:
+                if self._generation_drawn >= GENERATION_SIZE:
+                    self._update()
+                self._generation_drawn += 1
+            # ほかのスレッドの _update で分布が置き換わっても、1つの候補は同じ世代の分布から引く
+            digit_probs, zero_line_probs, minus_line_probs = self.digits, self.zero_lines, self.minus_lines
+            digit_cumulative, zero_place_cumulative = self._cumulative
+            self.drawn += 1
+
+        # 選んだものを、学習のために記録する
+        zero_lines = _draw_subset(rng, zero_line_probs, self.zero_count)
+        minus_lines = _draw_subset(rng, minus_line_probs, self.minus_count)
+        zero_set = set(zero_lines)
+        minus_set = {line + 1 for line in minus_lines}
+        min_sum = 10 ** (num_digits - 1)
+        max_sum = (10 ** (num_digits + 1)) - 1
+
+        terms = []
+        used_abs = set()
+        # 1～9の使用回数と、base_count に足りない数の合計、残りの（0以外の数字を置く）位の数
+        digit_usage = [0] * 10
+        deficit = 9 * self.base_count
+        slots = (self.num_lines - self.zero_count) * num_digits + self.zero_count * (num_digits - 1)
+        zero_places = []
+        chosen_digits = []
+        current_sum = 0
+        for line in range(self.num_lines):
+            zero_place = -1
+            if line in zero_set:
+                zero_place = rng.choices(range(num_digits - 1), cum_weights=zero_place_cumulative)[0]
+                zero_places.append(zero_place)
+            sign = 1 if line in minus_set else 0
+            term = 0
+            line_digits = []
+            for place in range(num_digits):
+                if place == zero_place:
+                    line_digits.append(0)
+                    continue
+                # 下の位まで足し引きした後の、この位の珠の状態
+                state = ((current_sum - term if sign else current_sum + term) // 10 ** place) % 10
+                probs = digit_probs[place][sign][state]
+                # 残りの位をすべて、足りない数字に使わなければならないか
+                tight = deficit >= slots
+                if place < num_digits - 1 and not tight:
+                    digit = rng.choices(range(1, 10), cum_weights=digit_cumulative[place][sign][state])[0]
+                else:
+                    # 最上位の数字は、項が条件（ゾロ目・絶対値の重複・累積和の範囲）を満たすものだけから選ぶ
+                    # 数字の偏りの条件がきついときは、足りない数字だけから選ぶ
+                    allowed = [d for d in range(1, 10)
+                               if (not tight or digit_usage[d] < self.base_count)
+                               and (place < num_digits - 1
+                                    or _allowed_term(term + d * 10 ** place,
+                                                     zero_place < 0 and set(line_digits) == {d},
+                                                     current_sum, sign, used_abs, min_sum, max_sum))]
+                    if not allowed:
+                        return None
+                    digit = rng.choices(allowed, weights=[probs[d - 1] for d in allowed])[0]
+                slots -= 1
+                if digit_usage[digit] < self.base_count:
+                    deficit -= 1
+                digit_usage[digit] += 1
+                term += digit * 10 ** place
+                line_digits.append(digit)
+                chosen_digits.append((place, sign, state, digit))
+            used_abs.add(term)
+            current_sum += -term if sign else term
+            terms.append(-term if sign else term)
+
+        counts = classify_sequence(terms, num_digits)
+        distance = _distance(counts, self.targets)
+        with self._lock:
+            if distance == 0:
+                self.matched += 1
+            if self.learning:
+                self._generation.append((distance, (zero_lines, minus_lines, zero_places, chosen_digits)))
+        return terms, counts
+
+    def warm_up(self, rng=None, generations=WARMUP_GENERATIONS, match_rate=WARMUP_MATCH_RATE):
+        """
+        一致率が match_rate を超えるか、generations 世代引くまで学習し、その後は分布を固定する
+        （同じ rng の状態から学習すれば、同じ分布になる）
+        """
+        rng = rng or random
+        target_generation = self.generations + generations
+        while self.generations < target_generation:
+            matched = 0
+            for _ in range(GENERATION_SIZE):
+                candidate = self.draw(rng)
+                if candidate is not None and matches_targets(candidate[1], self.targets):
+                    matched += 1
+            with self._lock:
+                self._update()
+            if matched / GENERATION_SIZE >= match_rate:
+                break
+        self.learning = False
+        return self
+
+    def match_rate(self):
+        """これまでに引いた候補のうち、目標に一致した割合"""
+        with self._lock:
+            return self.matched / self.drawn if self.drawn else 0.0
+
+    def _update(self):
+        # 目標に近い上位 ELITE_FRACTION（一致した候補がそれより多ければそのすべて）の頻度に寄せる
+        candidates = sorted(self._generation, key=lambda item: item[0])
+        self._generation = []
+        self._generation_drawn = 0
+        self.generations += 1
+        if not candidates:
+            return
+        elite_count = max(1, math.ceil(GENERATION_SIZE * ELITE_FRACTION))
+        threshold = candidates[min(elite_count, len(candidates)) - 1][0]
+        elites = [choices for distance, choices in candidates if distance <= threshold]
+
+        num_digits = self.num_digits
+        digit_counts = [[[[0] * 9 for _ in range(10)] for _ in range(2)] for _ in range(num_digits)]
+        zero_place_counts = [0] * (num_digits - 1)
+        zero_line_counts = [0] * self.num_lines
+        minus_line_counts = [0] * (self.num_lines - 1)
+        for zero_lines, minus_lines, zero_places, chosen_digits in elites:
+            for line in zero_lines:
+                zero_line_counts[line] += 1
+            for line in minus_lines:
+                minus_line_counts[line] += 1
+            for place in zero_places:
+                zero_place_counts[place] += 1
+            for place, sign, state, digit in chosen_digits:
+                digit_counts[place][sign][state][digit - 1] += 1
+
+        self.digits = [[[_smooth(probs, counts) for probs, counts in zip(state_probs, state_counts)]
+                        for state_probs, state_counts in zip(sign_probs, sign_counts)]
+                       for sign_probs, sign_counts in zip(self.digits, digit_counts)]
+        self.zero_places = _smooth(self.zero_places, zero_place_counts)
+        self.zero_lines = _smooth(self.zero_lines, zero_line_counts)
+        self.minus_lines = _smooth(self.minus_lines, minus_line_counts)
+        self._refresh()
+
+
+def get_adaptive_sampler(num_digits, num_lines, zero_count, minus_count, limits, frozen=False):
+    """
+    設定と目標ごとに AdaptiveSampler を作り、最近使ったものを使い回す（学習した分布を次の生成に引き継ぐ）
+    frozen=True なら、設定と目標だけから決まる乱数で学習を済ませて固定した分布を返す
+    （シード指定の生成用。どのプロセス・どの問題番号から使っても同じ分布になる）
+    """
+    key = (num_digits, num_lines, zero_count, minus_count, tuple(limits.limits), frozen)
+    with _sampler_cache_lock:
+        sampler = _sampler_cache.pop(key, None)
+        if sampler is None:
+            sampler = AdaptiveSampler(num_digits, num_lines, zero_count, minus_count, limits)
+            if frozen:
+                sampler.warm_up(random.Random(f"adaptive:{key[:5]}"))
+            if len(_sampler_cache) >= SAMPLER_CACHE_SIZE:
+                del _sampler_cache[next(iter(_sampler_cache))]
+        _sampler_cache[key] = sampler
+    return sampler
+
+
+def clear_adaptive_samplers():
+    """使い回している AdaptiveSampler をすべて捨てる（次の生成は一様な分布から学習し直す）"""
+    with _sampler_cache_lock:
+        _sampler_cache.clear()
+
+
+def _uniform(size):
+    return [1 / size] * size
+
+
+def _cumulate(probs):
+    cumulative = []
+    total = 0.0
+    for p in probs:
+        total += p
+        cumulative.append(total)
+    return cumulative
+
+
+def _smooth(probs, counts):
+    # 今の分布をエリートの頻度に SMOOTHING だけ寄せ、一様分布を UNIFORM_FLOOR だけ混ぜる
+    total = sum(counts)
+    if total == 0:
+        return probs
+    size = len(probs)
+    return [(1 - UNIFORM_FLOOR) * ((1 - SMOOTHING) * p + SMOOTHING * c / total) + UNIFORM_FLOOR / size
+            for p, c in zip(probs, counts)]
+
+
+def _draw_subset(rng, probs, count):
+    """probs に比例した確率で、重複なしに count 個の番号を順に選ぶ"""
+    chosen = []
+    remaining = 1.0
+    for _ in range(count):
+        threshold = rng.random() * remaining
+        total = 0.0
+        pick = None
+        for index, p in enumerate(probs):
+            if index in chosen:
+                continue
+            total += p
+            pick = index
+            if total > threshold:
+                break
+        remaining -= probs[pick]
+        chosen.append(pick)
+    return chosen
+
+
+def _allowed_term(term, repdigit, current_sum, sign, used_abs, min_sum, max_sum):
+    # ゾロ目でなく、絶対値が重複せず、足し引きした後の累積和が範囲内に収まる項か
+    if repdigit or term in used_abs:
+        return False
+    return min_sum <= (current_sum - term if sign else current_sum + term) <= max_sum
+
+
+def _distance(counts, targets):
+    # 指定した技法の、目標との差の合計（一致なら0）
+    return sum(abs(count - target) for count, target in zip(counts, targets.limits) if target is not None)
@@ -1,14 +1,107 @@
 import streamlit as st
+import os
+import re
 import time
 
 # 既存のロジックファイルをインポート
-from p5_logic import count_p5_in_sequence
-from p10_logic import count_p10_in_sequence
-from p15_logic import count_p15_in_sequence
-from m5_logic import count_m5_in_sequence
-from m10_logic import count_m10_in_sequence
-from m15_logic import count_m15_in_sequence
-from problem_generater import generate_single_problem, format_formula
+from classify_logic import TechniqueCounts, TechniqueLimits, trace_sequence
+from problem_generater import MODE_ADAPTIVE, MODE_BATCH, MODE_EXACT, MODE_RANDOM, MODE_TARGETED, \
+    iter_problems
+from parallel_generater import iter_problems_parallel
+from problem_bank import DEFAULT_BANK_PATH, ProblemBank
+from candidate_cache import CandidateCache
+from feasibility_logic import estimate_feasibility
+from stats_logic import GenerationStats
+from generation_job import CurriculumJob, GenerationJob
+from dedup_index import DEFAULT_DEDUP_PATH, DedupIndex, open_dedup_index
+from profile_logic import GenerationProfiler, profiling_enabled
+from curriculum_planner import CurriculumRequest, iter_curriculum
+from generation_service import SERVICE_URL_ENV, request_problems
+from problem_set import ProblemSet
+
+# 生成の制限時間（秒）と、生成中に画面を更新する間隔（秒）
+TIMEOUT_SECONDS = 60
+REFRESH_SECONDS = 0.5
+# 1回の生成（プリント1枚分）の中での重複チェックに使う容量
+WORKSHEET_DEDUP_CAPACITY = 1000
+# 指定されていれば、生成をこのプロセスで行わず generation_service に頼む
+SERVICE_URL = os.environ.get(SERVICE_URL_ENV)
+
+
+def slow_generation_message(report, workers=1):
+    """
+    見積もり（FeasibilityReport）から、制限時間内に作れそうにないときの知らせを作る（作れそうなら None）
+    workers: 複数プロセスで生成するときのワーカー数（見込み時間をこの数で割る）
+    """
+    if report.hits == 0:
+        return (f"{report.trials}回試して目標に一致する問題が1問も見つからず、"
+                f"制限時間{TIMEOUT_SECONDS}秒で作れるか分かりません。")
+    expected_seconds = report.expected_seconds / workers
+    if expected_seconds <= TIMEOUT_SECONDS:
+        return None
+    return (f"見込み時間が約{int(min(expected_seconds, 10 ** 9))}秒と、"
+            f"制限時間{TIMEOUT_SECONDS}秒を超えています（一致率の見積もり: {report.acceptance_rate:.2e}）。")
+
+
+def check_first(produce, config, limits, needed, mode, workers, notices, force):
+    """
+    produce(cancel_event) を包み、目標の達成可能性と見込み時間の見積もりを生成スレッドの中で行ってから生成する
+    （厳密抽出の数え上げや探索生成の試行は数秒かかることがあるので、画面の処理を止めない）
+    作れない組み合わせや、制限時間内に作れそうにない条件（force なら知らせるだけ）は ValueError にする
+    厳密抽出で数え切れない設定は、ランダム生成の試行で見積もり、produce(cancel_event, MODE_RANDOM) で作る
+    notices: 画面に出す知らせを追加するリスト
+    """
+    def checked(cancel_event):
+        report = estimate_feasibility(*config, limits, needed, mode=mode, time_budget=0.3)
+        if not report.feasible:
+            raise ValueError("指定された難易度の組み合わせは作れません。\n" + "\n".join(report.reasons))
+        if mode == MODE_EXACT and report.method == "dp":
+            yield from produce(cancel_event, MODE_EXACT)
+            return
+        if mode == MODE_EXACT:
+            notices.append("厳密抽出では数え切れないため、ランダム生成で作ります（" + " ".join(report.reasons) + "）")
+        message = slow_generation_message(report, workers)
+        if message is not None and not force:
+            raise ValueError(message + "条件を緩めるか、「見込み時間が長くても生成する」を選んでください。")
+        if message is not None:
+            notices.append(message)
+        if mode == MODE_EXACT:
+            yield from produce(cancel_event, MODE_RANDOM)
+        else:
+            yield from produce(cancel_event)
+    return checked
+
+
+def parse_curriculum(text, default_count):
+    """
+    「P5=1 P10=2 M10=1 10問」のような1行1難易度の指定を、(目標の辞書, 問題数, 行) のリストにする
+    問題数を省略した行は default_count 問
+    """
+    levels = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        targets = {name.lower(): int(value) for name, value in re.findall(r"([A-Za-z]+\d*)\s*=\s*(\d+)", line)}
+        unknown = set(targets) - set(TechniqueCounts._fields)
+        if unknown:
+            raise ValueError(f"「{line}」の {', '.join(sorted(unknown))} は技法の名前ではありません。")
+        count = re.search(r"(\d+)\s*問", line)
+        levels.append((targets, int(count.group(1)) if count else default_count, line))
+    return levels
+
+
+@st.cache_resource
+def get_candidate_cache():
+    # 目標に一致しなかった問題をセッションをまたいで保持する
+    return CandidateCache()
+
+
+@st.cache_resource
+def get_dedup_index():
+    # これまでに出した問題をセッションをまたいで保持する（保存済みのファイルがあれば読み込む）
+    return open_dedup_index(DEFAULT_DEDUP_PATH)
+
 
 # --- 設定とタイトル ---
 st.set_page_config(page_title="計算問題ジェネレーター", layout="centered")
@@ -18,11 +111,32 @@ st.markdown("条件を指定して問題を生成できます")
 # --- サイドバー：条件設定 ---
 st.sidebar.header("設定")
 
-digit_count = st.sidebar.number_input("桁数", min_value=2, max_value=3, value=2)
-num_lines = st.sidebar.number_input("口数", min_value=1, max_value=10, value=8)
-zero_count = st.sidebar.number_input("0の数", min_value=0, max_value=10, value=2)
-minus_count = st.sidebar.number_input("マイナスの数", min_value=0, max_value=9, value=3)
+digit_count = st.sidebar.number_input("桁数", min_value=2, max_value=5, value=2)
+num_lines = st.sidebar.number_input("口数", min_value=1, max_value=15, value=8)
+zero_count = st.sidebar.number_input("0の数", min_value=0, max_value=15, value=2)
+minus_count = st.sidebar.number_input("マイナスの数", min_value=0, max_value=14, value=3)
 num_questions = st.sidebar.number_input("生成する問題数", min_value=1, max_value=50, value=5)
+generation_modes = {
+    "探索生成（目標から組み立て）": MODE_TARGETED,
+    "一括生成（NumPy）": MODE_BATCH,
+    "厳密抽出（数え上げて一様に選ぶ）": MODE_EXACT,
+    "適応生成（一致しやすい選び方を学習）": MODE_ADAPTIVE,
+    "ランダム生成": MODE_RANDOM,
+}
+# 4桁以上は、ランダム・一括・探索生成では目標に一致する問題が制限時間内にほとんど見つからないので、適応生成を既定にする
+default_mode = MODE_ADAPTIVE if digit_count >= 4 else MODE_TARGETED
+generation_mode = st.sidebar.radio("生成方式", list(generation_modes),
+                                   index=list(generation_modes.values()).index(default_mode))
+cpu_count = os.cpu_count() or 1
+worker_count = st.sidebar.number_input("並列ワーカー数", min_value=1, max_value=cpu_count, value=cpu_count)
+force_generation = st.sidebar.checkbox("見込み時間が長くても生成する", value=False)
+collect_stats = st.sidebar.checkbox("生成の統計を記録する", value=False)
+exclude_issued = st.sidebar.checkbox("これまでに出した問題を除く", value=False)
+seed_text = st.sidebar.text_input("シード（同じシードと設定なら同じ問題を作り直せる。空欄ならランダム）", value="")
+# 計測のトグルは、環境変数 GENERATION_PROFILE か URL の ?profile=1 を指定したときだけ表示する
+profile_generation = False
+if profiling_enabled() or st.query_params.get("profile") == "1":
+    profile_generation = st.sidebar.checkbox("生成を計測する（cProfile / tracemalloc）", value=profiling_enabled())
 
 st.sidebar.divider()
 st.sidebar.subheader("難易度調整")
@@ -42,111 +156,286 @@ if st.button("問題を生成する", type="primary"):
 
     if minus_count >= num_lines:
         st.error("エラー: マイナスの回数が口数以上です。")
-    elif digit_count == 2 and zero_count > num_lines:
+    elif zero_count > num_lines:
         st.error("エラー: 0の回数が口数を超えています。")
     else:
-        problems = []
-        attempts = 0
+        # 前回の生成がまだ動いていれば止める
+        previous_job = st.session_state.get("generation_job")
+        if previous_job is not None:
+            previous_job.cancel()
+
+        # 項とカウントを配列に詰めて持ち、式の文字列は表示やダウンロードのときだけ作る
+        problems = ProblemSet(digit_count, num_lines)
         max_attempts = 100000  # ループ回数制限
 
-        timeout_seconds = 60
-        start_time = time.time()
-        last_time_display = -1
-
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        timer_text = st.empty()
-
-        # --- 生成ループ ---
-        while len(problems) < num_questions and attempts < max_attempts:
-            # タイムアウトチェック
-            elapsed_time = time.time() - start_time
-            current_sec = int(elapsed_time)
-            if current_sec != last_time_display:
-                timer_text.text(f"経過時間: {current_sec}秒 / {timeout_seconds}秒")
-                last_time_display = current_sec
-            if elapsed_time > timeout_seconds:
-                st.warning(f"処理時間が{timeout_seconds}秒を超えたため、生成を中断しました。")
-                break
-
-            attempts += 1
-
-            # 既存の関数を利用して単一問題を生成
-            result = generate_single_problem(digit_count, num_lines, zero_count, minus_count)
-
-            if result:
-                terms, ans = result
-
-                # もしp5が一致しなければ、他の計算をする前にスキップしたほうが高速
-                p5 = count_p5_in_sequence(terms, digit_count)
-                if p5 != target_p5_count:
-                    continue
-
-                p10 = count_p10_in_sequence(terms, digit_count)
-                if p10 != target_p10_count:
-                    continue
-
-                p15 = count_p15_in_sequence(terms, digit_count)
-                if p15 != target_p15_count:
-                    continue
-
-                m5 = count_m5_in_sequence(terms, digit_count)
-                if m5 != target_m5_count:
-                    continue
-
-                m10 = count_m10_in_sequence(terms, digit_count)
-                if m10 != target_m10_count:
-                    continue
-
-                m15 = count_m15_in_sequence(terms, digit_count)
-                if m15 != target_m15_count:
-                    continue
-
-                formatted_q = format_formula(terms, ans)
-                problems.append({
-                    "formula": formatted_q,
-                    "ans": ans,
-                    "p5": p5,
-                    "p10": p10,
-                    "p15": p15,
-                    "m5": m5,
-                    "m10": m10,
-                    "m15": m15,
-                    "terms": terms
-                })
-
-                # 進捗バー更新
-                progress_bar.progress(len(problems) / num_questions)
-
-        status_text.empty()
-        progress_bar.empty()
-
-        # --- 結果表示 ---
-        if len(problems) < num_questions:
-            st.warning(f"{len(problems)}問しか生成できませんでした。条件が厳しい可能性があります。")
+        # 目標値を上限として渡し、超えた時点で判定を打ち切る
+        limits = TechniqueLimits(p5=target_p5_count, m5=target_m5_count, p10=target_p10_count,
+                                 m10=target_m10_count, p15=target_p15_count, m15=target_m15_count)
+
+        config = (digit_count, num_lines, zero_count, minus_count)
+        candidate_cache = get_candidate_cache()
+        stats = GenerationStats() if collect_stats else None
+        # 同じ問題（項の順序違いを含む）を2回出さない
+        dedup = get_dedup_index() if exclude_issued else DedupIndex(WORKSHEET_DEDUP_CAPACITY)
+        # シードを指定したときは、キャッシュや問題バンクを使わずシードだけで問題を決める
+        seed = seed_text.strip() or None
+
+        # --- 以前の生成で余った問題のうち、目標に一致するものを先に使う ---
+        if seed is None:
+            problems.extend(p for p in candidate_cache.take(config, limits, num_questions) if dedup.add(p[0]))
+
+        # --- 事前生成した問題バンクがあれば、次にそこから取り出す ---
+        if seed is None and len(problems) < num_questions and os.path.exists(DEFAULT_BANK_PATH):
+            with ProblemBank(DEFAULT_BANK_PATH) as bank:
+                problems.extend(p for p in bank.sample(config, limits, num_questions - len(problems))
+                                if dedup.add(p[0]))
+
+        def keep_surplus(terms, ans, counts):
+            candidate_cache.add(config, terms, ans, counts)
+
+        mode = generation_modes[generation_mode]
+        run_live = len(problems) < num_questions
+        # 厳密抽出は数え上げ結果を、適応生成は学習した分布をプロセス内で使い回すので、並列化しない
+        # （シード指定の適応生成は、固定した分布を使うので並列化できる）
+        parallel = mode != MODE_EXACT and (mode != MODE_ADAPTIVE or seed is not None)
+        # 計測するときは、このプロセスの中で生成する
+        use_service = bool(SERVICE_URL) and not profile_generation
+        # 計測するときは、ワーカープロセスの中は測れないので1プロセスで生成する
+        # （見込み時間をワーカー数で割るのも、複数プロセスで生成するときだけ）
+        use_workers = not use_service and worker_count > 1 and parallel and not profile_generation
+
+        if not run_live:
+            # 必要な数がそろっているので生成しない
+            produce = None
+        elif use_service:
+            # --- 生成サービスに頼む（同じ設定のほかのセッションの生成とまとめて、共有のワーカーで作られる） ---
+            def produce(cancel_event, needed=num_questions - len(problems)):
+                start = time.time()
+                found = 0
+                # このセッションで出題済みの問題を除いた分が足りなければ、制限時間内で頼み直す
+                while found < needed and not cancel_event.is_set():
+                    remaining = TIMEOUT_SECONDS - (time.time() - start)
+                    if remaining <= 0:
+                        return
+                    received = request_problems(SERVICE_URL, config, limits, needed - found, mode=mode, seed=seed,
+                                                timeout_seconds=remaining)
+                    for terms, ans, counts in received:
+                        if dedup.add(terms):
+                            found += 1
+                            yield terms, ans, counts
+                    # シード指定なら頼み直しても同じ問題になり、何も返らなければ時間切れなので、そこで終える
+                    if seed is not None or not received:
+                        return
+        elif use_workers:
+            # --- 足りない分を複数プロセスで生成と判定を分担 ---
+            def produce(cancel_event, needed=num_questions - len(problems)):
+                found = iter_problems_parallel(digit_count, num_lines, zero_count, minus_count, limits, needed,
+                                               workers=worker_count, seed=seed, mode=mode,
+                                               timeout_seconds=TIMEOUT_SECONDS, stats=stats,
+                                               cancel_event=cancel_event, dedup=dedup)
+                for terms, ans, counts in found:
+                    yield terms, ans, TechniqueCounts(*counts)
+        elif seed is not None:
+            # --- シードから1問ずつ作る（並列生成と同じ問題になる） ---
+            def produce(cancel_event, mode=mode):
+                return iter_problems(digit_count, num_lines, zero_count, minus_count, limits, mode=mode,
+                                     timeout_seconds=TIMEOUT_SECONDS, stats=stats, cancel_event=cancel_event,
+                                     dedup=dedup, seed=seed)
         else:
-            st.success(f"{len(problems)}問の生成に成功しました！")
+            # --- 足りない分の生成ループ（条件に合う問題を1問ずつ受け取る） ---
+            def produce(cancel_event, mode=mode):
+                return iter_problems(digit_count, num_lines, zero_count, minus_count, limits, mode=mode,
+                                     max_attempts=max_attempts, timeout_seconds=TIMEOUT_SECONDS,
+                                     surplus=keep_surplus, stats=stats, cancel_event=cancel_event, dedup=dedup)
+
+        # --- 生成前に、目標の達成可能性と見込み時間を生成スレッドの中で確認する ---
+        # （生成サービスの厳密抽出は、サービス側で数え上げる）
+        notices = []
+        if produce is not None and not (use_service and mode == MODE_EXACT):
+            produce = check_first(produce, config, limits, num_questions - len(problems), mode,
+                                  worker_count if use_workers else 1, notices, force_generation)
+
+        profiler = None
+        if produce is not None and profile_generation:
+            profiler = GenerationProfiler()
+            produce = profiler.wrap(produce, config)
+
+        # 生成はバックグラウンドで進め、画面は下の結果表示で定期的に更新する
+        st.session_state["generation_job"] = GenerationJob(produce, num_questions, problems).start()
+        st.session_state["generation_view"] = {
+            "digit_count": digit_count,
+            "num_lines": num_lines,
+            "stats": stats,
+            "profiler": profiler,
+            # 生成スレッドからの知らせ（厳密抽出をランダム生成に切り替えたときなど）
+            "notices": notices,
+            # 生成が終わったら出題済みの記録をファイルに保存する
+            "save_dedup": exclude_issued,
+            "seed": seed,
+            "targets": (f"条件設定 -> P5: {target_p5_count}回, P10: {target_p10_count}回, P15: {target_p15_count}回, "
+                        f"M5: {target_m5_count}回, M10: {target_m10_count}回, M15: {target_m15_count}回"),
+        }
 
-        # テキストデータ作成（コピー用・ダウンロード用）
-        output_text = ""
-        st.subheader("生成結果")
-        # ユーザーが指定した「目標値」を表示
-        st.text(
-            f"条件設定 -> P5: {target_p5_count}回, P10: {target_p10_count}回, P15: {target_p15_count}回, M5: {target_m5_count}回, M10: {target_m10_count}回, M15: {target_m15_count}回")
+# --- 複数の難易度をまとめて生成（同じ設定の候補を、一致するすべての難易度に振り分ける） ---
+with st.expander("複数の難易度をまとめて生成する"):
+    curriculum_text = st.text_area(
+        "1行に1つの難易度（例: P5=1 P10=2 M10=1 10問）。桁数・口数などはサイドバーの設定を使います",
+        value="P5=1 P10=0 M10=0\nP5=1 P10=1 M10=0\nP5=1 P10=1 M10=1")
+    if st.button("まとめて生成する"):
+        try:
+            levels = parse_curriculum(curriculum_text, num_questions)
+        except ValueError as error:
+            st.error(f"エラー: {error}")
+            levels = []
+        if levels and minus_count >= num_lines:
+            st.error("エラー: マイナスの回数が口数以上です。")
+        elif levels:
+            # 前回のまとめての生成がまだ動いていれば止める
+            previous_job = st.session_state.get("curriculum_job")
+            if previous_job is not None:
+                previous_job.cancel()
+            config = (digit_count, num_lines, zero_count, minus_count)
+            candidate_cache = get_candidate_cache()
+            requests = [CurriculumRequest(config, targets, count) for targets, count, _ in levels]
+            curriculum_mode = MODE_BATCH if generation_modes[generation_mode] == MODE_BATCH else MODE_RANDOM
+            curriculum_dedup = get_dedup_index() if exclude_issued else None
 
-        for i, p in enumerate(problems, 1):
-            line_str = f"No.{i}:\n{p['formula']}\n"
-            st.text(line_str)  # 画面表示
-            output_text += line_str + "\n"
+            def produce_curriculum(cancel_event):
+                return iter_curriculum(
+                    requests, mode=curriculum_mode, timeout_seconds=TIMEOUT_SECONDS, cancel_event=cancel_event,
+                    dedup=curriculum_dedup,
+                    surplus=lambda config, terms, ans, counts: candidate_cache.add(config, terms, ans, counts))
 
-        # ダウンロードボタン
+            # 生成はバックグラウンドで進め、下の表示で定期的に途中経過を出す
+            st.session_state["curriculum_job"] = CurriculumJob(
+                produce_curriculum, [ProblemSet(digit_count, num_lines) for _ in levels],
+                [count for _, count, _ in levels]).start()
+            st.session_state["curriculum_view"] = {
+                "lines": [line for _, _, line in levels],
+                # 生成が終わったら出題済みの記録をファイルに保存する
+                "save_dedup": exclude_issued,
+            }
+
+    curriculum_job = st.session_state.get("curriculum_job")
+    if curriculum_job is not None:
+        curriculum_view = st.session_state["curriculum_view"]
+        curriculum_result = curriculum_job.problems()
+        if curriculum_job.running:
+            st.text(f"生成中: {sum(map(len, curriculum_result))} / {curriculum_job.num_questions}問"
+                    f"（経過時間: {int(curriculum_job.elapsed())}秒 / {TIMEOUT_SECONDS}秒）")
+            if st.button("まとめての生成を中止する"):
+                curriculum_job.cancel()
+        elif curriculum_job.error is not None:
+            st.error(f"生成中にエラーが発生しました: {curriculum_job.error}")
+        elif curriculum_view["save_dedup"]:
+            get_dedup_index().save(DEFAULT_DEDUP_PATH)
+            curriculum_view["save_dedup"] = False
+        curriculum_parts = []
+        for line, count, problems in zip(curriculum_view["lines"], curriculum_job.counts, curriculum_result):
+            st.markdown(f"**{line}**（{len(problems)} / {count}問）")
+            level_text = problems.to_text()
+            st.text(level_text or ("（生成中）" if curriculum_job.running else "（時間内に見つかりませんでした）"))
+            curriculum_parts.append(f"■ {line}\n\n{level_text}")
         st.download_button(
-            label="テキストファイルとしてダウンロード",
-            data=output_text,
-            file_name="math_problems.txt",
+            label="まとめてテキストファイルとしてダウンロード",
+            data="".join(curriculum_parts),
+            file_name="math_problems_levels.txt",
             mime="text/plain"
         )
 
+# --- 結果表示（生成中は途中経過を表示し、一定間隔で画面を更新する） ---
+job = st.session_state.get("generation_job")
+if job is not None:
+    view = st.session_state["generation_view"]
+    problems = job.problems()
+    running = job.running
+
+    for notice in view["notices"]:
+        st.info(notice)
+    if running:
+        st.progress(min(len(problems) / job.num_questions, 1.0))
+        st.text(f"生成中: {len(problems)} / {job.num_questions}問（経過時間: {int(job.elapsed())}秒 / {TIMEOUT_SECONDS}秒）")
+        if st.button("生成を中止する"):
+            job.cancel()
+    elif isinstance(job.error, ValueError):
+        # 生成スレッドで確認した条件のエラー（厳密抽出で作れない組み合わせなど）
+        st.error(f"エラー: {job.error}")
+    elif job.error is not None:
+        st.error(f"生成中にエラーが発生しました: {job.error}")
+    elif len(problems) < job.num_questions:
+        if job.cancelled:
+            st.warning(f"生成を中止しました（{len(problems)}問）。")
+        elif job.elapsed() > TIMEOUT_SECONDS:
+            st.warning(f"処理時間が{TIMEOUT_SECONDS}秒を超えたため、生成を中断しました。")
+        st.warning(f"{len(problems)}問しか生成できませんでした。条件が厳しい可能性があります。")
+    else:
+        st.success(f"{len(problems)}問の生成に成功しました！")
+
+    st.subheader("生成結果")
+    # ユーザーが指定した「目標値」を表示
+    st.text(view["targets"])
+    if view["seed"] is not None:
+        st.text(f"シード: {view['seed']}（同じ設定とシードで同じ問題を作り直せます）")
+
+    for i in range(len(problems)):
+        st.text(f"No.{i + 1}:\n{problems.formula(i)}\n")  # 画面表示
+
+    # ダウンロードボタン（生成中でも、ここまでの問題をダウンロードできる）
+    st.download_button(
+        label="テキストファイルとしてダウンロード" if not running else "ここまでの問題をダウンロード",
+        data=problems.to_text(),
+        file_name="math_problems.txt",
+        mime="text/plain"
+    )
+
+    if not running:
+        if view["save_dedup"]:
+            get_dedup_index().save(DEFAULT_DEDUP_PATH)
+            view["save_dedup"] = False
+
         # 詳細表示（アコーディオン）
         with st.expander("詳細データ（縦書き用データなど）を見る"):
-            st.write(problems)
+            st.write([problems.record(i) for i in range(len(problems))])
+
+        # 段階ごとの棄却数と所要時間（生成スレッドが書き込み中でないときだけ表示する）
+        stats = view["stats"]
+        if stats is not None:
+            with st.expander("生成の統計を見る"):
+                st.table([{"項目": label, "値": value} for label, value in stats.rows()])
+                st.download_button(
+                    label="統計をJSONでダウンロード",
+                    data=stats.to_json(),
+                    file_name="generation_stats.json",
+                    mime="application/json"
+                )
+
+        # 計測結果（バグ報告に添付できるようにダウンロードも用意する）
+        profiler = view["profiler"]
+        if profiler is not None:
+            with st.expander("生成の計測結果を見る"):
+                st.text(profiler.report())
+                st.download_button(
+                    label="プロファイル（.prof）をダウンロード",
+                    data=profiler.to_bytes(),
+                    file_name="generation.prof",
+                    mime="application/octet-stream"
+                )
+                st.download_button(
+                    label="計測結果をテキストでダウンロード",
+                    data=profiler.report() + "\n\n" + profiler.pstats_text(),
+                    file_name="generation_profile.txt",
+                    mime="text/plain"
+                )
+
+        # 解説（どの口のどの位で技法が発生したか）は表示するときだけ記録する
+        with st.expander("解説（技法の発生箇所）を見る"):
+            for i in range(len(problems)):
+                st.text(f"No.{i + 1}: {problems.formula(i)}")
+                explanation = [line for line in trace_sequence(problems.terms(i), view["digit_count"]).render()
+                               if " PB " not in line and " MB " not in line]
+                st.text("\n".join(explanation) or "（PB/MBのみ）")
+
+# 生成中なら、途中経過を表示しなおすために一定間隔で画面を更新する
+if any(running_job is not None and running_job.running for running_job in (job, curriculum_job)):
+    time.sleep(REFRESH_SECONDS)
+    st.rerun()
@@ -0,0 +1,164 @@
+import numpy as np
+
+from classify_logic import TECHNIQUE_NAMES, FIELD_BITS, FIELD_MASK, get_column_tables
+
+# 1行あたりの表の行数: 加算(繰り上がり0/1 x 100通り) + 減算100通り + 何もしない行
+PLUS_ROWS = 200
+MINUS_OFFSET = PLUS_ROWS
+NOOP_ROW = MINUS_OFFSET + 100
+
+_np_table_cache = {}
+
+
+def _unpack_row(packed):
+    return [(packed >> (field * FIELD_BITS)) & FIELD_MASK for field in range(len(TECHNIQUE_NAMES))]
+
+
+def get_batch_tables(num_digits):
+    """
+    classify_logic の桁別判定表を numpy 配列に変換する（初回のみ）
+    counts[col, row, 技法] : その桁の操作で増えるカウント
+    carry[col, row]       : 次の桁への繰り上がり
+    row = 加算なら (a*10+b)*2+繰り上がり, 減算なら 200+a*10+b, 0の項なら NOOP_ROW
+    """
+    tables = _np_table_cache.get(num_digits)
+    if tables is not None:
+        return tables
+
+    plus_tables, minus_tables = get_column_tables(num_digits)
+    num_cols = len(plus_tables)
+    counts = np.zeros((num_cols, NOOP_ROW + 1, len(TECHNIQUE_NAMES)), dtype=np.int16)
+    carry = np.zeros((num_cols, NOOP_ROW + 1), dtype=np.int64)
+    for col in range(num_cols):
+        for row, entry in enumerate(plus_tables[col]):
+            counts[col, row] = _unpack_row(entry >> 1)
+            carry[col, row] = entry & 1
+        for row, entry in enumerate(minus_tables[col]):
+            counts[col, MINUS_OFFSET + row] = _unpack_row(entry)
+
+    tables = (counts, carry)
+    _np_table_cache[num_digits] = tables
+    return tables
+
+
+def classify_batch(sequences, num_digits=2):
+    """
+    (N, 口数) の整数配列をまとめて判定し、(N, 8) の技法カウント配列を返す
+    列の並びは TECHNIQUE_NAMES (PB, MB, P5, M5, P10, M10, P15, M15) と同じ
+    各行の結果は classify_sequence(行, num_digits) と一致する
+    sequences: 途中の累積和が負にならない数列であること
+    """
+    seqs = np.asarray(sequences, dtype=np.int64)
+    if seqs.ndim != 2:
+        raise ValueError(f"classify_batch には (N, 口数) の2次元配列を渡してください。(ndim={seqs.ndim})")
+
+    counts_table, carry_table = get_batch_tables(num_digits)
+    num_cols = counts_table.shape[0]
+    n, num_lines = seqs.shape
+    result = np.zeros((n, len(TECHNIQUE_NAMES)), dtype=np.int16)
+    if n == 0 or num_lines == 0:
+        return result
+
+    # 各項を足す直前の累積和
+    sums_before = np.cumsum(seqs, axis=1) - seqs
+
+    # 繰り上がりも含めて処理が必要な桁数（最低でも一の位と十の位）
+    max_value = int(max(np.abs(seqs).max(), sums_before.max() + seqs.max(), 1))
+    columns = max(len(str(max_value)), 2)
+
+    for line in range(num_lines):
+        val = seqs[:, line]
+        is_plus = val > 0
+        is_minus = val < 0
+        s = sums_before[:, line].copy()
+        v = np.abs(val)
+        carry = np.zeros(n, dtype=np.int64)
+        for col in range(columns):
+            s, a = np.divmod(s, 10)
+            v, b = np.divmod(v, 10)
+            digit_pair = a * 10 + b
+            rows = np.where(is_plus, digit_pair * 2 + carry,
+                            np.where(is_minus, MINUS_OFFSET + digit_pair, NOOP_ROW))
+            table_col = min(col, num_cols - 1)
+            result += counts_table[table_col, rows]
+            carry = carry_table[table_col, rows]
+
+    return result
+
+
+def match_targets_batch(counts, pb=None, mb=None, p5=None, m5=None, p10=None, m10=None, p15=None, m15=None):
+    """
+    classify_batch の結果から、指定した目標値（Noneは条件なし）にすべて一致する行を示すbool配列を返す
+    """
+    mask = np.ones(counts.shape[0], dtype=bool)
+    for field, target in enumerate((pb, mb, p5, m5, p10, m10, p15, m15)):
+        if target is not None:
+            mask &= counts[:, field] == target
+    return mask
+
+
+def generate_batch(num_digits, num_lines, zero_count, minus_count, batch_size, rng=None, stats=None):
+    """
+    generate_single_problem と同じ手順（数字プール・0の項・ゾロ目除外・符号・絶対値の重複・累積和の範囲）を
+    batch_size 本まとめて numpy で行い、条件を満たした数列だけを (M, 口数) の配列で返す
+    1行が generate_single_problem の1回の試行に相当する（失敗した行はやり直さずに捨てる）
+    ただし並び順と符号は探索せず、ランダムに1通り決めて判定する（apply_signs と同じ方式）
+    rng: numpy.random.Generator
+    stats: stats_logic.GenerationStats（指定すると理由ごとの棄却数を数える）
+    """
+    if num_digits < 2:
+        raise ValueError(f"generate_batch は {num_digits} 桁に対応していません。")
+    if zero_count > num_lines:
+        raise ValueError(f"0の回数（{zero_count}）が口数（{num_lines}）を超えています。")
+    rng = rng if rng is not None else np.random.default_rng()
+    normal_lines = num_lines - zero_count
+
+    # --- 数字プール（1～9 をほぼ均等に + 余りはランダム） ---
+    total_needed = (normal_lines * num_digits) + (zero_count * (num_digits - 1))
+    base_count = total_needed // 9
+    remainder = total_needed % 9
+    base = np.repeat(np.arange(1, 10), base_count)
+    extra = rng.integers(1, 10, size=(batch_size, remainder))
+    pool = np.concatenate([np.broadcast_to(base, (batch_size, base.size)), extra], axis=1)
+    pool = np.take_along_axis(pool, rng.random(pool.shape).argsort(axis=1), axis=1)
+
+    # --- 0を含む項（プールの末尾から取り出し、最上位以外のどこか1つの位を0にする） ---
+    zero_digits = zero_count * (num_digits - 1)
+    picked = pool[:, total_needed - zero_digits:][:, ::-1].reshape(batch_size, zero_count, num_digits - 1)
+    # 0を入れる位置（最上位から数えて1～num_digits-1桁目）より上の数字は1桁ずらす
+    zero_position = rng.integers(1, num_digits, size=(batch_size, zero_count, 1))
+    upper_place = 10 ** np.arange(num_digits - 1, 0, -1)
+    lower_place = 10 ** np.arange(num_digits - 2, -1, -1)
+    index = np.arange(num_digits - 1)
+    zero_terms = (picked * np.where(index < zero_position, upper_place, lower_place)).sum(axis=2)
+
+    # --- 通常の項（ゾロ目を含む行は捨てる） ---
+    chunks = pool[:, :total_needed - zero_digits].reshape(batch_size, normal_lines, num_digits)
+    is_repdigit = (chunks == chunks[:, :, :1]).all(axis=2)
+    place = 10 ** np.arange(num_digits - 1, -1, -1)
+    normal_terms = (chunks * place).sum(axis=2)
+    ok = ~is_repdigit.any(axis=1)
+
+    # --- 並べ替えと符号（先頭以外から minus_count 個をマイナスに） ---
+    terms = np.concatenate([zero_terms, normal_terms], axis=1)
+    terms = np.take_along_axis(terms, rng.random(terms.shape).argsort(axis=1), axis=1)
+    if minus_count > 0:
+        keys = rng.random((batch_size, num_lines - 1))
+        minus_positions = keys.argsort(axis=1)[:, :minus_count] + 1
+        signs = np.ones_like(terms)
+        np.put_along_axis(signs, minus_positions, -1, axis=1)
+        terms = terms * signs
+
+    # --- 絶対値の重複と累積和の範囲 ---
+    sorted_abs = np.sort(np.abs(terms), axis=1)
+    no_duplicate = ~(sorted_abs[:, 1:] == sorted_abs[:, :-1]).any(axis=1)
+    sums = np.cumsum(terms, axis=1)
+    in_range = ((sums >= 10 ** (num_digits - 1)) & (sums <= 10 ** (num_digits + 1) - 1)).all(axis=1)
+    if stats is not None:
+        # generate_single_problem と同じ順（ゾロ目 -> 重複 -> 範囲）で理由を1つずつ数える
+        stats.count("batch_rows", batch_size)
+        stats.count("repdigit_rejections", int((~ok).sum()))
+        stats.count("duplicate_absolute_values", int((ok & ~no_duplicate).sum()))
+        stats.count("cumulative_sum_out_of_range", int((ok & no_duplicate & ~in_range).sum()))
+    ok &= no_duplicate & in_range
+    return terms[ok]
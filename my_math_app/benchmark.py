@@ -0,0 +1,233 @@
+"""
+分類関数・問題生成・エンドツーエンド生成の速度を計測するベンチマーク
+
+使い方:
+    python benchmark.py                              # 計測して表示
+    python benchmark.py --json results.json          # 結果をJSONで保存
+    python benchmark.py --baseline results.json      # 保存済みの結果と比較（遅くなっていたら終了コード1）
+    （--quick の結果は --quick で保存した基準とだけ比べる）
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from itertools import islice
+
+from adaptive_sampler import clear_adaptive_samplers
+from pb_logic import count_pb_in_sequence
+from mb_logic import count_mb_in_sequence
+from p5_logic import count_p5_in_sequence
+from m5_logic import count_m5_in_sequence
+from p10_logic import count_p10_in_sequence
+from m10_logic import count_m10_in_sequence
+from p15_logic import count_p15_in_sequence
+from m15_logic import count_m15_in_sequence
+from classify_logic import TechniqueLimits, classify_sequence, classify_sequence_within
+from problem_generater import MODE_ADAPTIVE, MODE_BATCH, MODE_RANDOM, MODE_TARGETED, format_formula, generate_single_problem, \
+    iter_problems
+
+# 代表的な設定: (名前, (桁数, 口数, 0の数, マイナスの数), 目標)
+SCENARIOS = [
+    ("app_default", (2, 8, 2, 3), dict(p5=1, p10=1, p15=1, m5=1, m10=1, m15=1)),
+    # 3桁10口ですべての技法を1回ずつにすると、ランダム生成・一括生成では制限時間内にほとんど見つからないので、
+    # どの生成方法でも見つかる目標にする
+    ("3digit_10line", (3, 10, 2, 4), dict(p5=1, m5=1)),
+    ("strict_targets", (2, 8, 2, 3), dict(p5=1, p10=1, p15=3, m5=1, m10=1, m15=2)),
+]
+# エンドツーエンドの計測で省く生成方法（ランダム生成では厳しい目標の問題が1秒に数問しか見つからない）
+END_TO_END_SKIP = {"strict_targets": {MODE_RANDOM}}
+# エンドツーエンドの計測1回で集める問題数と、計測を繰り返す回数（中央値を結果にする）
+END_TO_END_PROBLEMS = 20
+END_TO_END_REPEATS = 5
+
+COUNT_FUNCTIONS = [
+    ("count_pb_in_sequence", count_pb_in_sequence),
+    ("count_mb_in_sequence", count_mb_in_sequence),
+    ("count_p5_in_sequence", count_p5_in_sequence),
+    ("count_m5_in_sequence", count_m5_in_sequence),
+    ("count_p10_in_sequence", count_p10_in_sequence),
+    ("count_m10_in_sequence", count_m10_in_sequence),
+    ("count_p15_in_sequence", count_p15_in_sequence),
+    ("count_m15_in_sequence", count_m15_in_sequence),
+]
+
+SAMPLE_SEQUENCES = 200
+
+
+def measure(func, min_time, repeat=3):
+    """func() を min_time 秒以上まわす計測を repeat 回行い、最速の「1秒あたりの回数」を返す"""
+    best = 0.0
+    for _ in range(repeat):
+        calls = 0
+        start = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < min_time:
+            func()
+            calls += 1
+            elapsed = time.perf_counter() - start
+        best = max(best, calls / elapsed)
+    return best
+
+
+def sample_sequences(config, count, seed=0):
+    # 計測対象の入力を毎回同じにするため、シードを固定して作る
+    random.seed(seed)
+    sequences = []
+    while len(sequences) < count:
+        result = generate_single_problem(*config)
+        if result:
+            sequences.append(result)
+    return sequences
+
+
+def bench_functions(min_time):
+    results = {}
+    for scenario, config, targets in SCENARIOS[:2]:
+        num_digits = config[0]
+        sequences = sample_sequences(config, SAMPLE_SEQUENCES)
+        terms_list = [terms for terms, _ in sequences]
+
+        def run_all(func):
+            def run():
+                for terms in terms_list:
+                    func(terms, num_digits)
+            return run
+
+        for name, func in COUNT_FUNCTIONS:
+            results[f"{name}[{scenario}]"] = measure(run_all(func), min_time) * len(terms_list)
+
+        def run_all_counts():
+            for terms in terms_list:
+                for _, func in COUNT_FUNCTIONS:
+                    func(terms, num_digits)
+
+        results[f"all_count_functions[{scenario}]"] = measure(run_all_counts, min_time) * len(terms_list)
+        results[f"classify_sequence[{scenario}]"] = measure(run_all(classify_sequence), min_time) * len(terms_list)
+
+        limits = TechniqueLimits(**targets)
+
+        def run_within():
+            for terms in terms_list:
+                classify_sequence_within(terms, num_digits, limits)
+
+        results[f"classify_sequence_within[{scenario}]"] = measure(run_within, min_time) * len(terms_list)
+
+        def run_format():
+            for terms, ans in sequences:
+                format_formula(terms, ans)
+
+        results[f"format_formula[{scenario}]"] = measure(run_format, min_time) * len(sequences)
+
+        random.seed(1)
+        results[f"generate_single_problem[{scenario}]"] = measure(lambda: generate_single_problem(*config), min_time)
+    return results
+
+
+def bench_end_to_end(time_limit, modes, repeat=END_TO_END_REPEATS):
+    """
+    条件に一致する問題が1秒あたり何問得られるか
+    END_TO_END_PROBLEMS 問集めるまでの時間を repeat 回測り、中央値から求める
+    （適応生成は学習した分布を使い回さず、毎回一様な分布から始める）
+    制限時間内に集まらなかった項目の名前も返す
+    """
+    results = {}
+    incomplete = []
+    for scenario, config, targets in SCENARIOS:
+        for mode in modes:
+            if mode in END_TO_END_SKIP.get(scenario, ()):
+                continue
+            name = f"accepted_per_sec[{scenario}][{mode}]"
+            rates = []
+            for _ in range(repeat):
+                clear_adaptive_samplers()
+                random.seed(2)
+                start = time.perf_counter()
+                found = sum(1 for _ in islice(
+                    iter_problems(*config, targets, mode=mode, timeout_seconds=time_limit, rng=random.Random(3)),
+                    END_TO_END_PROBLEMS))
+                rates.append(found / (time.perf_counter() - start))
+                if found < END_TO_END_PROBLEMS and name not in incomplete:
+                    incomplete.append(name)
+            results[name] = statistics.median(rates)
+    return results, incomplete
+
+
+def compare(results, baseline, tolerance):
+    """基準値と比べて tolerance 以上遅くなった項目を返す"""
+    regressions = []
+    for name, value in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        ratio = value / base
+        if ratio < 1 - tolerance:
+            regressions.append((name, base, value, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="問題生成のベンチマーク")
+    parser.add_argument("--json", help="結果を保存するJSONファイル")
+    parser.add_argument("--baseline", help="比較する基準のJSONファイル")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="許容する速度低下の割合（既定: 0.2 = 20%%）")
+    parser.add_argument("--quick", action="store_true", help="短時間で計測する")
+    parser.add_argument("--no-numpy", action="store_true", help="一括生成（numpy）の計測を省く")
+    args = parser.parse_args()
+
+    min_time = 0.05 if args.quick else 0.3
+    time_limit = 5.0 if args.quick else 10.0
+    repeat = 3 if args.quick else END_TO_END_REPEATS
+    modes = [MODE_RANDOM, MODE_TARGETED, MODE_ADAPTIVE] if args.no_numpy else \
+        [MODE_RANDOM, MODE_TARGETED, MODE_ADAPTIVE, MODE_BATCH]
+
+    results = {}
+    results.update(bench_functions(min_time))
+    end_to_end, incomplete = bench_end_to_end(time_limit, modes, repeat)
+    results.update(end_to_end)
+
+    for name, value in results.items():
+        print(f"{name:60s} {value:14.1f} /s")
+    if incomplete:
+        print(f"\n{time_limit:g}秒以内に{END_TO_END_PROBLEMS}問集まらなかった項目（比べるときはばらつきが大きい）:")
+        for name in incomplete:
+            print(f"  {name}")
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "quick": args.quick,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline_report = json.load(f)
+        # --quick とそうでない計測は計測時間も繰り返す回数も違うので、比べない
+        baseline_quick = baseline_report.get("quick")
+        if baseline_quick is None:
+            print("\n基準に --quick の指定の記録がありません。今の benchmark.py で保存し直してください。")
+            sys.exit(2)
+        if baseline_quick != args.quick:
+            kind = "--quick で" if baseline_quick else "--quick なしで"
+            print(f"\n基準は{kind}計測した結果なので、同じ指定で計測して比べてください。")
+            sys.exit(2)
+        baseline = baseline_report["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n基準から{int(args.tolerance * 100)}%以上遅くなった項目:")
+            for name, base, value, ratio in regressions:
+                print(f"  {name}: {base:.1f} -> {value:.1f} /s ({ratio:.2f}倍)")
+            sys.exit(1)
+        print("\n基準からの速度低下はありません。")
+
+
+if __name__ == "__main__":
+    main()
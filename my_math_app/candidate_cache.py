@@ -0,0 +1,70 @@
+import threading
+from collections import OrderedDict, deque
+
+
+class CandidateCache:
+    """
+    目標に一致しなかったが条件自体は満たしている問題を、(設定, 難易度シグネチャ) ごとのバケットに保存しておくキャッシュ
+    目標を変えて再生成したときに、一致するバケットから先に取り出せる
+    バケット単位のLRUで、全体の件数が max_total を超えたら古いバケットから捨てる
+    """
+
+    def __init__(self, max_per_bucket=200, max_total=50000):
+        self.max_per_bucket = max_per_bucket
+        self.max_total = max_total
+        self.buckets = OrderedDict()
+        self.total = 0
+        # Streamlit の cache_resource では複数セッションから同時に使われるためロックする
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.total
+
+    def add(self, config, terms, ans, counts):
+        """1問分を (設定, カウント) のバケットに追加する"""
+        key = (tuple(config), tuple(counts))
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = deque(maxlen=self.max_per_bucket)
+                self.buckets[key] = bucket
+            else:
+                self.buckets.move_to_end(key)
+            if len(bucket) < self.max_per_bucket:
+                self.total += 1
+            bucket.append((terms, ans, counts))
+
+            while self.total > self.max_total:
+                _, evicted = self.buckets.popitem(last=False)
+                self.total -= len(evicted)
+
+    def take(self, config, limits, count):
+        """
+        設定と目標カウント(limits)に一致する問題を最大 count 問取り出す（取り出した分はキャッシュから消える）
+        戻り値: [(数列, 答え, TechniqueCounts), ...]
+        """
+        config = tuple(config)
+        taken = []
+        with self.lock:
+            for key in list(self.buckets):
+                if len(taken) >= count:
+                    break
+                bucket_config, signature = key
+                if bucket_config != config:
+                    continue
+                if any(t is not None and c != t for c, t in zip(signature, limits.limits)):
+                    continue
+                bucket = self.buckets[key]
+                while bucket and len(taken) < count:
+                    taken.append(bucket.popleft())
+                    self.total -= 1
+                if bucket:
+                    self.buckets.move_to_end(key)
+                else:
+                    del self.buckets[key]
+        return taken
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+            self.total = 0
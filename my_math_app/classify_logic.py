@@ -0,0 +1,310 @@
+from collections import namedtuple
+
+from pb_logic import is_plus_basic_digit
+from mb_logic import is_minus_basic_digit
+from p5_logic import is_p5_digit
+from m5_logic import is_m5_digit
+from p10_logic import is_p10_digit
+from m10_logic import is_m10_digit
+from p15_logic import is_p15_digit
+from m15_logic import is_m15_digit
+
+# 8種類の技法カウントをまとめたレコード（namedtupleなので__slots__=()で軽量）
+TECHNIQUE_NAMES = ("pb", "mb", "p5", "m5", "p10", "m10", "p15", "m15")
+TechniqueCounts = namedtuple("TechniqueCounts", TECHNIQUE_NAMES)
+
+# 各カウントを1つの整数にまとめるためのビット幅（1フィールド16ビット）
+FIELD_BITS = 16
+FIELD_MASK = (1 << FIELD_BITS) - 1
+GUARD_BIT = 1 << (FIELD_BITS - 1)
+
+PB, MB, P5, M5, P10, M10, P15, M15 = range(len(TECHNIQUE_NAMES))
+
+# (累積和, 項) -> カウント増分 の表に覚えておく件数の上限（2桁の全組み合わせ約18万件が収まる大きさ）
+TRANSITION_MAX_ENTRIES = 250000
+# 表のキーは「累積和 * TERM_KEY_SPAN + 項」（項の絶対値が TERM_KEY_SPAN // 2 未満なら重ならない）
+TERM_KEY_SPAN = 1 << 20
+TERM_KEY_LIMIT = TERM_KEY_SPAN // 2
+
+_table_cache = {}
+_transition_cache = {}
+
+
+def _bit(field):
+    return 1 << (field * FIELD_BITS)
+
+
+def _build_tables(num_digits):
+    """
+    桁位置ごとに (盤面の数字a, 入力の数字b, 下の桁からの繰り上がり) -> 加算するカウント の表を作る
+    表の値は「パック済みカウント * 2 + 次の桁への繰り上がり」
+    判定自体は各 *_logic.py の is_*_digit をそのまま使うので、定義は一か所に保たれる
+    PB/MB/P5/P15/M5 は項の桁（一の位から num_digits 桁目まで）だけで判定し、
+    最後の表（項より上の位、繰り上がりだけが届く）は桁数を超える位すべてで使い回す
+    """
+    plus_tables = []
+    minus_tables = []
+    for col in range(num_digits + 1):
+        in_term = col < num_digits
+        plus = [0] * 200
+        minus = [0] * 100
+        for a in range(10):
+            for b in range(10):
+                packed = 0
+                if in_term:
+                    if is_plus_basic_digit(a, b):
+                        packed += _bit(PB)
+                    if is_p5_digit(a, b):
+                        packed += _bit(P5)
+                    if is_p15_digit(a, b):
+                        packed += _bit(P15)
+                if b > 0 and is_p10_digit(a, b):
+                    packed += _bit(P10)
+                for carry in (0, 1):
+                    total = packed
+                    # 下の桁からの繰り上がり(+1)で9->10になる場合もP10として数える
+                    if carry and (a + b) % 10 == 9:
+                        total += _bit(P10)
+                    carry_out = 1 if a + b + carry >= 10 else 0
+                    plus[(a * 10 + b) * 2 + carry] = total * 2 + carry_out
+
+                packed = 0
+                if in_term and is_minus_basic_digit(a, b):
+                    packed += _bit(MB)
+                if b > 0:
+                    if in_term and is_m5_digit(a, b):
+                        packed += _bit(M5)
+                    if is_m10_digit(a, b):
+                        packed += _bit(M10)
+                    if is_m15_digit(a, b):
+                        packed += _bit(M15)
+                minus[a * 10 + b] = packed
+        plus_tables.append(plus)
+        minus_tables.append(minus)
+    return plus_tables, minus_tables
+
+
+def get_column_tables(num_digits):
+    """桁数ごとの判定表（加算用, 減算用）を取得する。初回のみ作成してキャッシュする"""
+    tables = _table_cache.get(num_digits)
+    if tables is None:
+        tables = _build_tables(num_digits)
+        _table_cache[num_digits] = tables
+    return tables
+
+
+def _column_table(tables, col):
+    # 想定桁数を超える位は、PB/P5などの範囲外なので最後の表を使い回す
+    return tables[col] if col < len(tables) else tables[-1]
+
+
+def _term_columns(tables):
+    # 項の桁数（最後の表は項より上の位の分）
+    return len(tables) - 1
+
+
+def _classify_term(current_sum, val, plus_tables, minus_tables):
+    """
+    1項分の盤面操作をシミュレートし、パック済みのカウント増分を返す
+    位ごとの表引きなので、1項あたりの手間は桁数に比例する
+    """
+    packed = 0
+    col = 0
+    columns = _term_columns(plus_tables)
+    if val > 0:
+        carry = 0
+        s = current_sum
+        v = val
+        while v or carry or col < columns:
+            s, a = divmod(s, 10)
+            v, b = divmod(v, 10)
+            # 項より上の位は最後の表（_column_table と同じ）
+            entry = plus_tables[col if col < columns else columns][(a * 10 + b) * 2 + carry]
+            packed += entry >> 1
+            carry = entry & 1
+            col += 1
+    elif val < 0:
+        s = current_sum
+        v = -val
+        while v or col < columns:
+            s, a = divmod(s, 10)
+            v, b = divmod(v, 10)
+            packed += minus_tables[col if col < columns else columns][a * 10 + b]
+            col += 1
+    return packed
+
+
+class TransitionTable:
+    """
+    (累積和, 項) -> パック済みのカウント増分 を、使われた組み合わせだけ覚えておく表
+    技法は累積和と項だけで決まるので、同じ組み合わせは位ごとのシミュレーションをやり直さずに表引きで済む
+    （次の累積和は 累積和 + 項 なので持たない）
+    件数が max_entries に達したら表を空にして覚え直す（メモリは max_entries 件分で頭打ち）
+    判定・生成・数え上げのすべてで get_transition_table(桁数) の同じ表を使う
+    """
+    __slots__ = ("num_digits", "max_entries", "entries", "plus_tables", "minus_tables")
+
+    def __init__(self, num_digits, max_entries=TRANSITION_MAX_ENTRIES):
+        self.num_digits = num_digits
+        self.max_entries = max_entries
+        self.entries = {}
+        self.plus_tables, self.minus_tables = get_column_tables(num_digits)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def fill(self, current_sum, val):
+        """表に無い組み合わせを計算して覚える（呼び出し側で entries.get が None だったときに使う）"""
+        packed = _classify_term(current_sum, val, self.plus_tables, self.minus_tables)
+        if not -TERM_KEY_LIMIT < val < TERM_KEY_LIMIT:
+            # キーが他の組み合わせと重なる大きさの項は覚えない
+            return packed
+        if len(self.entries) >= self.max_entries:
+            self.entries.clear()
+        self.entries[current_sum * TERM_KEY_SPAN + val] = packed
+        return packed
+
+    def delta(self, current_sum, val):
+        """累積和 current_sum に val を入れたときのパック済みカウント増分"""
+        packed = self.entries.get(current_sum * TERM_KEY_SPAN + val)
+        if packed is None or not -TERM_KEY_LIMIT < val < TERM_KEY_LIMIT:
+            packed = self.fill(current_sum, val)
+        return packed
+
+    def clear(self):
+        self.entries.clear()
+
+
+def get_transition_table(num_digits):
+    """桁数ごとの TransitionTable を取得する（プロセス内で1つを共有する）"""
+    table = _transition_cache.get(num_digits)
+    if table is None:
+        table = TransitionTable(num_digits)
+        _transition_cache[num_digits] = table
+    return table
+
+
+def classify_term(current_sum, val, num_digits=2):
+    """累積和 current_sum に val を入れたときに発生する技法を、パック済み整数で返す"""
+    return get_transition_table(num_digits).delta(current_sum, val)
+
+
+def unpack_counts(packed):
+    """パック済み整数を TechniqueCounts に展開する"""
+    counts = []
+    for _ in TECHNIQUE_NAMES:
+        counts.append(packed & FIELD_MASK)
+        packed >>= FIELD_BITS
+    return TechniqueCounts(*counts)
+
+
+def classify_sequence(terms, num_digits=2):
+    """
+    盤面を1回だけシミュレートして、PB/MB/P5/M5/P10/M10/P15/M15 をまとめてカウントする
+    結果は count_*_in_sequence を個別に呼んだ場合と同じになる
+    1口ごとに (累積和, 項) の遷移表を引くので、表にあれば口数回の辞書引きで済む
+    """
+    table = get_transition_table(num_digits)
+    entries = table.entries
+    packed = 0
+    current_sum = 0
+    for val in terms:
+        delta = entries.get(current_sum * TERM_KEY_SPAN + val)
+        if delta is None or not -TERM_KEY_LIMIT < val < TERM_KEY_LIMIT:
+            delta = table.fill(current_sum, val)
+        packed += delta
+        current_sum += val
+    return unpack_counts(packed)
+
+
+def trace_sequence(terms, num_digits=2, tracer=None):
+    """
+    classify_sequence と同じ判定で、技法が発生した位置を tracer (trace_logic.Tracer) に記録する
+    説明表示用の処理で、生成時の判定（classify_sequence）とは別の関数にしてある
+    """
+    from trace_logic import Tracer
+
+    tracer = tracer if tracer is not None else Tracer()
+    plus_tables, minus_tables = get_column_tables(num_digits)
+    columns = _term_columns(plus_tables)
+    current_sum = 0
+    for val in terms:
+        tracer.begin_line()
+        col = 0
+        s = current_sum
+        if val > 0:
+            carry = 0
+            v = val
+            while v or carry or col < columns:
+                s, a = divmod(s, 10)
+                v, b = divmod(v, 10)
+                # 繰り上がりなしの表で入力値そのものの技法を取り出す
+                step = unpack_counts(_column_table(plus_tables, col)[(a * 10 + b) * 2] >> 1)
+                for name, count in zip(TECHNIQUE_NAMES, step):
+                    if count:
+                        tracer.record(col, name.upper(), a, b, (a + b) % 10)
+                if carry and (a + b) % 10 == 9:
+                    tracer.record(col, "P10", 9, carry, 0)
+                carry = 1 if a + b + carry >= 10 else 0
+                col += 1
+        elif val < 0:
+            v = -val
+            while v or col < columns:
+                s, a = divmod(s, 10)
+                v, b = divmod(v, 10)
+                step = unpack_counts(_column_table(minus_tables, col)[a * 10 + b])
+                for name, count in zip(TECHNIQUE_NAMES, step):
+                    if count:
+                        tracer.record(col, name.upper(), a, b, (a - b) % 10)
+                col += 1
+        current_sum += val
+    return tracer
+
+
+class TechniqueLimits:
+    """
+    classify_sequence_within 用の上限設定
+    各技法の上限値（Noneなら上限なし）を、パック済み整数のバイアスとガードビットに変換して保持する
+    """
+    __slots__ = ("limits", "bias", "guard_mask")
+
+    def __init__(self, pb=None, mb=None, p5=None, m5=None, p10=None, m10=None, p15=None, m15=None):
+        self.limits = TechniqueCounts(pb, mb, p5, m5, p10, m10, p15, m15)
+        self.bias = 0
+        self.guard_mask = 0
+        for field, limit in enumerate(self.limits):
+            if limit is None:
+                continue
+            # 上限を超えた瞬間にガードビットが立つよう、初期値を (GUARD_BIT - 1 - limit) にしておく
+            self.bias += (GUARD_BIT - 1 - limit) << (field * FIELD_BITS)
+            self.guard_mask += GUARD_BIT << (field * FIELD_BITS)
+
+
+def classify_sequence_within(terms, num_digits, limits):
+    """
+    classify_sequence の早期終了版
+    いずれかのカウントが上限(limits)を超えた時点で計算を打ち切り、Noneを返す
+    limits: TechniqueLimits
+    """
+    table = get_transition_table(num_digits)
+    entries = table.entries
+    guard_mask = limits.guard_mask
+    packed = limits.bias
+    current_sum = 0
+    for val in terms:
+        delta = entries.get(current_sum * TERM_KEY_SPAN + val)
+        if delta is None or not -TERM_KEY_LIMIT < val < TERM_KEY_LIMIT:
+            delta = table.fill(current_sum, val)
+        packed += delta
+        if packed & guard_mask:
+            return None
+        current_sum += val
+    return unpack_counts(packed - limits.bias)
+
+
+def matches_targets(counts, limits):
+    """上限値が指定されている技法がすべて目標値と一致しているか判定する"""
+    for count, limit in zip(counts, limits.limits):
+        if limit is not None and count != limit:
+            return False
+    return True
@@ -0,0 +1,224 @@
+import random
+
+from classify_logic import (TECHNIQUE_NAMES, FIELD_BITS, FIELD_MASK,
+                            PB, MB, P5, M5, P10, M10, P15, M15, classify_term, unpack_counts)
+
+# 目標に近づく候補を優先する度合い（大きいほど貪欲になる）
+PROGRESS_WEIGHT = 0.6
+# 1つの位置で評価する項の候補数（全候補を判定すると3桁で遅くなるため、ランダムに抜き出す）
+SAMPLE_SIZE = 120
+
+_term_cache = {}
+_term_pool_cache = {}
+
+
+def _digits_of(value, num_digits):
+    digits = []
+    for _ in range(num_digits):
+        value, d = divmod(value, 10)
+        digits.append(d)
+    return digits[::-1]
+
+
+def get_term_options(num_digits):
+    """
+    問題に使える項の候補を (値, 使う数字の個数リスト) の形で作る
+    通常の項   : 0を含まず、ゾロ目でない数
+    0を含む項 : 最上位以外の1つの位だけが0の数（2桁なら X0、3桁なら XX0 / X0X。create_zero_terms と同じ形）
+    """
+    options = _term_cache.get(num_digits)
+    if options is not None:
+        return options
+
+    normal_terms = []
+    zero_terms = []
+    for value in range(10 ** (num_digits - 1), 10 ** num_digits):
+        digits = _digits_of(value, num_digits)
+        usage = [0] * 10
+        for d in digits:
+            usage[d] += 1
+        if 0 not in digits:
+            if len(set(digits)) > 1:
+                normal_terms.append((value, usage))
+        elif usage[0] == 1:
+            usage[0] = 0
+            zero_terms.append((value, usage))
+
+    options = (normal_terms, zero_terms)
+    _term_cache[num_digits] = options
+    return options
+
+
+def _get_term_pool(num_digits):
+    # (値, 使う数字の個数, 0の項か) の候補リスト（5桁では約9万件あるので、探索のたびに作り直さない）
+    pool = _term_pool_cache.get(num_digits)
+    if pool is None:
+        normal_terms, zero_terms = get_term_options(num_digits)
+        pool = [(value, usage, 0) for value, usage in normal_terms]
+        pool += [(value, usage, 1) for value, usage in zero_terms]
+        _term_pool_cache[num_digits] = pool
+    return pool
+
+
+def digit_base_count(num_digits, num_lines, zero_count):
+    """create_digits_pool と同じく、1～9 をそれぞれ最低この回数だけ使う（厳密抽出・適応生成でも使う）"""
+    normal_lines = num_lines - zero_count
+    total_needed = (normal_lines * num_digits) + (zero_count * (num_digits - 1))
+    return total_needed // 9
+
+
+def can_still_reach(need, plus_left, minus_left, num_digits):
+    """
+    残りの口数で、足りないカウントをまだ埋められるか（大まかな上限で判定。厳密抽出の枝刈りでも使う）
+    need: 技法ごとの足りない回数のリスト（TECHNIQUE_NAMES の順）
+    """
+    if need[PB] > plus_left * num_digits or need[MB] > minus_left * num_digits:
+        return False
+    if need[P5] + need[P15] > plus_left * num_digits:
+        return False
+    # P10は繰り上がりで1桁上の位でも発生しうる
+    if need[P5] + need[P10] + need[P15] > plus_left * (num_digits + 1):
+        return False
+    if need[M5] > minus_left * num_digits:
+        return False
+    if need[M5] + need[M10] + need[M15] > minus_left * num_digits:
+        return False
+    return True
+
+
+class _Search:
+    """目標カウントに合う数列を、1項ずつ組み立てながらバックトラックで探す"""
+
+    def __init__(self, num_digits, num_lines, zero_count, minus_count, limits, max_nodes, rng):
+        self.num_digits = num_digits
+        self.num_lines = num_lines
+        self.minus_count = minus_count
+        self.zero_count = zero_count
+        self.limits = limits
+        self.targets = [0 if t is None else t for t in limits.limits]
+        self.constrained = [t is not None for t in limits.limits]
+        self.min_sum = 10 ** (num_digits - 1)
+        self.max_sum = (10 ** (num_digits + 1)) - 1
+        self.base_count = digit_base_count(num_digits, num_lines, zero_count)
+        self.term_pool = _get_term_pool(num_digits)
+        self.nodes_left = max_nodes
+        self.rng = rng
+
+        self.terms = []
+        self.used_abs = set()
+        self.used_digits = [0] * 10
+
+    def _digits_still_coverable(self, lines_left, zero_left):
+        # 1～9 の不足分を、残りの項の数字で埋められるか
+        slots = (lines_left - zero_left) * self.num_digits + zero_left * (self.num_digits - 1)
+        deficit = 0
+        for d in range(1, 10):
+            if self.used_digits[d] < self.base_count:
+                deficit += self.base_count - self.used_digits[d]
+        return deficit <= slots
+
+    def _need(self, packed):
+        counts = unpack_counts(packed - self.limits.bias)
+        return [self.targets[f] - counts[f] if self.constrained[f] else 0 for f in range(len(counts))]
+
+    def _candidates(self, current_sum, packed, minus_left, zero_left):
+        position = len(self.terms)
+        lines_left = self.num_lines - position
+        signs = []
+        if minus_left < lines_left:
+            signs.append(1)
+        if position > 0 and minus_left > 0:
+            signs.append(-1)
+
+        allow_normal = zero_left < lines_left
+        allow_zero = zero_left > 0
+
+        need = self._need(packed)
+        guard_mask = self.limits.guard_mask
+        candidates = []
+        sample = self.rng.sample(self.term_pool, min(SAMPLE_SIZE, len(self.term_pool)))
+        for value, usage, zero_used in sample:
+            if value in self.used_abs:
+                continue
+            if not (allow_zero if zero_used else allow_normal):
+                continue
+            for sign in signs:
+                new_sum = current_sum + sign * value
+                if not (self.min_sum <= new_sum <= self.max_sum):
+                    continue
+                delta = classify_term(current_sum, sign * value, self.num_digits)
+                if (packed + delta) & guard_mask:
+                    continue
+                # 目標に向けて役に立つカウントの数を優先度に使う
+                progress = 0
+                rest = delta
+                for field in range(len(TECHNIQUE_NAMES)):
+                    if need[field] > 0:
+                        progress += min(rest & FIELD_MASK, need[field])
+                    rest >>= FIELD_BITS
+                key = self.rng.random() - PROGRESS_WEIGHT * progress
+                candidates.append((key, sign * value, usage, delta, zero_used))
+        candidates.sort(key=lambda c: c[0])
+        return candidates
+
+    def run(self, current_sum=0, packed=None, minus_left=None, zero_left=None):
+        if packed is None:
+            packed = self.limits.bias
+            minus_left = self.minus_count
+            zero_left = self.zero_count
+
+        position = len(self.terms)
+        if position == self.num_lines:
+            need = self._need(packed)
+            return not any(need)
+
+        self.nodes_left -= 1
+        if self.nodes_left < 0:
+            return False
+
+        for _, term, usage, delta, zero_used in self._candidates(current_sum, packed, minus_left, zero_left):
+            new_packed = packed + delta
+            next_minus = minus_left - (1 if term < 0 else 0)
+            next_zero = zero_left - zero_used
+            lines_left = self.num_lines - position - 1
+            plus_left = lines_left - next_minus
+            if not can_still_reach(self._need(new_packed), plus_left, next_minus, self.num_digits):
+                continue
+
+            for d in range(10):
+                self.used_digits[d] += usage[d]
+            if self._digits_still_coverable(lines_left, next_zero):
+                self.terms.append(term)
+                self.used_abs.add(abs(term))
+                if self.run(current_sum + term, new_packed, next_minus, next_zero):
+                    return True
+                self.terms.pop()
+                self.used_abs.discard(abs(term))
+            for d in range(10):
+                self.used_digits[d] -= usage[d]
+
+            if self.nodes_left < 0:
+                return False
+        return False
+
+
+def generate_targeted_problem(num_digits, num_lines, zero_count, minus_count, limits,
+                              max_nodes=300, restarts=30, rng=None):
+    """
+    目標の技法カウント(limits)に一致する問題を、1項ずつ組み立てて生成する
+    ランダム生成してから捨てるのではなく、途中の累積和・カウントから到達不能な枝を刈り込む
+    制約は generate_single_problem と同じ（0の項・マイナスの数・絶対値の重複なし・累積和の範囲・数字の偏り）
+    limits: classify_logic.TechniqueLimits（指定した技法は目標値と完全一致させる）
+    戻り値: (数列, 答え) または 見つからなければ None
+    """
+    if num_digits < 2:
+        raise ValueError(f"generate_targeted_problem は {num_digits} 桁に対応していません。")
+    if minus_count >= num_lines or zero_count > num_lines:
+        return None
+
+    rng = rng or random
+    for _ in range(restarts):
+        search = _Search(num_digits, num_lines, zero_count, minus_count, limits, max_nodes, rng)
+        if search.run():
+            return list(search.terms), sum(search.terms)
+    return None
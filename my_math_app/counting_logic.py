@@ -0,0 +1,577 @@
+from bisect import bisect_right
+from collections import Counter
+from math import comb
+import random
+import time
+
+from classify_logic import (FIELD_BITS, FIELD_MASK, GUARD_BIT, TECHNIQUE_NAMES, TechniqueCounts, TechniqueLimits,
+                            classify_sequence, get_transition_table)
+from constructive_generater import can_still_reach, digit_base_count, get_term_options
+from problem_generater import has_duplicate_absolute_values
+
+# 難しさの分類に使う技法（PB/MBは基本なので既定では数えない）
+DEFAULT_FIELDS = ("p5", "m5", "p10", "m10", "p15", "m15")
+# 状態数の上限（全段の合計と作成中の段の合計。超える設定は数え切れないので CountingLimitError にする）
+MAX_STATES = 1000000
+# 絶対値の重複を除いて数えるときの状態数の上限（使った絶対値も状態に入るので、口数が多い設定は数え切れない）
+MAX_DISTINCT_STATES = 2000000
+# 1回の数え上げ（取り出し用と、重複を除いた数え直しのそれぞれ）にかける時間の上限（秒）
+MAX_BUILD_SECONDS = 10.0
+# estimate_histogram で取り出す数列の数（2桁8口で1つ2ミリ秒ほどかかる）
+HISTOGRAM_SAMPLES = 5000
+# 数字をランダムに並べたときに偏りの条件を満たす確率がこれより低ければ、数字プールもDPの状態に入れる
+# （高ければ状態数を増やさず、取り出した後に棄却するほうが速い）
+POOL_TRACKING_RATE = 0.01
+# マイナスの項・0の項の使用数は、技法カウントの後ろのフィールドに入れる
+MINUS_FIELD = len(TECHNIQUE_NAMES)
+ZERO_FIELD = MINUS_FIELD + 1
+# さらにその上に、数字1～9の使用回数（base_count で頭打ち）を入れる
+POOL_SHIFT = (ZERO_FIELD + 1) * FIELD_BITS
+COUNT_MASK = (1 << POOL_SHIFT) - 1
+# 作った ExactCounter を設定ごとに残しておく数
+COUNTER_CACHE_SIZE = 4
+# 数え上げに対応する桁数の上限（4桁以上は項の候補が数千～数万通りあり、1段の遷移だけで時間がかかりすぎる）
+EXACT_MAX_DIGITS = 3
+# --check で、全列挙と数え上げの結果を突き合わせる設定（全列挙が合わせて数十秒で終わる大きさ）
+CHECK_CONFIGS = [(2, 2, 0, 1), (2, 3, 0, 1), (2, 3, 1, 1), (2, 3, 0, 2)]
+
+_counter_cache = {}
+
+
+class CountingLimitError(ValueError):
+    """状態数や時間の上限を超えて数え切れなかった（設定として作れないわけではない）"""
+
+
+def _bit(field):
+    return 1 << (field * FIELD_BITS)
+
+
+def digit_balance_rate(total_digits, base_count):
+    """1～9から total_digits 個を一様に選んだとき、どの数字も base_count 回以上出る確率"""
+    # ways[k]: k個の（区別できる）位置に、ここまでの数字をそれぞれ base_count 回以上ずつ置く方法の数
+    ways = [1] + [0] * total_digits
+    for _ in range(9):
+        ways = [sum(comb(placed, k) * ways[placed - k] for k in range(base_count, placed + 1))
+                for placed in range(total_digits + 1)]
+    return ways[total_digits] / 9 ** total_digits
+
+
+class ExactCounter:
+    """
+    1つの設定について、条件を満たす数列の数を技法カウントの組（シグネチャ）ごとに動的計画法で数え、
+    指定したシグネチャの数列を一様に取り出す
+    状態は (累積和, 技法カウント, マイナスの項と0の項の使用数, 数字プールの使用状況) で、1口ずつ前から数え上げる
+    数字プールは create_digits_pool と同じく「1～9をそれぞれ base_count 回以上使う」条件で、
+    条件が緩い設定では状態に入れず、絶対値の重複と合わせて sample() で取り出した後に棄却する
+    （棄却しても残りの数列の中では一様のまま）
+    total() / histogram() は、生成器が出す数列（絶対値の重複なし・数字の偏りなし）だけを正確に数えるため、
+    使った絶対値も状態に入れて別に数え直す。状態数が口数とともに急に増えるので、数えられるのは
+    2桁3口程度までの小さい設定だけ（それより大きい設定では CountingLimitError）
+    大きい設定のシグネチャごとの数は、candidate_histogram()（重複を含む上限）と
+    estimate_histogram()（一様に取り出した数列の棄却率で補正した推定値）で分かる
+    limits: TechniqueLimits（指定した技法が目標と一致する数列だけを数える。None なら全数列）
+    fields: ヒストグラムで区別する技法名（既定: limits で指定した技法、limits も無ければ DEFAULT_FIELDS）
+    max_states / max_seconds: 状態数と時間の上限（超えたら段の途中でも諦めて CountingLimitError）
+    """
+
+    def __init__(self, num_digits, num_lines, zero_count, minus_count, limits=None, fields=None,
+                 max_states=MAX_STATES, max_seconds=MAX_BUILD_SECONDS):
+        if num_digits > EXACT_MAX_DIGITS:
+            raise ValueError(f"厳密抽出は{EXACT_MAX_DIGITS}桁までに対応しています。"
+                             "4桁以上は探索生成・一括生成・ランダム生成を使ってください。")
+        self.num_digits = num_digits
+        self.num_lines = num_lines
+        self.zero_count = zero_count
+        self.minus_count = minus_count
+        self.max_seconds = max_seconds
+        self.limits = limits if limits is not None else TechniqueLimits()
+        if fields is None:
+            fields = [name for name, limit in zip(TECHNIQUE_NAMES, self.limits.limits) if limit is not None] \
+                or DEFAULT_FIELDS
+        self.fields = tuple(TECHNIQUE_NAMES.index(name) for name in fields)
+        for field, limit in enumerate(self.limits.limits):
+            if limit is not None and field not in self.fields:
+                self.fields += (field,)
+
+        normal_terms, zero_terms = get_term_options(num_digits)
+        self._options = [(value, 0) for value, _ in normal_terms] + [(value, 1) for value, _ in zero_terms]
+        self._base_count = digit_base_count(num_digits, num_lines, zero_count)
+        total_digits = (num_lines - zero_count) * num_digits + zero_count * (num_digits - 1)
+        self.tracks_pool = bool(self._base_count) and \
+            digit_balance_rate(total_digits, self._base_count) < POOL_TRACKING_RATE
+        # プールを状態に入れるときの、数字1つあたりのビット数（入れないなら0）
+        self._pool_width = self._base_count if self.tracks_pool else 0
+        self._digit_usage = {value: usage for value, usage in normal_terms + zero_terms}
+        self._full_pool = ((1 << (9 * self._pool_width)) - 1) << POOL_SHIFT
+
+        self._track_mask = sum(FIELD_MASK << (field * FIELD_BITS) for field in self.fields)
+        # 目標とマイナス/0の項の数は TechniqueLimits と同じバイアスとガードビットで超過を検出する
+        self._bias = self.limits.bias + ((GUARD_BIT - 1 - minus_count) << (MINUS_FIELD * FIELD_BITS)) \
+            + ((GUARD_BIT - 1 - zero_count) << (ZERO_FIELD * FIELD_BITS))
+        self._guard_mask = self.limits.guard_mask + (GUARD_BIT << (MINUS_FIELD * FIELD_BITS)) \
+            + (GUARD_BIT << (ZERO_FIELD * FIELD_BITS))
+        self._transition_cache = {}
+        self._layers = self._build(max_states)
+
+        # 最後の段で、マイナス/0の項とプールを使い切り、目標と一致している状態だけを残す
+        goal_fields = [field for field in range(ZERO_FIELD + 1)
+                       if (self._guard_mask >> (field * FIELD_BITS)) & GUARD_BIT]
+        goal_mask = sum(FIELD_MASK << (field * FIELD_BITS) for field in goal_fields) | self._full_pool
+        goal = sum((GUARD_BIT - 1) << (field * FIELD_BITS) for field in goal_fields) | self._full_pool
+        self._finals = []
+        for current_sum, keys in self._layers[-1].items():
+            for key, count in keys.items():
+                if key & goal_mask == goal:
+                    self._finals.append((self._signature(key), current_sum, key, count))
+        self._sampling_cache = {}
+        self._index = {}
+        self._distinct_histogram = None
+
+    def _use_digits(self, key, term, width=None):
+        """
+        項で使う数字をプールの使用回数に加える
+        使用回数は数字ごとに width（省略時は _pool_width）ビットの「下から1を詰める」形で持ち、base_count で頭打ちにする
+        """
+        width = self._pool_width if width is None else width
+        width_mask = (1 << width) - 1
+        usage = self._digit_usage[abs(term)]
+        for digit in range(1, 10):
+            times = usage[digit]
+            if times:
+                shift = POOL_SHIFT + (digit - 1) * width
+                used = (key >> shift) & width_mask
+                key += ((((used << times) | ((1 << times) - 1)) & width_mask) - used) << shift
+        return key
+
+    def _delta(self, current_sum, term, is_zero):
+        """1口入れたときのキーの増分（数える技法のカウントと、マイナス/0の項の使用数）"""
+        delta = get_transition_table(self.num_digits).delta(current_sum, term) & self._track_mask
+        if term < 0:
+            delta += _bit(MINUS_FIELD)
+        if is_zero:
+            delta += _bit(ZERO_FIELD)
+        return delta
+
+    def _transitions(self, current_sum):
+        """
+        累積和から1口進めたときの (次の累積和, キーの増分, 項, プールに立てるビット) のリスト
+        base_count が1のときは使用回数が「使ったかどうか」だけなので、プールの更新はビットORで済む
+        """
+        transitions = self._transition_cache.get(current_sum)
+        if transitions is not None:
+            return transitions
+        min_sum = 10 ** (self.num_digits - 1)
+        max_sum = (10 ** (self.num_digits + 1)) - 1
+        transitions = []
+        for value, is_zero in self._options:
+            for term in (value, -value):
+                next_sum = current_sum + term
+                if min_sum <= next_sum <= max_sum:
+                    pool_bits = self._use_digits(0, term) if self._pool_width == 1 else 0
+                    transitions.append((next_sum, self._delta(current_sum, term, is_zero), term, pool_bits))
+        self._transition_cache[current_sum] = transitions
+        return transitions
+
+    def _check_budget(self, states, max_states, deadline, target):
+        # 枝刈り前の状態も数えて、状態数か時間が上限を超えたら、段の途中でも早めに諦める
+        if states > max_states:
+            raise CountingLimitError(f"状態数が上限({max_states})を超えたため、{target}は数え切れません。")
+        if time.perf_counter() > deadline:
+            raise CountingLimitError(f"{self.max_seconds:g}秒以内に終わらなかったため、{target}は数え切れません。")
+
+    def _build(self, max_states):
+        deadline = time.perf_counter() + self.max_seconds
+        guard_mask = self._guard_mask
+        pool_width = self._pool_width
+        use_digits = self._use_digits
+        layers = [{0: {self._bias: 1}}]
+        total_states = 1
+        for position in range(self.num_lines):
+            next_layer = {}
+            created = 0
+            for current_sum, keys in layers[-1].items():
+                for next_sum, delta, term, pool_bits in self._transitions(current_sum):
+                    next_keys = next_layer.get(next_sum)
+                    if next_keys is None:
+                        next_keys = next_layer[next_sum] = {}
+                    before = len(next_keys)
+                    for key, count in keys.items():
+                        next_key = key + delta
+                        if next_key & guard_mask:
+                            continue
+                        if pool_bits:
+                            next_key |= pool_bits
+                        elif pool_width:
+                            next_key = use_digits(next_key, term)
+                        next_keys[next_key] = next_keys.get(next_key, 0) + count
+                    created += len(next_keys) - before
+                    self._check_budget(total_states + created, max_states, deadline, "この設定")
+            next_layer = self._prune(next_layer, self.num_lines - position - 1)
+            total_states += sum(len(keys) for keys in next_layer.values())
+            layers.append(next_layer)
+        return layers
+
+    def _build_distinct(self, max_states):
+        """
+        絶対値が重複しない数列だけを数える
+        数字プールは tracks_pool に関係なく状態に入れ（偏りの条件を枝刈りにも使う）、
+        その上に使った絶対値を値ごとの1ビットで持つ
+        戻り値: 最後の段 {累積和: {キー: 数}}
+        """
+        deadline = time.perf_counter() + self.max_seconds
+        guard_mask = self._guard_mask
+        width = self._base_count
+        used_shift = POOL_SHIFT + 9 * width
+        layer = {0: {self._bias: 1}}
+        total_states = 1
+        for position in range(self.num_lines):
+            next_layer = {}
+            created = 0
+            for current_sum, keys in layer.items():
+                for next_sum, delta, term, _ in self._transitions(current_sum):
+                    used_bit = 1 << (used_shift + abs(term))
+                    pool_bits = self._use_digits(0, term, width) if width == 1 else 0
+                    next_keys = next_layer.get(next_sum)
+                    if next_keys is None:
+                        next_keys = next_layer[next_sum] = {}
+                    before = len(next_keys)
+                    for key, count in keys.items():
+                        if key & used_bit:
+                            continue
+                        next_key = key + delta
+                        if next_key & guard_mask:
+                            continue
+                        if pool_bits:
+                            next_key |= pool_bits
+                        elif width:
+                            next_key = self._use_digits(next_key, term, width)
+                        next_keys[next_key | used_bit] = next_keys.get(next_key | used_bit, 0) + count
+                    created += len(next_keys) - before
+                    self._check_budget(total_states + created, max_states, deadline,
+                                       "絶対値の重複を除いたこの設定の問題数")
+            layer = self._prune(next_layer, self.num_lines - position - 1, width)
+            total_states += sum(len(keys) for keys in layer.values())
+        return layer
+
+    def _prune(self, layer, lines_left, pool_width=None):
+        """
+        残りの口数では、マイナス/0の項・数字プール・目標カウントを満たせなくなった状態を捨てる
+        pool_width: キーに入っている数字プールの、数字1つあたりのビット数（省略時は _pool_width）
+        """
+        limits = self.limits.limits
+        pool_size = 9 * (self._pool_width if pool_width is None else pool_width)
+        pool_mask = (1 << pool_size) - 1
+        # プール以外の部分が同じ状態は判定結果も同じなので、残りの数字の個数（満たせなければ -1）を覚えておく
+        digit_slots = {}
+        pruned = {}
+        for current_sum, keys in layer.items():
+            kept = {}
+            for key, count in keys.items():
+                counts_key = key & COUNT_MASK
+                slots = digit_slots.get(counts_key)
+                if slots is None:
+                    slots = -1
+                    minus_left = self.minus_count - self._field(key, MINUS_FIELD)
+                    zero_left = self.zero_count - self._field(key, ZERO_FIELD)
+                    if minus_left <= lines_left and zero_left <= lines_left:
+                        need = [0 if limit is None else limit - self._field(key, field)
+                                for field, limit in enumerate(limits)]
+                        if can_still_reach(need, lines_left - minus_left, minus_left, self.num_digits):
+                            slots = lines_left * self.num_digits - zero_left
+                    digit_slots[counts_key] = slots
+                if slots < 0 or pool_size - bin((key >> POOL_SHIFT) & pool_mask).count("1") > slots:
+                    continue
+                kept[key] = count
+            if kept:
+                pruned[current_sum] = kept
+        return pruned
+
+    def _field(self, key, field):
+        # バイアスを外した値を取り出す
+        value = (key >> (field * FIELD_BITS)) & FIELD_MASK
+        return value - ((self._bias >> (field * FIELD_BITS)) & FIELD_MASK)
+
+    def _signature(self, key):
+        return TechniqueCounts(*[self._field(key, field) if field in self.fields else None
+                                 for field in range(len(TECHNIQUE_NAMES))])
+
+    def total(self):
+        """limits に一致し、生成器が出しうる（絶対値の重複も数字の偏りもない）数列の数"""
+        return sum(self.histogram().values())
+
+    def histogram(self):
+        """
+        シグネチャ（fields 以外は None の TechniqueCounts）ごとの数列の数（数え方は total() と同じ）
+        初回だけ数え直す。状態数が MAX_DISTINCT_STATES を超えるか max_seconds で終わらない設定では CountingLimitError
+        """
+        if self._distinct_histogram is None:
+            goal_fields = [field for field in range(ZERO_FIELD + 1)
+                           if (self._guard_mask >> (field * FIELD_BITS)) & GUARD_BIT]
+            full_pool = ((1 << (9 * self._base_count)) - 1) << POOL_SHIFT
+            goal_mask = sum(FIELD_MASK << (field * FIELD_BITS) for field in goal_fields) | full_pool
+            goal = sum((GUARD_BIT - 1) << (field * FIELD_BITS) for field in goal_fields) | full_pool
+            histogram = Counter()
+            for keys in self._build_distinct(MAX_DISTINCT_STATES).values():
+                for key, count in keys.items():
+                    if key & goal_mask == goal:
+                        histogram[self._signature(key & COUNT_MASK)] += count
+            self._distinct_histogram = dict(histogram)
+        return dict(self._distinct_histogram)
+
+    def candidate_histogram(self):
+        """
+        取り出しに使う数列の数のシグネチャごとの内訳（candidate_total() と同じく、絶対値の重複などを含む上限）
+        数え直しをしないので、取り出し用の数え上げができる設定ならいつでも分かる
+        """
+        histogram = Counter()
+        for signature, _, _, count in self._finals:
+            histogram[signature] += count
+        return dict(histogram)
+
+    def estimate_histogram(self, samples=HISTOGRAM_SAMPLES, rng=None):
+        """
+        histogram() の推定値（histogram() が CountingLimitError になる大きい設定用）
+        数えた数列から samples 個を一様に取り出し、残りの条件（絶対値の重複・数字の偏り）を満たした割合を
+        シグネチャごとに candidate_total() に掛ける（まれなシグネチャほど誤差が大きく、取り出されなければ入らない）
+        """
+        rng = rng or random
+        total = self.candidate_total()
+        accepted = Counter()
+        if total:
+            for _ in range(samples):
+                terms = self.draw(rng=rng)
+                if self.is_acceptable(terms):
+                    counts = classify_sequence(terms, self.num_digits)
+                    accepted[TechniqueCounts(*[value if field in self.fields else None
+                                               for field, value in enumerate(counts)])] += 1
+        return {signature: total * hits / samples for signature, hits in accepted.items()}
+
+    def candidate_total(self):
+        """
+        取り出しに使う数列の数（絶対値の重複を含み、tracks_pool が False なら数字の偏りも含む上限）
+        0 なら目標に一致する問題は作れない
+        """
+        return sum(count for _, _, _, count in self._finals)
+
+    def _sampling_table(self, signature):
+        table = self._sampling_cache.get(signature)
+        if table is None:
+            states = []
+            cumulative = []
+            total = 0
+            for final_signature, current_sum, key, count in self._finals:
+                if signature is not None and any(want is not None and want != got
+                                                 for want, got in zip(signature, final_signature)):
+                    continue
+                total += count
+                states.append((current_sum, key))
+                cumulative.append(total)
+            table = (states, cumulative)
+            self._sampling_cache[signature] = table
+        return table
+
+    def _previous_states(self, position, current_sum):
+        """段 position の累積和 current_sum の状態を、プールを除いたキーでまとめた索引"""
+        index = self._index.get((position, current_sum))
+        if index is None:
+            index = {}
+            for key, count in self._layers[position].get(current_sum, {}).items():
+                index.setdefault(key & COUNT_MASK, []).append((key, count))
+            self._index[(position, current_sum)] = index
+        return index
+
+    def _pick(self, cumulative, rng):
+        # 重みが非常に大きな整数でも偏らないよう、整数の乱数で選ぶ
+        return bisect_right(cumulative, rng.randrange(cumulative[-1]))
+
+    def draw(self, signature=None, rng=None):
+        """
+        数えた数列の中から1つを一様に取り出す（絶対値の重複などの棄却はまだ行わない）
+        signature: TechniqueCounts または {"p5": 1, ...}（None の技法は問わない）
+        """
+        rng = rng or random
+        if isinstance(signature, dict):
+            signature = TechniqueCounts(**{name: signature.get(name) for name in TECHNIQUE_NAMES})
+        if signature is not None:
+            for field, want in enumerate(signature):
+                if want is not None and field not in self.fields:
+                    raise ValueError(f"{TECHNIQUE_NAMES[field].upper()} は数えていないので指定できません。")
+        states, cumulative = self._sampling_table(signature)
+        if not states:
+            return None
+
+        current_sum, key = states[self._pick(cumulative, rng)]
+        terms = []
+        # 後ろの段から、前の状態の数に比例して1口ずつ戻る
+        for position in range(self.num_lines, 0, -1):
+            previous_layer = self._layers[position - 1]
+            candidates = []
+            weights = []
+            total = 0
+            for value, is_zero in self._options:
+                for term in (value, -value):
+                    previous_sum = current_sum - term
+                    if previous_sum not in previous_layer:
+                        continue
+                    previous_counts = (key & COUNT_MASK) - self._delta(previous_sum, term, is_zero)
+                    for previous_key, count in self._previous_states(position - 1, previous_sum).get(
+                            previous_counts, ()):
+                        if self._pool_width and (self._use_digits(previous_key, term) ^ key) & ~COUNT_MASK:
+                            continue
+                        total += count
+                        candidates.append((previous_sum, previous_key, term))
+                        weights.append(total)
+            current_sum, key, term = candidates[self._pick(weights, rng)]
+            terms.append(term)
+        terms.reverse()
+        return terms
+
+    def is_acceptable(self, terms):
+        """DPで数えていない条件（絶対値の重複、必要なら数字の偏り）を満たしているか"""
+        if has_duplicate_absolute_values(terms):
+            return False
+        if self._base_count and not self.tracks_pool:
+            digit_counts = [0] * 10
+            for term in terms:
+                for digit, times in enumerate(self._digit_usage[abs(term)]):
+                    digit_counts[digit] += times
+            if min(digit_counts[1:]) < self._base_count:
+                return False
+        return True
+
+    def sample(self, signature=None, rng=None, max_tries=1000, stats=None):
+        """
+        signature に一致する問題を一様に1つ取り出し、(数列, 答え) を返す
+        max_tries 回取り出しても残りの条件を満たさなければ None
+        stats: stats_logic.GenerationStats（指定すると棄却数を記録する）
+        """
+        for _ in range(max_tries):
+            terms = self.draw(signature, rng)
+            if terms is None:
+                return None
+            if self.is_acceptable(terms):
+                return terms, sum(terms)
+            if stats is not None:
+                stats.count("exact_draw_rejections")
+        return None
+
+
+def get_exact_counter(num_digits, num_lines, zero_count, minus_count, limits=None):
+    """設定と目標ごとに ExactCounter を作り、最近使ったものを使い回す"""
+    key = (num_digits, num_lines, zero_count, minus_count, None if limits is None else tuple(limits.limits))
+    counter = _counter_cache.pop(key, None)
+    if counter is None:
+        counter = ExactCounter(num_digits, num_lines, zero_count, minus_count, limits)
+        if len(_counter_cache) >= COUNTER_CACHE_SIZE:
+            del _counter_cache[next(iter(_counter_cache))]
+    _counter_cache[key] = counter
+    return counter
+
+
+def enumerate_histogram(num_digits, num_lines, zero_count, minus_count, fields=DEFAULT_FIELDS):
+    """
+    ExactCounter.histogram() の検算用に、生成器が出しうる数列を1つずつ列挙してシグネチャごとに数える
+    （最初の項は正、マイナス/0の項はちょうど指定数、絶対値の重複なし、累積和は範囲内、1～9の偏りなし）
+    列挙する数だけ時間がかかるので、3口程度の設定にだけ使う
+    """
+    normal_terms, zero_terms = get_term_options(num_digits)
+    options = [(value, usage, 0) for value, usage in normal_terms] + [(value, usage, 1) for value, usage in zero_terms]
+    base_count = digit_base_count(num_digits, num_lines, zero_count)
+    min_sum = 10 ** (num_digits - 1)
+    max_sum = (10 ** (num_digits + 1)) - 1
+    tracked = [name in fields for name in TECHNIQUE_NAMES]
+    histogram = Counter()
+    sequence = []
+    used = []
+
+    def visit(current_sum, minus_left, zero_left):
+        if len(sequence) == num_lines:
+            if minus_left or zero_left:
+                return
+            digit_counts = [sum(usage[digit] for usage in used) for digit in range(10)]
+            if min(digit_counts[1:]) < base_count:
+                return
+            counts = classify_sequence(sequence, num_digits)
+            histogram[TechniqueCounts(*[count if track else None for count, track in zip(counts, tracked)])] += 1
+            return
+        for value, usage, is_zero in options:
+            if is_zero > zero_left or value in (abs(term) for term in sequence):
+                continue
+            for term in (value, -value):
+                if term < 0 and (not sequence or not minus_left):
+                    continue
+                if not min_sum <= current_sum + term <= max_sum:
+                    continue
+                sequence.append(term)
+                used.append(usage)
+                visit(current_sum + term, minus_left - (term < 0), zero_left - is_zero)
+                sequence.pop()
+                used.pop()
+
+    visit(0, minus_count, zero_count)
+    return dict(histogram)
+
+
+def cross_check(configs=CHECK_CONFIGS, fields=DEFAULT_FIELDS):
+    """数え上げと全列挙のヒストグラムを設定ごとに比べ、[(設定, 数え上げの総数, 全列挙の総数, 一致したか), ...] を返す"""
+    results = []
+    for config in configs:
+        counted = ExactCounter(*config, fields=fields).histogram()
+        enumerated = enumerate_histogram(*config, fields=fields)
+        results.append((config, sum(counted.values()), sum(enumerated.values()), counted == enumerated))
+    return results
+
+
+def main():
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="設定ごとに、技法カウントの組ごとの数列の数を数える")
+    parser.add_argument("--digits", type=int, default=2, help="桁数")
+    parser.add_argument("--lines", type=int, default=3, help="口数")
+    parser.add_argument("--zeros", type=int, default=0, help="0の数")
+    parser.add_argument("--minus", type=int, default=1, help="マイナスの数")
+    parser.add_argument("--fields", default=",".join(DEFAULT_FIELDS), help="区別する技法（カンマ区切り）")
+    parser.add_argument("--top", type=int, default=20, help="表示する組の数")
+    parser.add_argument("--max-seconds", type=float, default=MAX_BUILD_SECONDS, help="数え上げにかける時間の上限（秒）")
+    parser.add_argument("--samples", type=int, default=HISTOGRAM_SAMPLES,
+                        help="正確に数え切れないときに、推定のために取り出す数列の数")
+    parser.add_argument("--check", action="store_true", help="小さい設定で、数え上げの結果を全列挙と突き合わせる")
+    args = parser.parse_args()
+
+    if args.check:
+        failed = False
+        for config, counted, enumerated, matched in cross_check(fields=args.fields.split(",")):
+            failed = failed or not matched
+            print(f"{config}: 数え上げ {counted} / 全列挙 {enumerated} {'一致' if matched else '不一致'}")
+        raise SystemExit(1 if failed else 0)
+
+    try:
+        counter = ExactCounter(args.digits, args.lines, args.zeros, args.minus, fields=args.fields.split(","),
+                               max_seconds=args.max_seconds)
+    except CountingLimitError as error:
+        print(f"エラー: {error}口数や --fields の技法を減らすか、--max-seconds を増やしてください。", file=sys.stderr)
+        raise SystemExit(1)
+    except ValueError as error:
+        print(f"エラー: {error}", file=sys.stderr)
+        raise SystemExit(2)
+    try:
+        histogram = counter.histogram()
+        label = "数列の数"
+    except CountingLimitError as error:
+        # 絶対値の重複を除いて数え切れない設定は、取り出した数列の棄却率で補正した推定値を出す
+        print(f"{error}{args.samples}個の数列を取り出して推定します。", file=sys.stderr)
+        histogram = counter.estimate_histogram(args.samples)
+        label = f"数列の数の推定値（重複を含む上限 {counter.candidate_total()} から推定）"
+    total = sum(histogram.values())
+    # 正確に数えた数は整数のまま、推定値は有効数字4桁で出す
+    number_format = "d" if isinstance(total, int) else ".4g"
+    print(f"{label}: {total:{number_format}}（技法カウントの組: {len(histogram)}種類）")
+    for signature, count in sorted(histogram.items(), key=lambda item: -item[1])[:args.top]:
+        label = ", ".join(f"{name.upper()}={value}" for name, value in zip(TECHNIQUE_NAMES, signature)
+                          if value is not None)
+        print(f"{label}: {count:{number_format}} ({count / total:.2%})")
+
+
+if __name__ == "__main__":
+    main()
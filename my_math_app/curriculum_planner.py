@@ -0,0 +1,196 @@
+"""
+複数の難易度（設定・目標・問題数の組）をまとめて生成する
+設定ごとに1本の生成の流れを作り、判定した候補を、目標が一致するまだ埋まっていない注文すべてに振り分ける
+（難易度ごとに別々に棄却サンプリングするより、設定ごとにほぼ1回分の生成で済む）
+
+使い方:
+    requests = [
+        CurriculumRequest((2, 8, 2, 3), {"p5": 1, "p10": 0}, 20),
+        CurriculumRequest((2, 8, 2, 3), {"p5": 1, "p10": 1}, 20),
+        CurriculumRequest((2, 8, 2, 3), {"p10": 2, "m10": 1}, 20),
+    ]
+    result = plan_curriculum(requests, timeout_seconds=60)
+    result[0]  # 1つ目の注文の [(数列, 答え, TechniqueCounts), ...]
+"""
+import time
+from collections import namedtuple
+
+from classify_logic import TechniqueCounts, TechniqueLimits, classify_sequence_within
+from dedup_index import canonical_key
+from problem_generater import BATCH_SIZE, MODE_BATCH, MODE_RANDOM, generate_single_problem
+
+# config: (桁数, 口数, 0の数, マイナスの数)、targets: TechniqueLimits または {"p5": 1, ...} の辞書、count: 問題数
+CurriculumRequest = namedtuple("CurriculumRequest", ["config", "targets", "count"])
+
+# 共有の生成に対応する生成方式（目標から組み立てる方式は、注文ごとの目標に縛られるので共有できない）
+SHARED_MODES = (MODE_RANDOM, MODE_BATCH)
+
+
+class _Router:
+    """
+    1つの設定の注文を、指定した技法の組（マスク）ごとに「目標の値 → 注文」の辞書にまとめ、
+    候補1つをマスクの数だけの辞書引きで、一致する注文すべてに振り分ける
+    """
+
+    def __init__(self, indexed_requests):
+        self.groups = {}
+        self.remaining = {}
+        self.seen = {}
+        for index, request in indexed_requests:
+            mask = tuple(field for field, target in enumerate(request.targets.limits) if target is not None)
+            key = tuple(request.targets.limits[field] for field in mask)
+            self.groups.setdefault(mask, {}).setdefault(key, []).append(index)
+            self.remaining[index] = request.count
+            self.seen[index] = set()
+        self.open_count = sum(1 for count in self.remaining.values() if count > 0)
+
+    def upper_limits(self):
+        """どの注文にも一致しえない候補を判定の途中で打ち切るための上限（全注文が指定した技法だけ、その最大値）"""
+        limits = []
+        for field in range(len(TechniqueCounts._fields)):
+            if all(field in mask for mask in self.groups):
+                limits.append(max(key[mask.index(field)] for mask, buckets in self.groups.items() for key in buckets))
+            else:
+                limits.append(None)
+        return TechniqueLimits(*limits)
+
+    def match(self, counts):
+        """counts に一致する、まだ埋まっていない注文の番号のリスト"""
+        matched = []
+        for mask, buckets in self.groups.items():
+            indices = buckets.get(tuple(counts[field] for field in mask))
+            if indices:
+                matched.extend(index for index in indices if self.remaining[index] > 0)
+        return matched
+
+    def fill(self, index, terms):
+        """同じ注文にまだ入っていない問題なら1問埋めて True を返す"""
+        key = canonical_key(terms)
+        if key in self.seen[index]:
+            return False
+        self.seen[index].add(key)
+        self.remaining[index] -= 1
+        if self.remaining[index] == 0:
+            self.open_count -= 1
+        return True
+
+
+def _normalize(request):
+    config, targets, count = request
+    if isinstance(targets, dict):
+        targets = TechniqueLimits(**targets)
+    return CurriculumRequest(tuple(config), targets, count)
+
+
+def iter_candidates(config, mode, limits, rng, stats):
+    """
+    設定を満たす候補を (数列, TechniqueCounts または None) で返し続ける（None は上限 limits を超えた候補か、生成の失敗）
+    生成に失敗したとき（一括生成で条件を満たす行が1つもなかったときも）は (None, None) を返すので、
+    呼び出し側は候補が見つからない設定でも、1回の試行ごとに時間切れや中断を確かめられる
+    目標で絞らない生成の流れなので、複数の目標で共有できる（generation_service でも使う）
+    """
+    digit_count = config[0]
+    if mode == MODE_BATCH:
+        # numpy は一括生成を使うときだけ読み込む
+        import numpy as np
+        from batch_logic import classify_batch, generate_batch
+
+        np_rng = np.random.default_rng(None if rng is None else rng.getrandbits(64))
+        while True:
+            sequences = generate_batch(*config, BATCH_SIZE, rng=np_rng, stats=stats)
+            if stats is not None:
+                stats.count("candidates", BATCH_SIZE)
+                stats.count("valid_candidates", len(sequences))
+            if not len(sequences):
+                yield None, None
+                continue
+            for row, row_counts in zip(sequences.tolist(), classify_batch(sequences, digit_count).tolist()):
+                yield row, TechniqueCounts(*row_counts)
+    while True:
+        if stats is not None:
+            stats.count("candidates")
+        result = generate_single_problem(*config, stats=stats, rng=rng)
+        if not result:
+            if stats is not None:
+                stats.count("generation_failures")
+            yield None, None
+            continue
+        if stats is not None:
+            stats.count("valid_candidates")
+        terms, _ = result
+        yield terms, classify_sequence_within(terms, digit_count, limits)
+
+
+def iter_curriculum(requests, mode=MODE_RANDOM, timeout_seconds=None, rng=None, stats=None, cancel_event=None,
+                    dedup=None, surplus=None):
+    """
+    注文（CurriculumRequest のリスト）を設定ごとにまとめ、設定ごとに1本の生成の流れから全注文を埋めるジェネレーター
+    候補は目標が一致するまだ埋まっていない注文すべてに入る（同じ問題が複数の注文に入ることはあるが、
+    1つの注文の中では重複しない）。その設定の注文がすべて埋まったら次の設定に進む
+    mode: MODE_RANDOM または MODE_BATCH（SHARED_MODES）
+    timeout_seconds: 全体の制限時間（None なら無制限）
+    dedup: dedup_index.DedupIndex など（出題済みの問題は使わず、振り分けた問題を add() する）
+    surplus: どの注文にも一致しなかった候補を受け取る関数 surplus(設定, 数列, 答え, TechniqueCounts)
+    戻り値: (注文の番号, 数列, 答え, TechniqueCounts) を見つかった順に yield する
+    """
+    if mode not in SHARED_MODES:
+        raise ValueError(f"まとめて生成できる生成方式は {', '.join(SHARED_MODES)} だけです（{mode} は目標ごとに生成します）。")
+    requests = [_normalize(request) for request in requests]
+    by_config = {}
+    for index, request in enumerate(requests):
+        by_config.setdefault(request.config, []).append((index, request))
+
+    start_time = time.time()
+    for config, indexed_requests in by_config.items():
+        router = _Router(indexed_requests)
+        if router.open_count == 0:
+            continue
+        # 上限を渡すのは、どの注文にも一致しない候補を早く捨てるためだけ（余りを受け取るときは全カウントを数える）
+        limits = router.upper_limits() if surplus is None else TechniqueLimits()
+        checked = 0
+        for terms, counts in iter_candidates(config, mode, limits, rng, stats):
+            # 時間と中断の確認は、一括生成の行ごとに行うと遅いので間引く（生成に失敗したときは必ず確かめる）
+            checked += 1
+            if checked % 64 == 0 or mode == MODE_RANDOM or terms is None:
+                if timeout_seconds is not None and time.time() - start_time > timeout_seconds:
+                    return
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+            if counts is None:
+                continue
+            matched = router.match(counts)
+            if not matched:
+                if stats is not None:
+                    stats.count("rejected_by_targets")
+                if surplus is not None:
+                    surplus(config, terms, sum(terms), counts)
+                continue
+            if dedup is not None and terms in dedup:
+                if stats is not None:
+                    stats.count("duplicate_problems")
+                continue
+            routed = False
+            for index in matched:
+                if router.fill(index, terms):
+                    routed = True
+                    yield index, terms, sum(terms), counts
+            if routed:
+                if stats is not None:
+                    stats.count("accepted")
+                if dedup is not None:
+                    dedup.add(terms)
+            if router.open_count == 0:
+                break
+
+
+def plan_curriculum(requests, mode=MODE_RANDOM, timeout_seconds=None, rng=None, stats=None, cancel_event=None,
+                    dedup=None, surplus=None):
+    """
+    iter_curriculum の結果を注文ごとに集める
+    戻り値: 注文と同じ順の [[(数列, 答え, TechniqueCounts), ...], ...]（時間切れなら足りない注文がある）
+    """
+    results = [[] for _ in requests]
+    for index, terms, ans, counts in iter_curriculum(requests, mode, timeout_seconds, rng, stats, cancel_event,
+                                                     dedup, surplus):
+        results[index].append((terms, ans, counts))
+    return results
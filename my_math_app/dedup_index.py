@@ -0,0 +1,126 @@
+import hashlib
+import json
+import math
+import os
+import threading
+
+# 既定の保存先（環境変数 DEDUP_INDEX_PATH で変更できる）
+DEFAULT_DEDUP_PATH = os.environ.get(
+    "DEDUP_INDEX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "dedup_index.bin"))
+
+# 既定で想定する問題数と誤判定率（100万問・10万分の1で約3MB）
+DEFAULT_CAPACITY = 1000000
+DEFAULT_ERROR_RATE = 1e-5
+
+_MAGIC = b"DEDUP1\n"
+_MASK64 = (1 << 64) - 1
+
+
+def canonical_key(terms):
+    """
+    並べ替えただけの問題が同じキーになるように、符号付きの項を小さい順に並べたバイト列にする
+    """
+    return ",".join(map(str, sorted(terms))).encode("ascii")
+
+
+def canonical_hash(terms):
+    """canonical_key の128ビットハッシュ（プロセスや実行をまたいでも同じ値になる）"""
+    return int.from_bytes(hashlib.blake2b(canonical_key(terms), digest_size=16).digest(), "little")
+
+
+class DedupIndex:
+    """
+    一度出した問題（項の順序違いも同じとみなす）を覚えておくブルームフィルター
+    件数によらずメモリはビット列の大きさ（capacity と error_rate で決まる）で一定で、
+    1問あたりの確認は hash_count 回のビット参照だけで済む
+    まれに新しい問題を「出題済み」と誤判定する（その問題を使わないだけで、重複は決して通さない）
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        # ブルームフィルターの最適なビット数とハッシュ関数の数
+        self.size_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.size_bits + 7) // 8)
+        self.count = 0
+        # アプリでは複数セッションから同時に使われるためロックする
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def _positions(self, terms):
+        # 1つの128ビットハッシュを2つに分けて、k個の位置を作る（ダブルハッシング）
+        value = canonical_hash(terms)
+        h1 = value & _MASK64
+        h2 = (value >> 64) | 1
+        return [(h1 + i * h2) % self.size_bits for i in range(self.hash_count)]
+
+    def __contains__(self, terms):
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(terms))
+
+    def add(self, terms):
+        """
+        問題を登録する。初めての問題なら True、出題済み（と判定された）なら False を返す
+        """
+        positions = self._positions(terms)
+        with self.lock:
+            bits = self.bits
+            new = False
+            for p in positions:
+                mask = 1 << (p & 7)
+                if not bits[p >> 3] & mask:
+                    bits[p >> 3] |= mask
+                    new = True
+            if new:
+                self.count += 1
+        return new
+
+    def false_positive_rate(self):
+        """現在の登録数での誤判定率の見積もり"""
+        return (1 - math.exp(-self.hash_count * self.count / self.size_bits)) ** self.hash_count
+
+    def clear(self):
+        with self.lock:
+            self.bits = bytearray(len(self.bits))
+            self.count = 0
+
+    def save(self, path):
+        """ファイルに保存する（書き込み途中で止まっても壊れないよう、一時ファイルから置き換える）"""
+        with self.lock:
+            header = {"capacity": self.capacity, "error_rate": self.error_rate, "size_bits": self.size_bits,
+                      "hash_count": self.hash_count, "count": self.count}
+            temp_path = path + ".tmp"
+            with open(temp_path, "wb") as f:
+                f.write(_MAGIC)
+                f.write(json.dumps(header).encode("ascii") + b"\n")
+                f.write(self.bits)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            if f.readline() != _MAGIC:
+                raise ValueError(f"{path} は重複チェック用のファイルではありません。")
+            header = json.loads(f.readline())
+            bits = bytearray(f.read())
+        index = cls.__new__(cls)
+        index.capacity = header["capacity"]
+        index.error_rate = header["error_rate"]
+        index.size_bits = header["size_bits"]
+        index.hash_count = header["hash_count"]
+        index.count = header["count"]
+        if len(bits) != (index.size_bits + 7) // 8:
+            raise ValueError(f"{path} が壊れています。")
+        index.bits = bits
+        index.lock = threading.Lock()
+        return index
+
+
+def open_dedup_index(path, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+    """保存済みのファイルがあれば読み込み、なければ新しく作る"""
+    if path is not None and os.path.exists(path):
+        return DedupIndex.load(path)
+    return DedupIndex(capacity, error_rate)
@@ -0,0 +1,243 @@
+import math
+import time
+from collections import namedtuple
+
+from classify_logic import (TechniqueCounts, classify_sequence, classify_term,
+                            matches_targets, unpack_counts)
+from constructive_generater import generate_targeted_problem, get_term_options
+from counting_logic import CountingLimitError, get_exact_counter
+from adaptive_sampler import get_adaptive_sampler
+from problem_generater import BATCH_SIZE, MODE_ADAPTIVE, MODE_BATCH, MODE_EXACT, MODE_RANDOM, MODE_TARGETED, \
+    generate_single_problem
+
+# 全列挙する数列の上限（これを超える設定は全列挙しない。2桁なら2口程度までしか全列挙できない）
+EXACT_MAX_SEQUENCES = 300000
+# MODE_EXACT で1問あたりの時間を測るために取り出す数
+DP_TIMING_SAMPLES = 3
+
+FeasibilityReport = namedtuple("FeasibilityReport", [
+    "feasible",            # 目標が構造的に達成可能か
+    "reasons",             # 達成不可能な理由（日本語の文字列のリスト）
+    "bounds",              # 各技法の上限 (TechniqueCounts)
+    "method",              # "exact"（全列挙で存在を確かめ、一致率は試行で見積もる）/ "sampling" / "dp" / "none"
+    "trials",              # 試行した数（"dp" なら数え上げた候補の数）
+    "hits",                # そのうち目標に一致した数（"dp" なら重複を除いた数列の数）
+    "acceptance_rate",     # 1回の試行が目標に一致する確率の見積もり（一致0件なら 0.0 で、分からない）
+    "seconds_per_attempt", # 1回の試行にかかる時間
+    "expected_seconds",    # num_questions 問生成するまでの見込み時間（一致0件なら math.inf で、分からない）
+    "sequence_counts",     # 全列挙した (条件を満たす数列の数, そのうち目標に一致した数)（"exact" 以外は None）
+                           # どの数列も1回ずつ数えた割合で、生成の分布（数字プールの引き方など）による重みはない
+], defaults=(None,))
+
+
+def technique_upper_bounds(num_digits, num_lines, zero_count, minus_count):
+    """
+    設定から決まる各技法カウントの上限を返す
+    最初の項は盤面が0なので PB 以外は発生しない。マイナスの項は最初には来ない
+    """
+    plus_terms = num_lines - minus_count
+    effective_plus = max(plus_terms - 1, 0)
+    return TechniqueCounts(
+        pb=plus_terms * num_digits,
+        mb=minus_count * num_digits,
+        p5=effective_plus * num_digits,
+        m5=minus_count * num_digits,
+        # P10は繰り上がりによって1桁上の位でも発生しうる
+        p10=effective_plus * (num_digits + 1),
+        m10=minus_count * num_digits,
+        p15=effective_plus * num_digits,
+        m15=minus_count * num_digits,
+    )
+
+
+def check_targets(num_digits, num_lines, zero_count, minus_count, limits):
+    """目標カウントが上限を超えていないか調べ、(達成可能か, 理由のリスト, 上限) を返す"""
+    bounds = technique_upper_bounds(num_digits, num_lines, zero_count, minus_count)
+    targets = TechniqueCounts(*[0 if t is None else t for t in limits.limits])
+    reasons = []
+    for name, target, bound in zip(TechniqueCounts._fields, targets, bounds):
+        if target > bound:
+            reasons.append(f"{name.upper()}={target}回は上限{bound}回を超えています。")
+
+    # 同じ位で同時に発生しない技法の組み合わせ
+    effective_plus = max(num_lines - minus_count - 1, 0)
+    if targets.p5 + targets.p15 > effective_plus * num_digits:
+        reasons.append(f"P5+P15={targets.p5 + targets.p15}回は上限{effective_plus * num_digits}回を超えています。")
+    if targets.p5 + targets.p10 + targets.p15 > effective_plus * (num_digits + 1):
+        reasons.append(f"P5+P10+P15={targets.p5 + targets.p10 + targets.p15}回は"
+                       f"上限{effective_plus * (num_digits + 1)}回を超えています。")
+    if targets.m5 + targets.m10 + targets.m15 > minus_count * num_digits:
+        reasons.append(f"M5+M10+M15={targets.m5 + targets.m10 + targets.m15}回は"
+                       f"上限{minus_count * num_digits}回を超えています。")
+    return not reasons, reasons, bounds
+
+
+def _uses_digit_balance(num_digits, num_lines, zero_count):
+    # 必要な数字が9個以上なら、create_digits_pool の 1～9 を均等に使う制約がかかる
+    total_needed = ((num_lines - zero_count) * num_digits) + (zero_count * (num_digits - 1))
+    return total_needed >= 9
+
+
+def count_sequences_exact(num_digits, num_lines, zero_count, minus_count, limits, max_sequences=None):
+    """
+    条件を満たす数列をすべて列挙し、(全数, 目標に一致した数) を返す
+    max_sequences を超えそうな場合は None を返す
+    """
+    normal_terms, zero_terms = get_term_options(num_digits)
+    upper_estimate = (len(normal_terms) + len(zero_terms)) ** num_lines * math.comb(num_lines - 1, minus_count)
+    if max_sequences is not None and upper_estimate > max_sequences:
+        return None
+
+    pool = [(value, 0) for value, _ in normal_terms] + [(value, 1) for value, _ in zero_terms]
+    min_sum = 10 ** (num_digits - 1)
+    max_sum = (10 ** (num_digits + 1)) - 1
+    used_abs = set()
+    totals = [0, 0]
+
+    def visit(position, current_sum, packed, minus_left, zero_left):
+        if position == num_lines:
+            totals[0] += 1
+            if matches_targets(unpack_counts(packed), limits):
+                totals[1] += 1
+            return
+        lines_left = num_lines - position
+        for value, is_zero in pool:
+            if value in used_abs:
+                continue
+            next_zero = zero_left - is_zero
+            if next_zero < 0 or next_zero > lines_left - 1:
+                continue
+            for sign in (1, -1):
+                next_minus = minus_left - (1 if sign < 0 else 0)
+                if sign < 0 and (position == 0 or minus_left == 0):
+                    continue
+                if next_minus > lines_left - 1:
+                    continue
+                new_sum = current_sum + sign * value
+                if not (min_sum <= new_sum <= max_sum):
+                    continue
+                used_abs.add(value)
+                visit(position + 1, new_sum, packed + classify_term(current_sum, sign * value, num_digits),
+                      next_minus, next_zero)
+                used_abs.discard(value)
+
+    visit(0, 0, 0, minus_count, zero_count)
+    return totals[0], totals[1]
+
+
+def estimate_feasibility(num_digits, num_lines, zero_count, minus_count, limits, num_questions,
+                         mode=MODE_RANDOM, time_budget=0.5):
+    """
+    生成を始める前に、目標の達成可能性・一致率・見込み時間を見積もる
+    一致率と見込み時間は、生成と同じ方式で time_budget 秒だけ試行して見積もる
+    試行で1回も一致しなければ、一致率は分からないので見込み時間は math.inf にする（速いとはみなさない）
+    ごく小さい設定（EXACT_MAX_SEQUENCES 以下。2桁なら2口程度まで）は全列挙もして、
+    目標に一致する数列が1つもなければ作れないと判定する
+    探索生成は1回の試行が重い（4・5桁では項の候補の準備に数秒かかる）ので、画面の処理とは別のスレッドで呼ぶ
+    MODE_EXACT は数え上げで見積もる（数秒～十数秒かかることがあるので、画面の処理とは別のスレッドで呼ぶ）
+    数え上げが上限を超えた設定は、作れるかどうか分からないので、ランダム生成の試行で見積もる（method が "dp" 以外になる）
+    """
+    feasible, reasons, bounds = check_targets(num_digits, num_lines, zero_count, minus_count, limits)
+    if not feasible:
+        return FeasibilityReport(False, reasons, bounds, "none", 0, 0, 0.0, 0.0, math.inf)
+
+    if mode == MODE_EXACT:
+        report = _estimate_with_counter(num_digits, num_lines, zero_count, minus_count, limits, num_questions,
+                                        reasons, bounds)
+        if report is not None:
+            return report
+        mode = MODE_RANDOM
+
+    # 小さい設定は全列挙で、目標に一致する数列があるかを確かめる
+    # （列挙の割合は数列ごとに等しい重みなので、一致率と見込み時間には使わず、生成の試行で見積もる）
+    exact = None
+    if mode not in (MODE_TARGETED, MODE_ADAPTIVE) and not _uses_digit_balance(num_digits, num_lines, zero_count):
+        exact = count_sequences_exact(num_digits, num_lines, zero_count, minus_count, limits,
+                                      max_sequences=EXACT_MAX_SEQUENCES)
+    if exact is not None and exact[1] == 0:
+        reasons.append("条件を満たす数列が存在しません。")
+        return FeasibilityReport(False, reasons, bounds, "exact", 0, 0, 0.0, 0.0, math.inf, exact)
+
+    trials, hits, seconds_per_attempt = _sample_attempts(num_digits, num_lines, zero_count, minus_count, limits,
+                                                         mode, time_budget)
+    if hits > 0:
+        rate = hits / trials
+        expected_seconds = num_questions / rate * seconds_per_attempt
+    else:
+        # 一致が0件なら一致率は分からない（試行時間から決まる下限値を見込み時間にすると、作れない設定も速く見える）
+        rate = 0.0
+        expected_seconds = math.inf
+    return FeasibilityReport(True, reasons, bounds, "exact" if exact is not None else "sampling", trials, hits, rate,
+                             seconds_per_attempt, expected_seconds, exact)
+
+
+def _sample_attempts(num_digits, num_lines, zero_count, minus_count, limits, mode, time_budget):
+    """生成と同じ方式で time_budget 秒だけ試行し、(試行数, 目標に一致した数, 1回の試行の時間) を返す"""
+    trials = 0
+    hits = 0
+    if mode == MODE_BATCH:
+        # numpy は一括生成を使うときだけ読み込む
+        from batch_logic import classify_batch, generate_batch, match_targets_batch
+    if mode == MODE_ADAPTIVE:
+        # 生成で使うのと同じ AdaptiveSampler で試す（ここで学習した分布は、そのまま生成に引き継がれる）
+        sampler = get_adaptive_sampler(num_digits, num_lines, zero_count, minus_count, limits)
+    start = time.perf_counter()
+    while trials == 0 or time.perf_counter() - start < time_budget:
+        if mode == MODE_BATCH:
+            # 一括生成は1バッチを BATCH_SIZE 回の試行として数える
+            sequences = generate_batch(num_digits, num_lines, zero_count, minus_count, BATCH_SIZE)
+            hits += int(match_targets_batch(classify_batch(sequences, num_digits), *limits.limits).sum())
+            trials += BATCH_SIZE
+            continue
+        trials += 1
+        if mode == MODE_TARGETED:
+            result = generate_targeted_problem(num_digits, num_lines, zero_count, minus_count, limits)
+            if result:
+                hits += 1
+            continue
+        if mode == MODE_ADAPTIVE:
+            candidate = sampler.draw()
+            if candidate is not None and matches_targets(candidate[1], limits):
+                hits += 1
+            continue
+        result = generate_single_problem(num_digits, num_lines, zero_count, minus_count)
+        if result and matches_targets(classify_sequence(result[0], num_digits), limits):
+            hits += 1
+    return trials, hits, (time.perf_counter() - start) / trials
+
+
+def _estimate_with_counter(num_digits, num_lines, zero_count, minus_count, limits, num_questions, reasons, bounds):
+    """
+    MODE_EXACT 用: 数え上げた数列の数と、1問取り出すのにかかる時間から見積もる（数え上げ結果は生成で使い回す）
+    数え上げが状態数や時間の上限を超えたら None（作れないとは限らない）
+    """
+    try:
+        counter = get_exact_counter(num_digits, num_lines, zero_count, minus_count, limits)
+    except CountingLimitError as error:
+        reasons.append(str(error))
+        return None
+    except ValueError as error:
+        reasons.append(str(error))
+        return FeasibilityReport(False, reasons, bounds, "dp", 0, 0, 0.0, 0.0, math.inf)
+    candidates = counter.candidate_total()
+    try:
+        total = counter.total()
+    except CountingLimitError as error:
+        # 取り出しはできるので、重複を除いた数だけ分からないまま進める
+        reasons.append(str(error))
+        total = None
+    if candidates == 0 or total == 0:
+        reasons.append("条件を満たす数列が存在しません。")
+        return FeasibilityReport(False, reasons, bounds, "dp", candidates, 0, 0.0, 0.0, math.inf)
+
+    found = 0
+    start = time.perf_counter()
+    for _ in range(DP_TIMING_SAMPLES):
+        if counter.sample() is not None:
+            found += 1
+    seconds = time.perf_counter() - start
+    # 取り出した数列の重複などによる棄却を含めた、1問あたりの時間（1問も取れなければ下限値）
+    seconds_per_attempt = seconds / max(found, 1)
+    expected_seconds = num_questions * seconds_per_attempt if found else math.inf
+    return FeasibilityReport(True, reasons, bounds, "dp", candidates, candidates if total is None else total, 1.0,
+                             seconds_per_attempt, expected_seconds)
@@ -0,0 +1,300 @@
+"""
+条件を指定して問題をまとめて生成し、見つかった順にファイルへ書き出すコマンドラインツール
+
+使い方:
+    python generate_cli.py --count 100000 --p5 1 --p10 1 --m10 1 --format jsonl --output volume1.jsonl
+    （中断しても、同じコマンドをもう一度実行すると続きから生成する）
+
+各問題は (シード, 問題番号) だけで決まるので、同じシード・条件なら並列数に関係なく同じ問題が出る
+--output を指定すると、一定数ごとにチェックポイント（出力ファイル名 + ".checkpoint.json"）を保存する
+再開時は、書き込み途中だった末尾を切り捨ててから、次の問題番号から生成を続ける（中断しなかった場合と同じ出力になる）
+出力ファイルが見つからないか、チェックポイントの位置より短いときは、再開せずにエラーにする
+
+--format problemset は、問題を ProblemSet（項とカウントを配列に詰めたもの）にためて、
+チェックポイントごとと終了時にファイル全体を書き直す（ProblemSet.load で読める。1問あたり 口数 × 2バイト + 8バイト）
+
+同じ問題（項の順序違いを含む）は1回しか出さない。--dedup でファイルを指定すると、
+これまでの実行で出した問題もまとめて除ける（学期分のプリントで共有するなど）
+
+--profile（または環境変数 GENERATION_PROFILE=1）で、生成を cProfile と tracemalloc で計測し、
+報告を標準エラーに出して .prof ファイル（pstats や snakeviz で読める）を保存する
+並列生成のワーカーの中は計測できないので、計測するときは1プロセスで生成する
+"""
+import argparse
+import csv
+import io
+import json
+import math
+import os
+import random
+import sys
+import time
+
+from classify_logic import TECHNIQUE_NAMES, TechniqueCounts, TechniqueLimits
+from dedup_index import DEFAULT_CAPACITY, DedupIndex, open_dedup_index
+from problem_set import ProblemSet
+from problem_generater import MODE_ADAPTIVE, MODE_BATCH, MODE_EXACT, MODE_RANDOM, MODE_TARGETED, format_formula, \
+    iter_seeded_problems
+from parallel_generater import iter_indexed_problems_parallel
+from profile_logic import GenerationProfiler, profiling_enabled
+
+FORMATS = ("jsonl", "csv", "text", "problemset")
+MODES = (MODE_RANDOM, MODE_TARGETED, MODE_BATCH, MODE_EXACT, MODE_ADAPTIVE)
+CSV_COLUMNS = ["no", "formula", "ans", "terms"] + list(TECHNIQUE_NAMES)
+# チェックポイントを保存する間隔（問題数）
+CHECKPOINT_EVERY = 1000
+# --profile でファイル名を省略したときの保存先
+DEFAULT_PROFILE_PATH = "generation.prof"
+
+
+def format_problem(number, terms, ans, counts, output_format):
+    """1問分を出力形式の文字列にする"""
+    formula = format_formula(terms, ans)
+    if output_format == "jsonl":
+        record = {"no": number, "formula": formula, "ans": ans, "terms": terms, "counts": counts._asdict()}
+        return json.dumps(record, ensure_ascii=False) + "\n"
+    if output_format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow([number, formula, ans, " ".join(map(str, terms))] + list(counts))
+        return buffer.getvalue()
+    return f"No.{number}:\n{formula}\n\n"
+
+
+def csv_header():
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(CSV_COLUMNS)
+    return buffer.getvalue()
+
+
+class Checkpoint:
+    """
+    出力ファイルのどこまでが確定しているかと、次に作る問題番号を保存する
+    params が一致しないチェックポイントからは再開しない
+    """
+
+    def __init__(self, path, params):
+        self.path = path
+        self.params = params
+        self.written = 0
+        self.offset = 0
+        self.next_index = 0
+
+    def load(self):
+        """保存済みのチェックポイントがあれば読み込み、再開するなら True を返す"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data["params"] != self.params:
+            raise ValueError(f"チェックポイント {self.path} は別の条件で作られています。"
+                             "条件を揃えるか、チェックポイントを削除してください。")
+        self.written = data["written"]
+        self.offset = data["offset"]
+        self.next_index = data["next_index"]
+        return True
+
+    def save(self, written, offset, next_index):
+        self.written = written
+        self.offset = offset
+        self.next_index = next_index
+        data = {
+            "params": self.params,
+            "written": written,
+            "offset": offset,
+            "next_index": next_index,
+            "saved_at": time.time(),
+        }
+        # 書き込み途中で止まっても壊れないよう、一時ファイルに書いてから置き換える
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="条件を指定して問題をまとめて生成する")
+    parser.add_argument("--digits", type=int, default=2, help="桁数")
+    parser.add_argument("--lines", type=int, default=8, help="口数")
+    parser.add_argument("--zeros", type=int, default=2, help="0の数")
+    parser.add_argument("--minus", type=int, default=3, help="マイナスの数")
+    parser.add_argument("--count", type=int, default=5, help="生成する問題数")
+    for name in TECHNIQUE_NAMES:
+        parser.add_argument(f"--{name}", type=int, default=None, help=f"{name.upper()}の回数（省略時は問わない）")
+    parser.add_argument("--mode", choices=MODES, default=MODE_RANDOM, help="生成方式")
+    parser.add_argument("--workers", type=int, default=1, help="並列に生成するプロセス数")
+    parser.add_argument("--format", choices=FORMATS, default="jsonl", help="出力形式")
+    parser.add_argument("--output", help="出力ファイル（省略時は標準出力、チェックポイントなし）")
+    parser.add_argument("--checkpoint", help="チェックポイントのファイル（既定: 出力ファイル名 + .checkpoint.json）")
+    parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY, help="チェックポイントを保存する間隔")
+    parser.add_argument("--dedup", help="出題済みの問題を記録するファイル（これまでの実行の問題も除く）")
+    parser.add_argument("--allow-duplicates", action="store_true", help="重複した問題を除かない")
+    parser.add_argument("--seed", type=int, default=None, help="乱数のシード（省略時はランダム）")
+    parser.add_argument("--timeout", type=float, default=None, help="制限時間（秒、省略時は無制限）")
+    parser.add_argument("--profile", nargs="?", const=DEFAULT_PROFILE_PATH, default=None, metavar="PATH",
+                        help=f"生成を計測して .prof ファイルに保存する（既定: {DEFAULT_PROFILE_PATH}）")
+    return parser.parse_args(argv)
+
+
+def _problem_stream(args, limits, checkpoint, seed, dedup):
+    """(問題番号, 数列, 答え, TechniqueCounts) を、チェックポイントの次の番号から順に返す"""
+    remaining = args.count - checkpoint.written
+    if args.workers > 1:
+        timeout = args.timeout if args.timeout is not None else math.inf
+        found = iter_indexed_problems_parallel(args.digits, args.lines, args.zeros, args.minus, limits, remaining,
+                                               workers=args.workers, seed=seed, mode=args.mode,
+                                               timeout_seconds=timeout, dedup=dedup,
+                                               start_index=checkpoint.next_index)
+        for index, terms, ans, counts in found:
+            yield index, terms, ans, TechniqueCounts(*counts)
+        return
+    yield from iter_seeded_problems(args.digits, args.lines, args.zeros, args.minus, limits, seed,
+                                    start_index=checkpoint.next_index, mode=args.mode,
+                                    timeout_seconds=args.timeout, dedup=dedup)
+
+
+def _missing_output_error(output_path, checkpoint):
+    return ValueError(f"出力ファイル {output_path} が見つからないか、チェックポイントの{checkpoint.written}問より短いため、"
+                      f"再開できません。出力ファイルを元に戻すか、チェックポイント {checkpoint.path} を削除してやり直してください。")
+
+
+def run(args, on_problem=None):
+    """on_problem: 書き出した問題 (数列, 答え, TechniqueCounts) を受け取る関数（計測用）"""
+    limits = TechniqueLimits(**{name: getattr(args, name) for name in TECHNIQUE_NAMES})
+    params = {
+        "config": [args.digits, args.lines, args.zeros, args.minus],
+        "targets": list(limits.limits),
+        "count": args.count,
+        "mode": args.mode,
+        "format": args.format,
+    }
+    seed = args.seed if args.seed is not None else random.SystemRandom().getrandbits(64)
+    params["seed"] = seed
+
+    if args.output:
+        checkpoint_path = args.checkpoint or args.output + ".checkpoint.json"
+        checkpoint = Checkpoint(checkpoint_path, params)
+        if args.seed is None and os.path.exists(checkpoint_path):
+            # シード省略で再開するときは、保存済みのシードを使う
+            with open(checkpoint_path, encoding="utf-8") as f:
+                params["seed"] = seed = json.load(f)["params"]["seed"]
+        resumed = checkpoint.load()
+    else:
+        checkpoint = Checkpoint(None, params)
+        resumed = False
+
+    # 重複チェックは、指定されたファイルか、出力ファイルの隣（再開用）に保存する
+    dedup = None
+    dedup_path = args.dedup or (args.output + ".dedup" if args.output else None)
+    if not args.allow_duplicates:
+        capacity = max(DEFAULT_CAPACITY, args.count)
+        if args.dedup or resumed:
+            dedup = open_dedup_index(dedup_path, capacity)
+        else:
+            dedup = DedupIndex(capacity)
+
+    store = None
+    output = None
+    if args.format == "problemset":
+        # 見つかった問題は配列にためて、チェックポイントごとにファイル全体を書き直す
+        store = ProblemSet(args.digits, args.lines)
+        if resumed and os.path.exists(args.output):
+            store = ProblemSet.load(args.output)
+        if resumed and len(store) < checkpoint.written:
+            raise _missing_output_error(args.output, checkpoint)
+        # チェックポイント以降にためた分は捨てる
+        store.truncate(checkpoint.written)
+    elif args.output:
+        if resumed and (os.path.getsize(args.output) if os.path.exists(args.output) else 0) < checkpoint.offset:
+            # 足りない分を埋めずに続きを書くと、ファイルの途中が NUL で埋まってしまう
+            raise _missing_output_error(args.output, checkpoint)
+        output = open(args.output, "r+b" if resumed and os.path.exists(args.output) else "wb")
+        # チェックポイント以降に書きかけた分は捨てる
+        output.seek(checkpoint.offset)
+        output.truncate()
+    else:
+        output = sys.stdout.buffer
+
+    written = checkpoint.written
+    start_time = time.time()
+    interrupted = False
+    try:
+        if written == 0 and args.format == "csv":
+            output.write(csv_header().encode("utf-8"))
+        if written >= args.count:
+            return 0
+        for index, terms, ans, counts in _problem_stream(args, limits, checkpoint, seed, dedup):
+            written += 1
+            if store is not None:
+                store.append(terms, counts)
+            else:
+                output.write(format_problem(written, terms, ans, counts, args.format).encode("utf-8"))
+                # 見つかった問題はすぐに書き出し、パイプの先でも順に読めるようにする
+                output.flush()
+            if on_problem is not None:
+                on_problem((terms, ans, counts))
+            if args.output and (written % args.checkpoint_every == 0 or written >= args.count):
+                # 重複チェックの記録は、出力と同じ時点のものを残す
+                if dedup is not None:
+                    dedup.save(dedup_path)
+                if store is not None:
+                    store.save(args.output)
+                checkpoint.save(written, 0 if store is not None else output.tell(), index + 1)
+                print(f"{written}/{args.count}問 ({time.time() - start_time:.1f}秒)", file=sys.stderr)
+            if written >= args.count:
+                break
+    except KeyboardInterrupt:
+        interrupted = True
+    finally:
+        if store is not None:
+            # チェックポイント以降の分も残す（再開するときはチェックポイントの問題数まで切り詰める）
+            if args.output:
+                store.save(args.output)
+            else:
+                sys.stdout.buffer.write(store.to_bytes())
+                sys.stdout.buffer.flush()
+        else:
+            output.flush()
+            if args.output:
+                output.close()
+        if not args.output and dedup is not None and dedup_path is not None:
+            dedup.save(dedup_path)
+
+    if written < args.count:
+        reason = "中断しました" if interrupted else "制限時間内に生成できませんでした"
+        print(f"{reason}（{checkpoint.written}問まで保存済み）。同じコマンドで続きから再開できます。", file=sys.stderr)
+        return 130 if interrupted else 1
+    return 0
+
+
+def run_profiled(args):
+    """run を計測し、報告を標準エラーに出して .prof ファイルを保存する"""
+    if args.workers > 1:
+        print("計測のため、1プロセスで生成します。", file=sys.stderr)
+        args.workers = 1
+    profiler = GenerationProfiler()
+    problems = ProblemSet(args.digits, args.lines)
+    try:
+        with profiler:
+            status = run(args, on_problem=lambda problem: problems.append(problem[0], problem[2]))
+    finally:
+        profiler.measure_focus(problems, config=(args.digits, args.lines, args.zeros, args.minus))
+        with open(args.profile, "wb") as f:
+            f.write(profiler.to_bytes())
+        print(profiler.report(), file=sys.stderr)
+        print(f"プロファイルを {args.profile} に保存しました。", file=sys.stderr)
+    return status
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.profile is None and profiling_enabled():
+        args.profile = DEFAULT_PROFILE_PATH
+    try:
+        sys.exit(run_profiled(args) if args.profile else run(args))
+    except ValueError as error:
+        print(f"エラー: {error}", file=sys.stderr)
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import threading
+import time
+
+
+class GenerationJob:
+    """
+    問題の生成をバックグラウンドのスレッドで行い、見つかった問題を ProblemSet に順にためていく
+    画面側は problems() で途中経過をいつでも読み出せ、cancel() で生成を止められる
+    produce(cancel_event): (数列, 答え, TechniqueCounts) を yield する関数
+                           （iter_problems / iter_problems_parallel に cancel_event を渡して呼ぶ）
+                           None なら生成せず、problems に入っている分だけで終える
+    problems: 問題をためる ProblemSet（生成前に用意できた問題（キャッシュや問題バンクから取り出した分）を入れておける）
+    """
+
+    def __init__(self, produce, num_questions, problems):
+        self.num_questions = num_questions
+        self.cancel_event = threading.Event()
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self._produce = produce
+        self._problems = problems
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        if self._produce is None or self._filled():
+            self.finished_at = time.time()
+            return self
+        self._thread.start()
+        return self
+
+    def _run(self):
+        problems = None
+        try:
+            # produce がジェネレーターでなく、呼んだ時点で例外を出しても終了として記録する
+            problems = self._produce(self.cancel_event)
+            for problem in problems:
+                with self._lock:
+                    finished = self._add(problem)
+                if finished or self.cancel_event.is_set():
+                    break
+        except Exception as error:
+            # 画面側で表示できるように残しておく
+            self.error = error
+        finally:
+            # ジェネレーターを閉じて、並列生成のプロセスプールなどを片付ける
+            close = getattr(problems, "close", None)
+            if close is not None:
+                close()
+            self.finished_at = time.time()
+
+    def _add(self, problem):
+        """見つかった問題を1つためて、必要な数がそろったら True を返す"""
+        terms, _, counts = problem
+        self._problems.append(terms, counts)
+        return self._filled()
+
+    def _filled(self):
+        return len(self._problems) >= self.num_questions
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def running(self):
+        return self.finished_at is None
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def elapsed(self):
+        return (self.finished_at or time.time()) - self.started_at
+
+    def problems(self):
+        """ここまでに見つかった問題のコピー（ProblemSet）"""
+        with self._lock:
+            return self._problems.copy()
+
+
+class CurriculumJob(GenerationJob):
+    """
+    複数の難易度をまとめた生成（curriculum_planner.iter_curriculum）をバックグラウンドで行い、注文ごとにためていく
+    produce(cancel_event): (注文の番号, 数列, 答え, TechniqueCounts) を yield する関数
+    problem_sets: 注文と同じ順の、問題をためる ProblemSet のリスト
+    counts: 注文ごとの問題数
+    """
+
+    def __init__(self, produce, problem_sets, counts):
+        super().__init__(produce, sum(counts), problem_sets)
+        self.counts = counts
+
+    def _add(self, problem):
+        index, terms, _, counts = problem
+        self._problems[index].append(terms, counts)
+        return self._filled()
+
+    def _filled(self):
+        return all(len(problem_set) >= count for problem_set, count in zip(self._problems, self.counts))
+
+    def problems(self):
+        """ここまでに見つかった問題のコピー（注文と同じ順の ProblemSet のリスト）"""
+        with self._lock:
+            return [problem_set.copy() for problem_set in self._problems]
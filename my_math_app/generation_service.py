@@ -0,0 +1,377 @@
+"""
+問題の生成をローカルの HTTP サービスとして提供する（標準ライブラリだけで動く）
+全リクエストで1つのワーカープール（ProcessPoolExecutor）を共有し、同じ設定・生成方式のリクエストが
+同時に来たときは1本の候補の流れにまとめて、候補を目標が一致するリクエストすべてに振り分ける
+
+起動:
+    python generation_service.py --port 8765 --workers 4
+app.py から使う:
+    GENERATION_SERVICE_URL=http://127.0.0.1:8765 streamlit run app.py
+
+API（JSON）:
+    GET  /health    -> {"status": "ok", "workers": 4, "streams": 1, "coalesced": 3}
+    POST /generate  {"digits": 2, "lines": 8, "zeros": 2, "minus": 3, "count": 5,
+                     "targets": {"p5": 1, "p10": 1}, "mode": "random", "seed": null, "timeout": 60,
+                     "exclude_issued": false}
+                 -> {"problems": [{"terms": [...], "ans": 123, "counts": {...}, "formula": "..."}],
+                     "complete": true, "elapsed": 0.8}
+seed を指定したリクエストと、目標から組み立てる生成方式（targeted / exact / adaptive）は、
+まとめずに parallel_generater と同じ問題番号ごとの生成を共有のワーカープールで行う（同じ seed なら同じ問題になる）
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from classify_logic import TechniqueCounts, TechniqueLimits, matches_targets
+from curriculum_planner import SHARED_MODES, iter_candidates
+from dedup_index import DedupIndex, canonical_key, open_dedup_index
+from parallel_generater import CANCEL_POLL_SECONDS, TASKS_PER_WORKER, iter_problems_parallel
+from problem_generater import BATCH_SIZE, MODE_ADAPTIVE, MODE_BATCH, MODE_EXACT, MODE_RANDOM, MODE_TARGETED, \
+    format_formula
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# app.py がこのサービスを使うときの URL を指定する環境変数
+SERVICE_URL_ENV = "GENERATION_SERVICE_URL"
+# サービスの出題済みの記録（app.py の記録とは別のファイル。環境変数 GENERATION_SERVICE_DEDUP_PATH で変更できる）
+DEFAULT_SERVICE_DEDUP_PATH = os.environ.get(
+    "GENERATION_SERVICE_DEDUP_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "service_dedup_index.bin"))
+MODES = (MODE_RANDOM, MODE_TARGETED, MODE_BATCH, MODE_EXACT, MODE_ADAPTIVE)
+# 1回のリクエストで作れる問題数と制限時間の上限
+MAX_COUNT = 1000
+DEFAULT_TIMEOUT_SECONDS = 60
+MAX_TIMEOUT_SECONDS = 600
+# 共有の流れで、1つのタスクで作る候補数（一括生成は1バッチ）
+CHUNK_CANDIDATES = 256
+# 共有の流れの1つのタスクの制限時間（秒）。候補が見つからない設定でも、ワーカーをこれ以上ふさがない
+CHUNK_SECONDS = 2.0
+# クライアント側で、サービスの制限時間に上乗せして待つ時間（秒）
+CLIENT_MARGIN_SECONDS = 10
+
+
+def _matching_chunk(config, mode, wanted, seed, max_seconds=CHUNK_SECONDS):
+    """
+    ワーカープロセス側で候補をまとめて作り、wanted（目標のタプルのリスト）のどれかに一致するものだけ返す
+    試行（生成に失敗した候補も1回と数える）が CHUNK_CANDIDATES 回（一括生成は1バッチ分）に達するか、
+    始めてから max_seconds 秒たったら終える
+    戻り値: [(数列, カウントのタプル), ...]
+    """
+    deadline = time.time() + max_seconds
+    size = BATCH_SIZE if mode == MODE_BATCH else CHUNK_CANDIDATES
+    limits = [TechniqueLimits(*targets) for targets in wanted]
+    found = []
+    attempts = 0
+    for terms, counts in iter_candidates(config, mode, TechniqueLimits(), random.Random(seed), None):
+        if counts is not None and any(matches_targets(counts, target) for target in limits):
+            found.append((terms, tuple(counts)))
+        # 一括生成で条件を満たす行が1つもなかったバッチは、1バッチ分の試行と数える
+        attempts += BATCH_SIZE if mode == MODE_BATCH and terms is None else 1
+        if attempts >= size or time.time() > deadline:
+            break
+    return found
+
+
+class _Subscription:
+    """共有の流れから問題を受け取る1リクエスト分の注文"""
+
+    def __init__(self, targets, count, issued=None):
+        self.targets = targets
+        self.count = count
+        self.issued = issued
+        self.problems = []
+        self.error = None
+        self.done = threading.Event()
+        self._seen = set()
+
+    def offer(self, terms, counts):
+        """目標に一致し、このリクエストにまだ入っていない（出題済みでもない）問題なら受け取る"""
+        if self.done.is_set() or not matches_targets(counts, self.targets):
+            return
+        key = canonical_key(terms)
+        if key in self._seen:
+            return
+        if self.issued is not None and not self.issued.add(terms):
+            return
+        self._seen.add(key)
+        self.problems.append((terms, sum(terms), counts))
+        if len(self.problems) >= self.count:
+            self.done.set()
+
+
+class _CandidateStream:
+    """
+    1つの設定・生成方式の候補を共有のワーカープールで作り続け、購読中の注文すべてに振り分ける
+    注文がなくなったらスレッドを止め、次の注文で再開する
+    """
+
+    def __init__(self, service, config, mode):
+        self.service = service
+        self.config = config
+        self.mode = mode
+        self.subscriptions = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def subscribe(self, subscription):
+        """注文を加える。すでに流れが動いていれば（ほかの注文とまとめられたら） True を返す"""
+        with self.lock:
+            self.subscriptions.append(subscription)
+            if self.thread is not None:
+                return True
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+            return False
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.remove(subscription)
+
+    def _run(self):
+        pending = set()
+        try:
+            while True:
+                with self.lock:
+                    wanted = {tuple(s.targets.limits) for s in self.subscriptions if not s.done.is_set()}
+                    if not wanted:
+                        self.thread = None
+                        return
+                    subscriptions = list(self.subscriptions)
+                while len(pending) < self.service.workers * TASKS_PER_WORKER:
+                    seed = random.SystemRandom().getrandbits(64)
+                    pending.add(self.service.executor.submit(_matching_chunk, self.config, self.mode,
+                                                             sorted(wanted, key=str), seed))
+                done, pending = wait(pending, timeout=CANCEL_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for terms, counts in future.result():
+                        counts = TechniqueCounts(*counts)
+                        for subscription in subscriptions:
+                            subscription.offer(terms, counts)
+        except Exception as error:
+            # ワーカーの異常などは、待っている注文にエラーとして返す
+            with self.lock:
+                for subscription in self.subscriptions:
+                    subscription.error = error
+                    subscription.done.set()
+                self.thread = None
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+class GenerationService:
+    """
+    共有のワーカープールで問題を生成する（HTTP サーバーから使うほか、同じプロセス内から直接呼んでもよい）
+    workers: ワーカープロセス数（既定: CPU数）
+    """
+
+    def __init__(self, workers=None, dedup_path=DEFAULT_SERVICE_DEDUP_PATH):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.dedup_path = dedup_path
+        self.coalesced = 0
+        self._streams = {}
+        self._issued = None
+        self._lock = threading.Lock()
+
+    def _issued_index(self):
+        with self._lock:
+            if self._issued is None:
+                self._issued = open_dedup_index(self.dedup_path)
+            return self._issued
+
+    def generate(self, config, targets, count, mode=MODE_RANDOM, seed=None, timeout_seconds=DEFAULT_TIMEOUT_SECONDS,
+                 exclude_issued=False):
+        """
+        目標に一致する問題を最大 count 問作る（同じリクエストの中では重複しない）
+        exclude_issued: サービスの出題済みの記録にある問題を除き、返した問題を記録する
+        戻り値: ([(数列, 答え, TechniqueCounts), ...], すべて揃ったか)
+        """
+        config = tuple(config)
+        _validate(config, count, mode, timeout_seconds)
+        issued = self._issued_index() if exclude_issued else None
+        if seed is not None or mode not in SHARED_MODES:
+            dedup = issued if issued is not None else DedupIndex(max(count, 1000))
+            problems = [(list(terms), ans, TechniqueCounts(*counts)) for terms, ans, counts in
+                        iter_problems_parallel(*config, targets, count, workers=self.workers, seed=seed, mode=mode,
+                                               timeout_seconds=timeout_seconds, dedup=dedup,
+                                               executor=self.executor)]
+        else:
+            subscription = _Subscription(targets, count, issued)
+            with self._lock:
+                stream = self._streams.get((config, mode))
+                if stream is None:
+                    stream = self._streams[(config, mode)] = _CandidateStream(self, config, mode)
+            if stream.subscribe(subscription):
+                with self._lock:
+                    self.coalesced += 1
+            try:
+                subscription.done.wait(timeout_seconds)
+            finally:
+                # 時間切れでも、これ以上は受け取らない
+                subscription.done.set()
+                stream.unsubscribe(subscription)
+            if subscription.error is not None:
+                raise subscription.error
+            # 待ち終わった後に届いた分は切り捨てる
+            problems = subscription.problems[:count]
+        if issued is not None:
+            issued.save(self.dedup_path)
+        return problems, len(problems) >= count
+
+    def status(self):
+        with self._lock:
+            streams = sum(1 for stream in self._streams.values() if stream.thread is not None)
+            return {"status": "ok", "workers": self.workers, "streams": streams, "coalesced": self.coalesced}
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _validate(config, count, mode, timeout_seconds):
+    digit_count, num_lines, zero_count, minus_count = config
+    if not 2 <= digit_count <= 5:
+        raise ValueError("桁数は2～5にしてください。")
+    if not 1 <= num_lines <= 15 or zero_count < 0 or minus_count < 0:
+        raise ValueError("口数・0の数・マイナスの数が範囲外です。")
+    if minus_count >= num_lines:
+        raise ValueError("マイナスの回数が口数以上です。")
+    if zero_count > num_lines:
+        raise ValueError("0の回数が口数を超えています。")
+    if not 1 <= count <= MAX_COUNT:
+        raise ValueError(f"問題数は1～{MAX_COUNT}にしてください。")
+    if mode not in MODES:
+        raise ValueError(f"生成方式は {', '.join(MODES)} のどれかにしてください。")
+    if not 0 < timeout_seconds <= MAX_TIMEOUT_SECONDS:
+        raise ValueError(f"制限時間は{MAX_TIMEOUT_SECONDS}秒以内にしてください。")
+
+
+def _parse_request(body):
+    """POST /generate の JSON を GenerationService.generate の引数にする"""
+    if not isinstance(body, dict):
+        raise ValueError("リクエストの形式が正しくありません: JSON のオブジェクトを送ってください。")
+    if not isinstance(body.get("targets") or {}, dict):
+        raise ValueError("リクエストの形式が正しくありません: targets は技法の名前と回数のオブジェクトにしてください。")
+    try:
+        config = (int(body.get("digits", 2)), int(body.get("lines", 8)), int(body.get("zeros", 2)),
+                  int(body.get("minus", 3)))
+        targets = TechniqueLimits(**{name: int(value) for name, value in (body.get("targets") or {}).items()})
+        return {
+            "config": config,
+            "targets": targets,
+            "count": int(body.get("count", 5)),
+            "mode": body.get("mode", MODE_RANDOM),
+            "seed": body.get("seed"),
+            "timeout_seconds": float(body.get("timeout", DEFAULT_TIMEOUT_SECONDS)),
+            "exclude_issued": bool(body.get("exclude_issued", False)),
+        }
+    except (TypeError, ValueError) as error:
+        raise ValueError(f"リクエストの形式が正しくありません: {error}")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # サーバー（ThreadingHTTPServer）に service 属性として GenerationService を持たせる
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, self.server.service.status())
+        else:
+            self._send_json(404, {"error": "見つかりません。"})
+
+    def do_POST(self):
+        if self.path != "/generate":
+            self._send_json(404, {"error": "見つかりません。"})
+            return
+        start = time.time()
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = _parse_request(json.loads(self.rfile.read(length) or b"{}"))
+            problems, complete = self.server.service.generate(**request)
+        except (ValueError, json.JSONDecodeError) as error:
+            self._send_json(400, {"error": str(error)})
+            return
+        except Exception as error:
+            self._send_json(500, {"error": f"生成中にエラーが発生しました: {error}"})
+            return
+        self._send_json(200, {
+            "problems": [{"terms": terms, "ans": ans, "counts": counts._asdict(),
+                          "formula": format_formula(terms, ans)} for terms, ans, counts in problems],
+            "complete": complete,
+            "elapsed": time.time() - start,
+        })
+
+    def log_message(self, format, *args):
+        # アクセスログは --verbose のときだけ出す
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, verbose=False):
+    """サービスを持たせた HTTP サーバーを作る（serve_forever() で動かし、終わったら service.close() する）"""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.service = GenerationService(workers)
+    server.verbose = verbose
+    return server
+
+
+def request_problems(url, config, targets, count, mode=MODE_RANDOM, seed=None,
+                     timeout_seconds=DEFAULT_TIMEOUT_SECONDS, exclude_issued=False):
+    """
+    サービスに問題の生成を頼む（app.py から使うクライアント）
+    targets: TechniqueLimits または {"p5": 1, ...} の辞書
+    戻り値: [(数列, 答え, TechniqueCounts), ...]（時間内に揃わなければ count 問より少ない）
+    """
+    if isinstance(targets, TechniqueLimits):
+        targets = {name: value for name, value in targets.limits._asdict().items() if value is not None}
+    digit_count, num_lines, zero_count, minus_count = config
+    body = {"digits": digit_count, "lines": num_lines, "zeros": zero_count, "minus": minus_count, "count": count,
+            "targets": targets, "mode": mode, "seed": seed, "timeout": timeout_seconds,
+            "exclude_issued": exclude_issued}
+    request = urllib.request.Request(url.rstrip("/") + "/generate", data=json.dumps(body).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout_seconds + CLIENT_MARGIN_SECONDS) as response:
+            data = json.load(response)
+    except urllib.error.HTTPError as error:
+        message = json.load(error).get("error", str(error))
+        raise RuntimeError(f"生成サービスがエラーを返しました: {message}")
+    return [(p["terms"], p["ans"], TechniqueCounts(**p["counts"])) for p in data["problems"]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="問題の生成をローカルの HTTP サービスとして提供する")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"待ち受けるアドレス（既定: {DEFAULT_HOST}）")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"ポート番号（既定: {DEFAULT_PORT}）")
+    parser.add_argument("--workers", type=int, default=None, help="ワーカープロセス数（既定: CPU数）")
+    parser.add_argument("--verbose", action="store_true", help="アクセスログを出す")
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, args.workers, args.verbose)
+    print(f"http://{args.host}:{server.server_port} で待ち受けています（ワーカー {server.service.workers}）。")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.close()
+
+
+if __name__ == "__main__":
+    main()
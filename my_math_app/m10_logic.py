@@ -34,12 +34,15 @@ def is_m10_digit(a, b):
     return not is_m15
 
 class SorobanSimulatorM10:
-    def __init__(self):
+    def __init__(self, tracer=None):
         self.digits = [0] * 10
         self.m10_count = 0
+        self.tracer = tracer
 
     def add(self, value):
         """足し算 (盤面更新のみ)"""
+        if self.tracer is not None:
+            self.tracer.begin_line()
         val_str = str(value)[::-1]
         carry = 0
         for i in range(len(self.digits)):
@@ -50,6 +53,8 @@ class SorobanSimulatorM10:
 
     def subtract(self, value):
         """引き算 (M10カウントと盤面更新)"""
+        if self.tracer is not None:
+            self.tracer.begin_line()
         val_str = str(value)[::-1]
         borrow = 0
 
@@ -83,6 +88,8 @@ class SorobanSimulatorM10:
                 # ここでは「borrow処理前の値」ではなく「現在の盤面値」で判定する
                 if is_m10_digit(current_digit, sub_digit):
                     self.m10_count += 1
+                    if self.tracer is not None:
+                        self.tracer.record(i, "M10", current_digit, sub_digit, (current_digit - sub_digit) % 10)
 
             # 計算実行（次の桁へのborrow計算）
             total_sub = sub_digit + borrow
@@ -94,11 +101,12 @@ class SorobanSimulatorM10:
                 self.digits[i] = res
                 borrow = 0
 
-def count_m10_in_sequence(terms, num_digits=2):
+def count_m10_in_sequence(terms, num_digits=2, tracer=None):
     """
     計算過程に含まれるM10の総数をカウントする
+    tracer: trace_logic.Tracer（指定したときだけ発生箇所を記録する）
     """
-    sim = SorobanSimulatorM10()
+    sim = SorobanSimulatorM10(tracer)
 
     for val in terms:
         if val >= 0:
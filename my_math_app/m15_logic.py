@@ -34,12 +34,15 @@ def is_m15_digit(a, b):
 
 
 class SorobanSimulatorM15:
-    def __init__(self):
+    def __init__(self, tracer=None):
         self.digits = [0] * 10
         self.m15_count = 0
+        self.tracer = tracer
 
     def add(self, value):
         """足し算 (M15カウントはしないが盤面更新)"""
+        if self.tracer is not None:
+            self.tracer.begin_line()
         val_str = str(value)[::-1]
         carry = 0
         for i in range(len(self.digits)):
@@ -52,6 +55,8 @@ class SorobanSimulatorM15:
 
     def subtract(self, value):
         """引き算 (M15をカウントして盤面更新)"""
+        if self.tracer is not None:
+            self.tracer.begin_line()
         val_str = str(value)[::-1]
         borrow = 0
 
@@ -85,6 +90,8 @@ class SorobanSimulatorM15:
                 # 下の桁からのborrow処理前の値で判定
                 if is_m15_digit(current_digit, sub_digit):
                     self.m15_count += 1
+                    if self.tracer is not None:
+                        self.tracer.record(i, "M15", current_digit, sub_digit, (current_digit - sub_digit) % 10)
 
             # 計算実行
             res = current_digit - total_sub
@@ -96,11 +103,12 @@ class SorobanSimulatorM15:
                 borrow = 0
 
 
-def count_m15_in_sequence(terms, num_digits=2):
+def count_m15_in_sequence(terms, num_digits=2, tracer=None):
     """
     計算過程に含まれるM15の総数をカウントする
+    tracer: trace_logic.Tracer（指定したときだけ発生箇所を記録する）
     """
-    sim = SorobanSimulatorM15()
+    sim = SorobanSimulatorM15(tracer)
 
     for val in terms:
         if val >= 0:
@@ -26,40 +26,33 @@ def is_m5_digit(a, b):
 
     return has_five and needs_five_decomposition and is_valid_sub and is_b_under_five
 
-def count_m5_in_sequence(terms, num_digits=2):
+def count_m5_in_sequence(terms, num_digits=2, tracer=None):
     """
     計算過程に含まれるM5の総数をカウントする
     terms: 計算する数値のリスト (例: [5, -1, -2])
     num_digits: 対象の桁数（デフォルト2）
+    tracer: trace_logic.Tracer（指定したときだけ発生箇所を記録する）
     """
     m5_count = 0
     current_sum = 0
 
     for val in terms[0:]:
+        if tracer is not None:
+            tracer.begin_line()
         # 引き算（負の数）の場合のみM5判定を行う
         if val < 0:
             abs_val = abs(val)
 
-            # --- 百の位の判定 ---
-            if num_digits >= 3:
-                curr_hundreds = (current_sum // 100) % 10
-                val_hundreds = (abs_val // 100) % 10
-                if val_hundreds > 0 and is_m5_digit(curr_hundreds, val_hundreds):
+            # --- 一の位から num_digits 桁目までの判定 ---
+            for col in range(num_digits):
+                place = 10 ** col
+                curr_digit = (current_sum // place) % 10
+                val_digit = (abs_val // place) % 10
+                # 0を引く場合はカウントしない
+                if val_digit > 0 and is_m5_digit(curr_digit, val_digit):
                     m5_count += 1
-
-            # --- 十の位の判定 ---
-            if num_digits >= 2:
-                curr_tens = (current_sum // 10) % 10
-                val_tens = (abs_val // 10) % 10
-                if val_tens > 0 and is_m5_digit(curr_tens, val_tens):
-                    m5_count += 1
-
-            # --- 一の位の判定 ---
-            curr_ones = current_sum % 10
-            val_ones = abs_val % 10
-            # 0を引く場合はカウントしない
-            if val_ones > 0 and is_m5_digit(curr_ones, val_ones):
-                m5_count += 1
+                    if tracer is not None:
+                        tracer.record(col, "M5", curr_digit, val_digit, (curr_digit - val_digit) % 10)
 
         # 計算を進める
         current_sum += val
@@ -9,34 +9,30 @@ def is_minus_basic_digit(a, b):
     """
     return (a // 5 >= b // 5) and (a % 5 >= b % 5)
 
-def count_mb_in_sequence(terms, num_digits=2):
+def count_mb_in_sequence(terms, num_digits=2, tracer=None):
     """
-    計算過程に含まれるMBの総数をカウントする（口単位）
-    一の位がMBでなければ、その行はMBとしてカウントせず、十の位の判定もスキップする。
+    計算過程に含まれるMBの総数をカウントする（位ごと）
+    tracer: trace_logic.Tracer（指定したときだけ発生箇所を記録する）
     """
     mb_count = 0
     current_sum = 0
 
     for val in terms[0:]:
+        if tracer is not None:
+            tracer.begin_line()
         # 引き算(負の数)の場合のみMB判定を行う
         if val < 0:
             abs_val = abs(val)
 
-            # --- 一の位の判定 ---
-            curr_ones = current_sum % 10
-            val_ones = abs_val % 10
-
-            # 一の位がMB条件を満たさない場合
-            if is_minus_basic_digit(curr_ones, val_ones):
-                mb_count += 1
-
-            # --- 十の位の判定 ---
-            curr_tens = (current_sum // 10) % 10
-            val_tens = (abs_val // 10) % 10
-
-            # 一の位がOK、かつ十の位もOKならカウント
-            if is_minus_basic_digit(curr_tens, val_tens):
-                mb_count += 1
+            # --- 一の位から num_digits 桁目までの判定 ---
+            for col in range(num_digits):
+                place = 10 ** col
+                curr_digit = (current_sum // place) % 10
+                val_digit = (abs_val // place) % 10
+                if is_minus_basic_digit(curr_digit, val_digit):
+                    mb_count += 1
+                    if tracer is not None:
+                        tracer.record(col, "MB", curr_digit, val_digit, (curr_digit - val_digit) % 10)
 
         # 計算を進める
         current_sum += val
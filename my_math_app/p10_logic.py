@@ -28,13 +28,14 @@ def is_p10_digit(a, b):
     return not is_p15
 
 
-def count_p10_in_sequence(terms, num_digits=2):
+def count_p10_in_sequence(terms, num_digits=2, tracer=None):
     """
     計算過程に含まれるP10の総数をカウントする
     terms: 計算する数値のリスト
     num_digits: 対象の桁数
+    tracer: trace_logic.Tracer（指定したときだけ発生箇所を記録する）
     """
-    sim = SorobanSimulator()
+    sim = SorobanSimulator(tracer)
 
     # termsリストからシミュレーターに順次入力
     for val in terms:
@@ -47,11 +48,16 @@ def count_p10_in_sequence(terms, num_digits=2):
 
 
 class SorobanSimulator:
-    def __init__(self):
+    def __init__(self, tracer=None):
         # [一の位, 十の位, 百の位, 千の位...]
         self.digits = [0] * 10
         self.p10_count = 0
-        self.history = []
+        self.tracer = tracer
+
+    @property
+    def history(self):
+        """P10の発生履歴（tracerを指定した場合のみ）"""
+        return self.tracer.render() if self.tracer is not None else []
 
     def get_value(self):
         val = 0
@@ -61,6 +67,8 @@ class SorobanSimulator:
 
     def add(self, value):
         """数値を足し、P10をカウントする"""
+        if self.tracer is not None:
+            self.tracer.begin_line()
         str_val = str(value)
         # 位ごとに処理するために逆順にする
         val_digits = [int(c) for c in str(str_val)[::-1]]
@@ -78,11 +86,12 @@ class SorobanSimulator:
             # ステップ1: 入力値を足す
             current_digit = self.digits[i]
             if input_digit > 0:
+                sum_val = current_digit + input_digit
                 if is_p10_digit(current_digit, input_digit):
                     self.p10_count += 1
-                    self.history.append(f"P10発生: {current_digit}+{input_digit} (桁:{10 ** i})")
+                    if self.tracer is not None:
+                        self.tracer.record(i, "P10", current_digit, input_digit, sum_val % 10)
 
-                sum_val = current_digit + input_digit
                 self.digits[i] = sum_val % 10
                 step1_carry = sum_val // 10
             else:
@@ -94,11 +103,12 @@ class SorobanSimulator:
             if carry > 0:
                 current_digit_after_step1 = self.digits[i]
                 # 9+1などの場合もP10判定を行う
+                sum_val_2 = current_digit_after_step1 + carry
                 if is_p10_digit(current_digit_after_step1, carry):
                     self.p10_count += 1
-                    self.history.append(f"P10発生(繰上): {current_digit_after_step1}+{carry} (桁:{10 ** i})")
+                    if self.tracer is not None:
+                        self.tracer.record(i, "P10", current_digit_after_step1, carry, sum_val_2 % 10)
 
-                sum_val_2 = current_digit_after_step1 + carry
                 self.digits[i] = sum_val_2 % 10
                 step2_carry = sum_val_2 // 10
 
@@ -107,6 +117,8 @@ class SorobanSimulator:
 
     def subtract(self, value):
         """数値を引く (P10カウントはしないが盤面を更新する)"""
+        if self.tracer is not None:
+            self.tracer.begin_line()
         # 単純化のため、現在の総量から引いて、digitsを再構成する手法をとる
         # (厳密なM10/M5判定が必要ない場合はこれが確実)
         current_val = self.get_value()
@@ -124,24 +136,25 @@ class SorobanSimulator:
                 self.digits[i] = 0
 
     def process_expression(self, expression):
-        # "30+56+..." のような文字列を解析
+        """
+        "30+56+..." のような文字列を順に計算し、P10の発生記録（trace_logic.TraceEvent のリスト）を返す
+        P10の回数は self.p10_count に累積される（表示するときは trace_logic.render_event で文字列にする）
+        """
         import re
-        tokens = re.findall(r'[+-]?\d+', expression)
-
-        print(f"計算式: {expression}")
-        print("-" * 20)
-
-        for token in tokens:
-            val = int(token)
-            if val >= 0:
-                # 足し算
-                prev_val = self.get_value()
-                self.add(val)
-                print(f"ADD {val}: {prev_val} -> {self.get_value()} | P10累積: {self.p10_count}")
-            else:
-                # 引き算
-                prev_val = self.get_value()
-                self.subtract(abs(val))
-                print(f"SUB {abs(val)}: {prev_val} -> {self.get_value()}")
-
-        return self.p10_count
+        from trace_logic import Tracer
+
+        # tracer を指定していなければ、この計算の間だけ記録する
+        tracer = self.tracer
+        if self.tracer is None:
+            self.tracer = Tracer()
+        start = len(self.tracer.events)
+        try:
+            for token in re.findall(r'[+-]?\d+', expression):
+                val = int(token)
+                if val >= 0:
+                    self.add(val)
+                else:
+                    self.subtract(abs(val))
+            return self.tracer.events[start:]
+        finally:
+            self.tracer = tracer
@@ -30,37 +30,30 @@ def is_p15_digit(a, b):
 
     return needs_split and not_simple_five_sub
 
-def count_p15_in_sequence(terms, num_digits=2):
+def count_p15_in_sequence(terms, num_digits=2, tracer=None):
     """
     計算過程に含まれるP15の総数をカウントする
     terms: 計算する数値のリスト
     num_digits: 対象の桁数
+    tracer: trace_logic.Tracer（指定したときだけ発生箇所を記録する）
     """
     p15_count = 0
     current_sum = 0
 
     for val in terms[0:]:
+        if tracer is not None:
+            tracer.begin_line()
         # 足し算の場合のみP15判定を行う
         if val > 0:
-            # --- 一の位の判定 ---
-            curr_ones = current_sum % 10
-            val_ones = val % 10
-            if is_p15_digit(curr_ones, val_ones):
-                p15_count += 1
-
-            # --- 十の位の判定 ---
-            if num_digits >= 2:
-                curr_tens = (current_sum // 10) % 10
-                val_tens = (val // 10) % 10
-                if is_p15_digit(curr_tens, val_tens):
-                    p15_count += 1
-
-            # --- 百の位の判定 ---
-            if num_digits >= 3:
-                curr_hundreds = (current_sum // 100) % 10
-                val_hundreds = (val // 100) % 10
-                if is_p15_digit(curr_hundreds, val_hundreds):
+            # --- 一の位から num_digits 桁目までの判定 ---
+            for col in range(num_digits):
+                place = 10 ** col
+                curr_digit = (current_sum // place) % 10
+                val_digit = (val // place) % 10
+                if is_p15_digit(curr_digit, val_digit):
                     p15_count += 1
+                    if tracer is not None:
+                        tracer.record(col, "P15", curr_digit, val_digit, (curr_digit + val_digit) % 10)
 
         # 計算を進める
         current_sum += val
@@ -16,37 +16,30 @@ def is_p5_digit(a, b):
 
     return is_in_range and is_sum_ge_5
 
-def count_p5_in_sequence(terms, num_digits=2):
+def count_p5_in_sequence(terms, num_digits=2, tracer=None):
     """
     計算過程に含まれるP5の総数をカウントする
     terms: 計算する数値のリスト (例: [12, 34, -5])
     num_digits: 対象の桁数（デフォルト2）
+    tracer: trace_logic.Tracer（指定したときだけ発生箇所を記録する）
     """
     p5_count = 0
     current_sum = 0
 
     for val in terms[0:]:
+        if tracer is not None:
+            tracer.begin_line()
         # 加算の場合のみP5判定を行う（そろばん等のロジックにおいて、P5は通常加算時の動作を指すため）
         if val > 0:
-            # --- 一の位の判定 ---
-            curr_ones = current_sum % 10
-            val_ones = val % 10
-            if is_p5_digit(curr_ones, val_ones):
-                p5_count += 1
-
-            # --- 十の位の判定 ---
-            if num_digits >= 2:
-                curr_tens = (current_sum // 10) % 10
-                val_tens = (val // 10) % 10
-                if is_p5_digit(curr_tens, val_tens):
-                    p5_count += 1
-
-            # --- 百の位の判定 ---
-            if num_digits >= 3:
-                curr_hundreds = (current_sum // 100) % 10
-                val_hundreds = (val // 100) % 10
-                if is_p5_digit(curr_hundreds, val_hundreds):
+            # --- 一の位から num_digits 桁目までの判定 ---
+            for col in range(num_digits):
+                place = 10 ** col
+                curr_digit = (current_sum // place) % 10
+                val_digit = (val // place) % 10
+                if is_p5_digit(curr_digit, val_digit):
                     p5_count += 1
+                    if tracer is not None:
+                        tracer.record(col, "P5", curr_digit, val_digit, (curr_digit + val_digit) % 10)
 
         # 計算を進める
         current_sum += val
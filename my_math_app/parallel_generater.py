@@ -0,0 +1,161 @@
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from classify_logic import TechniqueLimits
+from stats_logic import GenerationStats
+from problem_generater import MODE_RANDOM, SEEDED_ATTEMPTS, generate_seeded_problem
+
+# 1ワーカーあたり先行して投入しておくタスク数
+TASKS_PER_WORKER = 2
+# 1つのタスク（シャード）で作る問題番号の数の上限（問題数が少ないときは1問ずつ分けて全ワーカーを使う）
+MAX_PROBLEMS_PER_SHARD = 16
+# 中断の確認を行う間隔（秒）
+CANCEL_POLL_SECONDS = 0.2
+
+
+def _run_shard(config, targets, mode, seed, first_index, count, attempts, collect_stats):
+    """
+    ワーカープロセス側で、問題番号 first_index から count 個分の問題を生成する
+    各問題は (seed, 問題番号) だけで決まるので、どのワーカーが担当しても結果は同じになる
+    戻り値: ([(問題番号, 数列, 答え, カウントのタプル), ...]（欠番は含まない）, 統計の辞書 または None)
+    """
+    num_digits, num_lines, zero_count, minus_count = config
+    limits = TechniqueLimits(*targets)
+    stats = GenerationStats() if collect_stats else None
+    found = []
+    for index in range(first_index, first_index + count):
+        problem = generate_seeded_problem(num_digits, num_lines, zero_count, minus_count, limits, seed, index,
+                                          mode=mode, max_attempts=attempts, stats=stats)
+        if problem is not None:
+            terms, ans, counts = problem
+            found.append((index, terms, ans, tuple(counts)))
+    return found, (stats.to_dict() if stats is not None else None)
+
+
+def iter_indexed_problems_parallel(num_digits, num_lines, zero_count, minus_count, limits, num_questions,
+                                   workers=None, seed=None, mode=MODE_RANDOM, timeout_seconds=60,
+                                   problem_attempts=None, stats=None, cancel_event=None, dedup=None,
+                                   start_index=0, executor=None):
+    """
+    iter_seeded_problems と同じ問題を、問題番号の区間ごとに複数プロセスで分担して作るジェネレーター
+    番号順に揃った分から確定させるので、同じ seed なら workers の数に関係なく同じ問題が同じ順で出る
+    途中で止める（break や close()）と、残りのシャードを待たずにプロセスプールを片付ける
+    cancel_event: threading.Event など（is_set() が真になったら、完了待ちの途中でも終了する）
+    dedup: dedup_index.DedupIndex など（番号順に確定させるときに親プロセスで重複を除く。
+           出題済みだった番号は、iter_seeded_problems と同じく同じ乱数系列の次の問題を親プロセスで作り直す）
+    start_index: 最初の問題番号（中断した生成の続きから作るときに使う）
+    executor: 共有の ProcessPoolExecutor（指定するとそれを使い、終わっても閉じずに自分のシャードだけ取り消す）
+    戻り値: (問題番号, 数列, 答え, TechniqueCounts のタプル) を順に yield する
+    """
+    workers = workers or os.cpu_count() or 1
+    problem_attempts = problem_attempts or SEEDED_ATTEMPTS[mode]
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(64)
+    config = (num_digits, num_lines, zero_count, minus_count)
+    targets = tuple(limits.limits)
+    shard_size = max(1, min(MAX_PROBLEMS_PER_SHARD, num_questions // (workers * TASKS_PER_WORKER * 4)))
+
+    results = {}
+    ready_count = 0
+    next_ready = start_index
+    next_index = start_index
+    start_time = time.time()
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    pending = {}
+
+    def submit():
+        nonlocal next_index
+        future = executor.submit(_run_shard, config, targets, mode, seed, next_index, shard_size, problem_attempts,
+                                 stats is not None)
+        pending[future] = next_index
+        next_index += shard_size
+
+    try:
+        for _ in range(workers * TASKS_PER_WORKER):
+            submit()
+
+        while pending and ready_count < num_questions:
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            remaining = timeout_seconds - (time.time() - start_time)
+            if remaining <= 0:
+                break
+            done, _ = wait(pending, timeout=min(remaining, CANCEL_POLL_SECONDS), return_when=FIRST_COMPLETED)
+            for future in done:
+                found, shard_stats = future.result()
+                results[pending.pop(future)] = found
+                if stats is not None:
+                    stats.merge(shard_stats)
+
+            # シャードの先頭番号順に連続して揃った分だけ確定させる（完了順に依存しないように）
+            while next_ready in results:
+                for index, terms, ans, counts in results.pop(next_ready):
+                    if ready_count >= num_questions:
+                        break
+                    if dedup is not None and not dedup.add(terms):
+                        if stats is not None:
+                            stats.count("duplicate_problems")
+                        problem = generate_seeded_problem(num_digits, num_lines, zero_count, minus_count, limits,
+                                                          seed, index, mode=mode, max_attempts=problem_attempts,
+                                                          stats=stats, dedup=dedup)
+                        if problem is None:
+                            continue
+                        terms, ans, counts = problem
+                        counts = tuple(counts)
+                    ready_count += 1
+                    yield index, terms, ans, counts
+                next_ready += shard_size
+
+            while ready_count < num_questions and len(pending) < workers * TASKS_PER_WORKER:
+                submit()
+    finally:
+        # タイムアウト時・中断時に残りのシャードを待たずに戻る
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            for future in pending:
+                future.cancel()
+
+
+def iter_problems_parallel(num_digits, num_lines, zero_count, minus_count, limits, num_questions,
+                           workers=None, seed=None, mode=MODE_RANDOM, timeout_seconds=60,
+                           problem_attempts=None, stats=None, cancel_event=None, dedup=None, executor=None):
+    """
+    iter_indexed_problems_parallel から問題番号を除いて、確定した問題から順に1問ずつ返すジェネレーター
+    戻り値: (数列, 答え, TechniqueCounts のタプル) を順に yield する
+    """
+    problems = iter_indexed_problems_parallel(num_digits, num_lines, zero_count, minus_count, limits, num_questions,
+                                              workers, seed, mode, timeout_seconds, problem_attempts, stats,
+                                              cancel_event, dedup, executor=executor)
+    try:
+        for _, terms, ans, counts in problems:
+            yield terms, ans, counts
+    finally:
+        problems.close()
+
+
+def generate_problems_parallel(num_digits, num_lines, zero_count, minus_count, limits, num_questions,
+                               workers=None, seed=None, mode=MODE_RANDOM, timeout_seconds=60,
+                               problem_attempts=None, progress_callback=None, stats=None, dedup=None):
+    """
+    生成と判定を複数プロセスに分散して、目標に一致する問題を num_questions 問集める
+    問題ごとに (seed, 問題番号) から作った乱数系列を使い、結果は番号順に並べて採用するため、
+    同じ seed なら workers の数に関係なく同じ問題が返る（iter_problems(seed=seed) とも同じ）
+    progress_callback(見つかった数, 目標数) で進捗を通知する
+    stats: stats_logic.GenerationStats（指定すると完了したシャードの統計を足し合わせる）
+    dedup: dedup_index.DedupIndex など（出題済みの問題を除く）
+    戻り値: [(数列, 答え, TechniqueCounts のタプル), ...]
+    """
+    ready_problems = []
+    for problem in iter_problems_parallel(num_digits, num_lines, zero_count, minus_count, limits, num_questions,
+                                          workers, seed, mode, timeout_seconds, problem_attempts, stats,
+                                          dedup=dedup):
+        ready_problems.append(problem)
+        if progress_callback:
+            progress_callback(len(ready_problems), num_questions)
+    return ready_problems
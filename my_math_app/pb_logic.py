@@ -6,28 +6,28 @@ def is_plus_basic_digit(a, b):
     """
     return (a + b < 10) and ((a % 5) + (b % 5) < 5)
 
-def count_pb_in_sequence(terms, num_digits=2):
+def count_pb_in_sequence(terms, num_digits=2, tracer=None):
     """
     計算過程に含まれるPBの総数をカウントする
+    tracer: trace_logic.Tracer（指定したときだけ発生箇所を記録する）
     """
     pb_count = 0
     current_sum = 0
 
     for val in terms[0:]:
+        if tracer is not None:
+            tracer.begin_line()
         # 加算の場合のみPB判定を行う
         if val > 0:
-            # --- 一の位の判定 ---
-            curr_ones = current_sum % 10
-            val_ones = val % 10
-            if is_plus_basic_digit(curr_ones, val_ones):
-                pb_count += 1
-
-            # --- 十の位の判定 ---
-            # 現在の合計値の十の位（100以上になっても、計算に関与するのは十の位）
-            curr_tens = (current_sum // 10) % 10
-            val_tens = (val // 10) % 10
-            if is_plus_basic_digit(curr_tens, val_tens):
-                pb_count += 1
+            # --- 一の位から num_digits 桁目までの判定 ---
+            for col in range(num_digits):
+                place = 10 ** col
+                curr_digit = (current_sum // place) % 10
+                val_digit = (val // place) % 10
+                if is_plus_basic_digit(curr_digit, val_digit):
+                    pb_count += 1
+                    if tracer is not None:
+                        tracer.record(col, "PB", curr_digit, val_digit, (curr_digit + val_digit) % 10)
 
         # 計算を進める（引き算の場合も合計値は更新が必要）
         current_sum += val
@@ -0,0 +1,156 @@
+import argparse
+import os
+import random
+import sqlite3
+from array import array
+
+from classify_logic import TECHNIQUE_NAMES, TechniqueCounts, TechniqueLimits
+from problem_generater import iter_problems
+
+# 既定の保存先（環境変数 PROBLEM_BANK_PATH で変更できる）
+DEFAULT_BANK_PATH = os.environ.get(
+    "PROBLEM_BANK_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "problem_bank.sqlite"))
+
+# よく使う設定 (桁数, 口数, 0の数, マイナスの数)
+DEFAULT_CONFIGS = [
+    (2, 8, 2, 3),
+    (2, 10, 2, 4),
+    (3, 8, 2, 3),
+    (3, 10, 2, 4),
+]
+
+CONFIG_COLUMNS = ("digit_count", "num_lines", "zero_count", "minus_count")
+# 難易度シグネチャの列（索引はアプリで条件にする P/M を先に並べる）
+SIGNATURE_COLUMNS = ("p5", "p10", "p15", "m5", "m10", "m15", "pb", "mb")
+
+INSERT_BATCH = 5000
+
+
+def terms_typecode(num_digits):
+    """項を詰める array の型コード（4桁まで（累積和ではなく項なので ±9999）は int16、5桁は int32）"""
+    return "h" if num_digits <= 4 else "i"
+
+
+def pack_terms(terms, num_digits=2):
+    """項のリストを int16（5桁なら int32）のバイト列に詰める"""
+    return array(terms_typecode(num_digits), terms).tobytes()
+
+
+def unpack_terms(blob, num_digits=2):
+    terms = array(terms_typecode(num_digits))
+    terms.frombytes(blob)
+    return terms.tolist()
+
+
+class ProblemBank:
+    """
+    事前生成した問題を (桁数, 口数, 0の数, マイナスの数) と難易度シグネチャで引けるように保存したSQLiteファイル
+    """
+
+    def __init__(self, path=DEFAULT_BANK_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS problems (
+                id INTEGER PRIMARY KEY,
+                {", ".join(f"{c} INTEGER NOT NULL" for c in CONFIG_COLUMNS)},
+                {", ".join(f"{c} INTEGER NOT NULL" for c in TECHNIQUE_NAMES)},
+                ans INTEGER NOT NULL,
+                terms BLOB NOT NULL,
+                UNIQUE ({", ".join(CONFIG_COLUMNS)}, terms)
+            )""")
+        self.conn.execute(f"""
+            CREATE INDEX IF NOT EXISTS problems_signature
+            ON problems ({", ".join(CONFIG_COLUMNS + SIGNATURE_COLUMNS)})""")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add_problems(self, config, problems):
+        """(数列, 答え, TechniqueCounts) のリストを追加する（同じ数列は無視）。追加できた件数を返す"""
+        rows = [tuple(config) + tuple(counts) + (ans, pack_terms(terms, config[0])) for terms, ans, counts in problems]
+        columns = CONFIG_COLUMNS + TECHNIQUE_NAMES + ("ans", "terms")
+        before = self.conn.total_changes
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR IGNORE INTO problems ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                rows)
+        return self.conn.total_changes - before
+
+    def _where(self, config, limits):
+        clauses = [f"{c} = ?" for c in CONFIG_COLUMNS]
+        params = list(config)
+        for name, target in zip(TECHNIQUE_NAMES, limits.limits):
+            if target is not None:
+                clauses.append(f"{name} = ?")
+                params.append(target)
+        return " AND ".join(clauses), params
+
+    def count(self, config, limits=None):
+        """条件に一致する問題数を返す"""
+        where, params = self._where(config, limits or TechniqueLimits())
+        return self.conn.execute(f"SELECT COUNT(*) FROM problems WHERE {where}", params).fetchone()[0]
+
+    def sample(self, config, limits, count, rng=None):
+        """
+        条件と目標カウントに一致する問題を最大 count 問ランダムに取り出す
+        戻り値: [(数列, 答え, TechniqueCounts), ...]
+        """
+        rng = rng or random
+        where, params = self._where(config, limits)
+        ids = [row[0] for row in self.conn.execute(f"SELECT id FROM problems WHERE {where}", params)]
+        if not ids:
+            return []
+        chosen = rng.sample(ids, min(count, len(ids)))
+        problems = []
+        for chosen_id in chosen:
+            row = self.conn.execute(
+                f"SELECT {', '.join(TECHNIQUE_NAMES)}, ans, terms FROM problems WHERE id = ?", (chosen_id,)).fetchone()
+            problems.append((unpack_terms(row[-1], config[0]), row[-2], TechniqueCounts(*row[:-2])))
+        return problems
+
+
+def build_bank(path, configs=DEFAULT_CONFIGS, per_config=100000, progress=print):
+    """
+    各設定について per_config 回ランダム生成を行い、条件を満たした問題をすべてシグネチャ付きで保存する
+    """
+    with ProblemBank(path) as bank:
+        for config in configs:
+            num_digits, num_lines, zero_count, minus_count = config
+            # 目標なし（すべて一致）で流し、分類結果ごと保存する
+            problems = iter_problems(num_digits, num_lines, zero_count, minus_count, TechniqueLimits(),
+                                     max_attempts=per_config)
+            added = 0
+            batch = []
+            for problem in problems:
+                batch.append(problem)
+                if len(batch) >= INSERT_BATCH:
+                    added += bank.add_problems(config, batch)
+                    batch = []
+            added += bank.add_problems(config, batch)
+            progress(f"{num_digits}桁{num_lines}口 (0:{zero_count}, マイナス:{minus_count}): "
+                     f"{added}問追加 / 合計 {bank.count(config)}問")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="問題バンク（SQLite）を事前生成する")
+    parser.add_argument("--db", default=DEFAULT_BANK_PATH, help="保存先のファイル")
+    parser.add_argument("--per-config", type=int, default=100000, help="設定ごとの生成試行回数")
+    parser.add_argument("--config", action="append", metavar="桁数,口数,0の数,マイナスの数",
+                        help="対象の設定（複数指定可、省略時はよく使う設定）")
+    args = parser.parse_args()
+
+    configs = DEFAULT_CONFIGS
+    if args.config:
+        configs = [tuple(int(x) for x in c.split(",")) for c in args.config]
+    build_bank(args.db, configs, args.per_config)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,31 @@
 import random
-from pb_logic import count_pb_in_sequence
-from mb_logic import count_mb_in_sequence
-from p5_logic import count_p5_in_sequence
-from m5_logic import count_m5_in_sequence
-from p10_logic import count_p10_in_sequence
-from m10_logic import count_m10_in_sequence
-from p15_logic import count_p15_in_sequence
-from m15_logic import count_m15_in_sequence
-
-
-def create_digits_pool(num_digits, num_lines, zero_count):
+import time
+from classify_logic import TECHNIQUE_NAMES, TechniqueCounts, TechniqueLimits, classify_sequence, classify_sequence_within, matches_targets
+from constructive_generater import generate_targeted_problem
+from adaptive_sampler import get_adaptive_sampler
+
+MODE_RANDOM = "random"  # ランダム生成して条件に合うものだけ残す
+MODE_TARGETED = "targeted"  # 目標カウントから1項ずつ組み立てる
+MODE_BATCH = "batch"  # numpy でまとめて生成・判定する
+MODE_EXACT = "exact"  # 条件を満たす数列を数え上げ、目標に一致するものから一様に取り出す
+MODE_ADAPTIVE = "adaptive"  # 目標に一致した候補から数字・0・マイナスの選び方を学習して、一致しやすい候補を引く
+
+# MODE_BATCH で1回に生成する候補数
+BATCH_SIZE = 4096
+# 並び順と符号の探索で調べるノード数の上限
+ARRANGE_MAX_NODES = 200
+# シードを指定した生成で、1問（1つの問題番号）に使う試行回数の上限
+# 使い切った番号は欠番にして次の番号へ進む（欠番もシードだけで決まるので結果は再現できる）
+SEEDED_ATTEMPTS = {MODE_RANDOM: 100000, MODE_TARGETED: 100, MODE_BATCH: 25 * BATCH_SIZE, MODE_EXACT: 1000,
+                   MODE_ADAPTIVE: 20000}
+
+
+def create_digits_pool(num_digits, num_lines, zero_count, rng=None):
     # 1～9の数字をほぼ均等に配置した数字プールを生成
+    # rng: random.Random（省略時はモジュールの random。以下の関数も同じ）
+    if zero_count > num_lines:
+        raise ValueError(f"0の回数（{zero_count}）が口数（{num_lines}）を超えています。")
+    rng = rng or random
     normal_lines = num_lines - zero_count  # 通常の項の数 = 全口数 - 0の項の数
 
     # 必要な数字 = (通常の項 * 2個) + (0の項 * 1個)
@@ -24,49 +39,49 @@ def create_digits_pool(num_digits, num_lines, zero_count):
     for i in range(1, 10):
         digits_pool.extend([i] * base_count)
     if remainder > 0:
-        extra_candidates = random.choices(range(1, 10), k=remainder)  # 条件緩和のためにchoicesを使用
+        extra_candidates = rng.choices(range(1, 10), k=remainder)  # 条件緩和のためにchoicesを使用
         digits_pool.extend(extra_candidates)
 
     return digits_pool
 
 
-def create_zero_terms(current_pool, zero_count, num_digits):
+def create_zero_terms(current_pool, zero_count, num_digits, rng=None):
     """
     プールから数字を取り出し、0を含む項を生成する
+    最上位以外のどこか1つの位を0にする（位置はランダム）
     2桁の場合: X0
-    3桁の場合: XX0 または X0X (ランダム)
+    3桁の場合: XX0 または X0X
+    4桁以上も同様に、0以外の数字を num_digits - 1 個使う
     """
+    if num_digits < 2:
+        raise ValueError(f"create_zero_terms は {num_digits} 桁に対応していません。")
+    rng = rng or random
     zero_terms = []
     for _ in range(zero_count):
-        if num_digits == 2:
-            val = current_pool.pop()
-            term = val * 10 + 0
-
-        elif num_digits == 3:
-            h = current_pool.pop()
-            other = current_pool.pop()
-            pattern = random.choice(['XX0', 'X0X'])
-            if pattern == 'XX0':
-                term = h * 100 + other * 10 + 0
-            else:
-                term = h * 100 + 0 * 10 + other
-
-        else:
-            raise ValueError(f"create_zero_terms は現在 {num_digits} 桁に対応していません。")
-
+        digits = [current_pool.pop() for _ in range(num_digits - 1)]
+        # 0を入れる位置（最上位から数えて何桁目か。2桁なら一の位に決まる）
+        zero_position = rng.randint(1, num_digits - 1) if num_digits > 2 else 1
+        digits.insert(zero_position, 0)
+
+        term = 0
+        for d in digits:
+            term = term * 10 + d
         zero_terms.append(term)
 
     return zero_terms
 
 
-def create_non_zero_terms(current_pool, num_digits):
+def create_non_zero_terms(current_pool, num_digits, stats=None, rng=None):
     if len(current_pool) % num_digits != 0:
         raise ValueError(
             f"create_non_zero_terms エラー: プールの残り要素数({len(current_pool)}個)が桁数({num_digits})で割り切れません。組み合わせを作成できません。")
 
     # 指定桁数の数字セットを生成（最大50回試行）
+    rng = rng or random
     for _ in range(50):
-        random.shuffle(current_pool)
+        rng.shuffle(current_pool)
+        if stats is not None:
+            stats.count("pairing_shuffles")
         attempt_pairs = []
         possible = True
 
@@ -76,6 +91,8 @@ def create_non_zero_terms(current_pool, num_digits):
             # ゾロ目チェック(3桁の場合、111などの完全なゾロ目を排除)
             if len(set(digits_chunk)) == 1:
                 possible = False
+                if stats is not None:
+                    stats.count("repdigit_rejections")
                 break
 
             val = 0
@@ -89,12 +106,13 @@ def create_non_zero_terms(current_pool, num_digits):
     return [], False
 
 
-def apply_signs(temp_terms, minus_count):
+def apply_signs(temp_terms, minus_count, rng=None):
     # 最初の項を正、残りの項から指定数をマイナスに設定して計算式を作成
-    random.shuffle(temp_terms)
+    rng = rng or random
+    rng.shuffle(temp_terms)
     x1 = temp_terms[0]
     rest = temp_terms[1:]
-    minus_indices = random.sample(range(len(rest)), minus_count)
+    minus_indices = rng.sample(range(len(rest)), minus_count)
     calc_sequence = [x1] + rest[:]
     for idx in minus_indices:
         calc_sequence[idx + 1] = -calc_sequence[idx + 1]
@@ -121,22 +139,95 @@ def is_cumulative_sum_valid(calc_sequence, num_digits):
     return True, current_sum
 
 
-def generate_single_problem(num_digits, num_lines, zero_count, minus_count):
+def iter_arrangements(temp_terms, minus_count, num_digits, rng=None, max_nodes=None):
+    """
+    項の並び順と符号を1項ずつ決めていき、累積和が範囲 [10^(桁数-1), 10^(桁数+1)-1] を外れた時点で
+    その枝を打ち切りながら、条件を満たす数列をすべて（ランダムな順で）返すジェネレーター
+    最初の項は正、マイナスはちょうど minus_count 個
+    絶対値が重複する項の組はどう並べても条件を満たさないので、何も返さない
+    max_nodes: 探索するノード数の上限（None なら全探索）
+    """
+    if has_duplicate_absolute_values(temp_terms):
+        return
+    rng = rng or random
+    min_sum = 10 ** (num_digits - 1)
+    max_sum = (10 ** (num_digits + 1)) - 1
+    num_lines = len(temp_terms)
+    remaining = list(temp_terms)
+    sequence = []
+    nodes = [0]
+
+    def visit(current_sum, minus_left):
+        if not remaining:
+            yield list(sequence)
+            return
+        nodes[0] += 1
+        if max_nodes is not None and nodes[0] > max_nodes:
+            return
+        position = num_lines - len(remaining)
+        signs = []
+        # 残りの口数で、指定数のマイナスを置ききれるようにする
+        if minus_left < len(remaining):
+            signs.append(1)
+        if position > 0 and minus_left > 0:
+            signs.append(-1)
+        rng.shuffle(signs)
+
+        order = list(range(len(remaining)))
+        rng.shuffle(order)
+        for index in order:
+            term = remaining[index]
+            for sign in signs:
+                new_sum = current_sum + sign * term
+                if not (min_sum <= new_sum <= max_sum):
+                    continue
+                remaining[index] = remaining[-1]
+                remaining.pop()
+                sequence.append(sign * term)
+                yield from visit(new_sum, minus_left - (1 if sign < 0 else 0))
+                sequence.pop()
+                remaining.append(term)
+                remaining[index], remaining[-1] = remaining[-1], remaining[index]
+
+    yield from visit(0, minus_count)
+
+
+def arrange_terms(temp_terms, minus_count, num_digits, rng=None, max_nodes=ARRANGE_MAX_NODES):
+    """iter_arrangements の最初の1つを返す（見つからなければ None）"""
+    for calc_sequence in iter_arrangements(temp_terms, minus_count, num_digits, rng, max_nodes):
+        return calc_sequence
+    return None
+
+
+def generate_single_problem(num_digits, num_lines, zero_count, minus_count, stats=None, rng=None):
     # 指定条件に合致する単一の問題を生成（最大1000回試行）
-    digits_pool = create_digits_pool(num_digits, num_lines, zero_count)
+    # stats: stats_logic.GenerationStats（指定したときだけ段階ごとの棄却数を数える）
+    # rng: random.Random（指定すると乱数をすべてここから取るので、同じ状態なら同じ問題になる）
+    rng = rng or random
+    digits_pool = create_digits_pool(num_digits, num_lines, zero_count, rng)
     for _ in range(1000):
+        if stats is not None:
+            stats.count("single_problem_iterations")
         current_pool = digits_pool[:]
-        random.shuffle(current_pool)
+        rng.shuffle(current_pool)
         temp_terms = []
-        temp_terms.extend(create_zero_terms(current_pool, zero_count, num_digits))
-        non_zero_terms, pairing_success = create_non_zero_terms(current_pool, num_digits)
+        temp_terms.extend(create_zero_terms(current_pool, zero_count, num_digits, rng))
+        non_zero_terms, pairing_success = create_non_zero_terms(current_pool, num_digits, stats, rng)
         if not pairing_success:
+            if stats is not None:
+                stats.count("pairing_failures")
             continue
         temp_terms.extend(non_zero_terms)
-        calc_sequence = apply_signs(temp_terms, minus_count)
-        valid, final_sum = is_cumulative_sum_valid(calc_sequence, num_digits)
-        if valid:
-            return calc_sequence, final_sum
+        if has_duplicate_absolute_values(temp_terms):
+            if stats is not None:
+                stats.count("duplicate_absolute_values")
+            continue
+        # 並び順と符号は、累積和が範囲を外れた途中で打ち切りながら探す
+        calc_sequence = arrange_terms(temp_terms, minus_count, num_digits, rng)
+        if calc_sequence is not None:
+            return calc_sequence, sum(calc_sequence)
+        if stats is not None:
+            stats.count("cumulative_sum_out_of_range")
     return None
 
 
@@ -151,6 +242,279 @@ def format_formula(terms, ans):
     return f"{formula}={ans}"
 
 
+def problem_seed(seed, index):
+    """全体のシードと問題番号から、その問題専用の乱数シードを作る"""
+    return f"{seed}:{index}"
+
+
+def generate_seeded_problem(digit_count, num_lines, zero_count, minus_count, targets, seed, index,
+                            mode=MODE_RANDOM, max_attempts=None, stats=None, dedup=None, cancel_event=None):
+    """
+    (seed, 問題番号) だけで決まる1問を生成する（ほかの番号の問題や、並列数・実行順には左右されない）
+    目標に一致する問題が max_attempts 回（省略時は SEEDED_ATTEMPTS）で見つからなければ None（欠番）
+    dedup: 指定すると、出題済みの問題は飛ばして同じ乱数系列の次の問題を使う
+    戻り値: (数列, 答え, TechniqueCounts) または None
+    """
+    rng = random.Random(problem_seed(seed, index))
+    attempts = SEEDED_ATTEMPTS[mode] if max_attempts is None else max_attempts
+    if mode == MODE_ADAPTIVE:
+        # 学習を済ませて固定した分布を使い、ほかの問題番号の生成結果に左右されないようにする
+        problems = _iter_adaptive_problems(digit_count, num_lines, zero_count, minus_count, targets, attempts, None,
+                                           rng, None, stats, cancel_event, dedup, frozen=True)
+        return next(problems, None)
+    problems = iter_problems(digit_count, num_lines, zero_count, minus_count, targets, mode=mode,
+                             max_attempts=attempts, rng=rng, stats=stats, cancel_event=cancel_event, dedup=dedup)
+    return next(problems, None)
+
+
+def iter_seeded_problems(digit_count, num_lines, zero_count, minus_count, targets, seed, start_index=0,
+                         mode=MODE_RANDOM, max_attempts=None, timeout_seconds=None, stats=None, cancel_event=None,
+                         dedup=None):
+    """
+    問題番号 start_index, start_index+1, ... の問題を generate_seeded_problem で順に作るジェネレーター
+    同じ seed・設定・目標なら、いつ何回実行しても同じ問題が同じ順で出る（欠番は飛ばす）
+    ワークシートは (seed, 設定, 目標, 問題数) だけ保存しておけば、あとで作り直せる
+    max_attempts: 1問あたりの試行回数の上限（省略時は SEEDED_ATTEMPTS）
+    戻り値: (問題番号, 数列, 答え, TechniqueCounts) を順に yield する
+    """
+    start_time = time.time()
+    index = start_index
+    while True:
+        if timeout_seconds is not None and time.time() - start_time > timeout_seconds:
+            return
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        problem = generate_seeded_problem(digit_count, num_lines, zero_count, minus_count, targets, seed, index,
+                                          mode, max_attempts, stats, dedup, cancel_event)
+        if problem is None and cancel_event is not None and cancel_event.is_set():
+            # 中断で見つからなかった番号は欠番にしない
+            return
+        if problem is not None:
+            yield (index,) + problem
+        index += 1
+
+
+def iter_problems(digit_count, num_lines, zero_count, minus_count, targets, mode=MODE_RANDOM,
+                  max_attempts=None, timeout_seconds=None, rng=None, surplus=None, stats=None, cancel_event=None,
+                  dedup=None, seed=None):
+    """
+    条件と目標カウントに一致する問題を1問ずつ返すジェネレーター
+    必要な数だけ取り出せばよく（itertools.islice や break で途中終了できる）、結果をため込まないのでメモリも一定
+    targets: TechniqueLimits または {"p5": 1, ...} の辞書（指定した技法は完全一致）
+    max_attempts / timeout_seconds: 試行回数・経過時間の上限（None なら無制限）
+    surplus: 目標に一致しなかった問題を受け取る関数 surplus(数列, 答え, TechniqueCounts)
+             （指定すると早期終了せずに全カウントを数える）
+    stats: stats_logic.GenerationStats（指定すると段階ごとの棄却数と時間を記録する）
+    cancel_event: threading.Event など（is_set() が真になったら、次の試行の前に終了する）
+    dedup: dedup_index.DedupIndex など（目標に一致した問題を add() し、出題済みなら返さずに次を探す）
+    seed: 指定すると iter_seeded_problems と同じく問題番号ごとのシードで作る（同じ seed なら同じ問題になる）
+          このとき max_attempts は1問あたりの上限になり、surplus は使わない
+    戻り値: (数列, 答え, TechniqueCounts) を順に yield する
+    """
+    if isinstance(targets, dict):
+        targets = TechniqueLimits(**targets)
+    if seed is not None:
+        for _, terms, ans, counts in iter_seeded_problems(digit_count, num_lines, zero_count, minus_count, targets,
+                                                          seed, mode=mode, max_attempts=max_attempts,
+                                                          timeout_seconds=timeout_seconds, stats=stats,
+                                                          cancel_event=cancel_event, dedup=dedup):
+            yield terms, ans, counts
+        return
+    if mode == MODE_BATCH:
+        yield from _iter_batch_problems(digit_count, num_lines, zero_count, minus_count, targets,
+                                        max_attempts, timeout_seconds, rng, surplus, stats, cancel_event, dedup)
+        return
+    if mode == MODE_EXACT:
+        yield from _iter_exact_problems(digit_count, num_lines, zero_count, minus_count, targets,
+                                        max_attempts, timeout_seconds, rng, stats, cancel_event, dedup)
+        return
+    if mode == MODE_ADAPTIVE:
+        yield from _iter_adaptive_problems(digit_count, num_lines, zero_count, minus_count, targets,
+                                           max_attempts, timeout_seconds, rng, surplus, stats, cancel_event, dedup)
+        return
+    start_time = time.time()
+    attempts = 0
+    while max_attempts is None or attempts < max_attempts:
+        if timeout_seconds is not None and time.time() - start_time > timeout_seconds:
+            return
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        attempts += 1
+        if stats is not None:
+            stats.count("candidates")
+            generate_start = time.perf_counter()
+
+        if mode == MODE_TARGETED:
+            result = generate_targeted_problem(digit_count, num_lines, zero_count, minus_count, targets, rng=rng)
+        else:
+            result = generate_single_problem(digit_count, num_lines, zero_count, minus_count, stats, rng)
+        if stats is not None:
+            stats.add_time("generate", time.perf_counter() - generate_start)
+        if not result:
+            if stats is not None:
+                stats.count("generation_failures")
+            continue
+
+        terms, ans = result
+        if stats is not None:
+            # 統計を取るときは、どの目標で外れたかを数えるため全カウントを出す
+            stats.count("valid_candidates")
+            with stats.timer("classify"):
+                counts = classify_sequence(terms, digit_count)
+            if not _record_target_result(stats, counts, targets):
+                if surplus is not None:
+                    surplus(terms, ans, counts)
+                continue
+        elif surplus is not None:
+            counts = classify_sequence(terms, digit_count)
+            if not matches_targets(counts, targets):
+                surplus(terms, ans, counts)
+                continue
+        else:
+            # 盤面を1回だけシミュレートして全技法を数える（目標超過の時点で打ち切り）
+            counts = classify_sequence_within(terms, digit_count, targets)
+            if counts is None or not matches_targets(counts, targets):
+                continue
+        if not _is_new_problem(dedup, terms, stats):
+            continue
+        yield terms, ans, counts
+
+
+def _is_new_problem(dedup, terms, stats):
+    """重複チェックを使わないか、まだ出していない問題なら True（出題済みなら棄却数を数える）"""
+    if dedup is None or dedup.add(terms):
+        return True
+    if stats is not None:
+        stats.count("duplicate_problems")
+    return False
+
+
+def _record_target_result(stats, counts, targets):
+    """目標と一致したかを返し、一致しなかった技法ごとに棄却数を数える"""
+    matched = True
+    for name, count, target in zip(TECHNIQUE_NAMES, counts, targets.limits):
+        if target is not None and count != target:
+            stats.count(f"target_mismatch_{name}")
+            matched = False
+    stats.count("accepted" if matched else "rejected_by_targets")
+    return matched
+
+
+def _iter_batch_problems(digit_count, num_lines, zero_count, minus_count, targets,
+                         max_attempts, timeout_seconds, rng, surplus, stats, cancel_event, dedup):
+    # numpy は一括生成を使うときだけ読み込む
+    import numpy as np
+    from batch_logic import classify_batch, generate_batch, match_targets_batch
+
+    np_rng = np.random.default_rng(None if rng is None else rng.getrandbits(64))
+    start_time = time.time()
+    attempts = 0
+    while max_attempts is None or attempts < max_attempts:
+        if timeout_seconds is not None and time.time() - start_time > timeout_seconds:
+            return
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        batch_size = BATCH_SIZE if max_attempts is None else min(BATCH_SIZE, max_attempts - attempts)
+        attempts += batch_size
+
+        generate_start = time.perf_counter()
+        sequences = generate_batch(digit_count, num_lines, zero_count, minus_count, batch_size, rng=np_rng,
+                                   stats=stats)
+        classify_start = time.perf_counter()
+        counts = classify_batch(sequences, digit_count)
+        matched = match_targets_batch(counts, *targets.limits)
+        if stats is not None:
+            stats.add_time("generate", classify_start - generate_start)
+            stats.add_time("classify", time.perf_counter() - classify_start)
+            stats.count("candidates", batch_size)
+            stats.count("valid_candidates", len(sequences))
+            stats.count("accepted", int(matched.sum()))
+            stats.count("rejected_by_targets", int(len(sequences) - matched.sum()))
+            for field, (name, target) in enumerate(zip(TECHNIQUE_NAMES, targets.limits)):
+                if target is not None:
+                    stats.count(f"target_mismatch_{name}", int((counts[:, field] != target).sum()))
+        for row, row_counts, is_match in zip(sequences.tolist(), counts.tolist(), matched.tolist()):
+            if is_match:
+                if _is_new_problem(dedup, row, stats):
+                    yield row, sum(row), TechniqueCounts(*row_counts)
+            elif surplus is not None:
+                surplus(row, sum(row), TechniqueCounts(*row_counts))
+
+
+def _iter_exact_problems(digit_count, num_lines, zero_count, minus_count, targets,
+                         max_attempts, timeout_seconds, rng, stats, cancel_event, dedup):
+    # counting_logic はこのモジュールを読み込むので、使うときだけ読み込む
+    from counting_logic import get_exact_counter
+
+    start_time = time.time()
+    count_start = time.perf_counter()
+    counter = get_exact_counter(digit_count, num_lines, zero_count, minus_count, targets)
+    if stats is not None:
+        stats.add_time("count", time.perf_counter() - count_start)
+    if counter.candidate_total() == 0:
+        return
+    attempts = 0
+    while max_attempts is None or attempts < max_attempts:
+        if timeout_seconds is not None and time.time() - start_time > timeout_seconds:
+            return
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        attempts += 1
+        if stats is not None:
+            stats.count("candidates")
+            generate_start = time.perf_counter()
+        # 取り出した数列は必ず目標に一致する（絶対値の重複などで棄却されたときだけ None）
+        result = counter.sample(rng=rng, max_tries=1, stats=stats)
+        if stats is not None:
+            stats.add_time("generate", time.perf_counter() - generate_start)
+        if not result:
+            continue
+        terms, ans = result
+        if stats is not None:
+            stats.count("valid_candidates")
+            stats.count("accepted")
+        if not _is_new_problem(dedup, terms, stats):
+            continue
+        yield terms, ans, classify_sequence(terms, digit_count)
+
+
+def _iter_adaptive_problems(digit_count, num_lines, zero_count, minus_count, targets,
+                            max_attempts, timeout_seconds, rng, surplus, stats, cancel_event, dedup, frozen=False):
+    start_time = time.time()
+    # 学習した分布は設定と目標ごとに残り、次の生成でも続きから使う（frozen なら学習済みの固定した分布）
+    sampler = get_adaptive_sampler(digit_count, num_lines, zero_count, minus_count, targets, frozen=frozen)
+    attempts = 0
+    while max_attempts is None or attempts < max_attempts:
+        if timeout_seconds is not None and time.time() - start_time > timeout_seconds:
+            return
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        attempts += 1
+        if stats is not None:
+            stats.count("candidates")
+            generate_start = time.perf_counter()
+        candidate = sampler.draw(rng)
+        if stats is not None:
+            stats.add_time("generate", time.perf_counter() - generate_start)
+        if candidate is None:
+            if stats is not None:
+                stats.count("adaptive_dead_ends")
+            continue
+        terms, counts = candidate
+        if stats is not None:
+            stats.count("valid_candidates")
+            matched = _record_target_result(stats, counts, targets)
+        else:
+            matched = matches_targets(counts, targets)
+        if not matched:
+            if surplus is not None:
+                surplus(terms, sum(terms), counts)
+            continue
+        if not _is_new_problem(dedup, terms, stats):
+            continue
+        yield terms, sum(terms), counts
+
+
 def generate_problem_set():
     """
     問題を指定数生成して出力する
@@ -172,22 +536,9 @@ def generate_problem_set():
         result = generate_single_problem(NUM_DIGITS, NUM_LINES, ZERO_COUNT, MINUS_COUNT)
         if result:
             terms, ans = result
-            # ここでPBの数をカウント
-            pb_count = count_pb_in_sequence(terms, NUM_DIGITS)
-            # MBの数をカウント
-            mb_count = count_mb_in_sequence(terms, NUM_DIGITS)
-            # P5の数をカウント
-            p5_count = count_p5_in_sequence(terms, NUM_DIGITS)
-            # M5の数をカウント
-            m5_count = count_m5_in_sequence(terms, NUM_DIGITS)
-            # P10の数をカウント
-            p10_count = count_p10_in_sequence(terms, NUM_DIGITS)
-            # M10の数をカウント
-            m10_count = count_m10_in_sequence(terms, NUM_DIGITS)
-            # P15の数をカウント
-            p15_count = count_p15_in_sequence(terms, NUM_DIGITS)
-            # M15の数をカウント
-            m15_count = count_m15_in_sequence(terms, NUM_DIGITS)
+            # 盤面を1回シミュレートして8種類の技法をまとめてカウント
+            pb_count, mb_count, p5_count, m5_count, p10_count, m10_count, p15_count, m15_count = \
+                classify_sequence(terms, NUM_DIGITS)
 
             # PB+MBの合計が目標値と一致する場合のみ追加
             if pb_count + mb_count == target_pb_mb_count:
@@ -0,0 +1,157 @@
+import json
+import os
+import sys
+from array import array
+
+from classify_logic import TECHNIQUE_NAMES, TechniqueCounts
+from problem_bank import terms_typecode
+from problem_generater import format_formula
+
+_MAGIC = b"PROBSET1\n"
+# 詳細データ（record）に含める技法（PB/MBは基本なので含めない）
+RECORD_FIELDS = ("p5", "p10", "p15", "m5", "m10", "m15")
+
+
+class ProblemSet:
+    """
+    桁数と口数が同じ問題をまとめて、項を int16（5桁なら int32）の配列、技法カウントを uint8 の配列に詰めて持つ
+    1問あたり 口数 × 2バイト + 8バイト（8口の2桁なら24バイト）で、式の文字列や辞書は必要になったときだけ作る
+    答えは項の合計なので持たない
+    """
+
+    def __init__(self, num_digits, num_lines):
+        self.num_digits = num_digits
+        self.num_lines = num_lines
+        self._terms = array(terms_typecode(num_digits))
+        self._counts = array("B")
+
+    @classmethod
+    def from_problems(cls, num_digits, num_lines, problems):
+        """[(数列, 答え, TechniqueCounts), ...] から作る"""
+        problem_set = cls(num_digits, num_lines)
+        problem_set.extend(problems)
+        return problem_set
+
+    def __len__(self):
+        return len(self._counts) // len(TECHNIQUE_NAMES)
+
+    def append(self, terms, counts):
+        if len(terms) != self.num_lines:
+            raise ValueError(f"口数が {self.num_lines} ではない問題（{len(terms)}口）は入れられません。")
+        self._terms.extend(terms)
+        self._counts.extend(counts)
+
+    def extend(self, problems):
+        for terms, _, counts in problems:
+            self.append(terms, counts)
+
+    def truncate(self, count):
+        """先頭の count 問だけを残す"""
+        del self._terms[count * self.num_lines:]
+        del self._counts[count * len(TECHNIQUE_NAMES):]
+
+    def copy(self):
+        """同じ問題を持つ別の ProblemSet（配列をまとめてコピーする）"""
+        problem_set = ProblemSet(self.num_digits, self.num_lines)
+        problem_set._terms = array(self._terms.typecode, self._terms)
+        problem_set._counts = array("B", self._counts)
+        return problem_set
+
+    def terms(self, index):
+        start = index * self.num_lines
+        return self._terms[start:start + self.num_lines].tolist()
+
+    def counts(self, index):
+        start = index * len(TECHNIQUE_NAMES)
+        return TechniqueCounts(*self._counts[start:start + len(TECHNIQUE_NAMES)])
+
+    def answer(self, index):
+        start = index * self.num_lines
+        return sum(self._terms[start:start + self.num_lines])
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        terms = self.terms(index)
+        return terms, sum(terms), self.counts(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def formula(self, index):
+        """index 番目の問題の「式=答え」（呼ばれたときに作る）"""
+        terms = self.terms(index)
+        return format_formula(terms, sum(terms))
+
+    def record(self, index):
+        """結果表示・ダウンロード用の1問分の辞書"""
+        terms, ans, counts = self[index]
+        record = {"formula": format_formula(terms, ans), "ans": ans}
+        record.update({name: getattr(counts, name) for name in RECORD_FIELDS})
+        record["terms"] = terms
+        return record
+
+    def iter_text(self, start=0, stop=None):
+        """「No.番号:\\n式\\n\\n」を1問ずつ返す（ファイルやダウンロードに流し込む用）"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        for index in range(start, stop):
+            yield f"No.{index + 1}:\n{self.formula(index)}\n\n"
+
+    def to_text(self):
+        """全問をテキストにする（文字列の連結を繰り返さず、まとめて join する）"""
+        return "".join(self.iter_text())
+
+    def nbytes(self):
+        """項とカウントの配列が使っているバイト数"""
+        return self._terms.itemsize * len(self._terms) + len(self._counts)
+
+    def to_numpy(self):
+        """
+        (項の行列, カウントの行列) を numpy の配列で返す（コピーせず同じメモリを指す）
+        返した配列を使っている間は append できない（array の大きさを変えられないため）
+        """
+        # numpy は使うときだけ読み込む
+        import numpy as np
+
+        terms = np.frombuffer(self._terms, dtype=np.int16 if self._terms.typecode == "h" else np.int32)
+        counts = np.frombuffer(self._counts, dtype=np.uint8)
+        return terms.reshape(-1, self.num_lines), counts.reshape(-1, len(TECHNIQUE_NAMES))
+
+    def to_bytes(self):
+        """まとめて保存・転送するためのバイト列（ヘッダーの後に配列をそのまま並べる）"""
+        header = {"num_digits": self.num_digits, "num_lines": self.num_lines, "count": len(self),
+                  "byteorder": sys.byteorder}
+        return b"".join([_MAGIC, json.dumps(header).encode("ascii"), b"\n", self._terms.tobytes(),
+                         self._counts.tobytes()])
+
+    @classmethod
+    def from_bytes(cls, data):
+        if not data.startswith(_MAGIC):
+            raise ValueError("問題セットのデータではありません。")
+        header_end = data.index(b"\n", len(_MAGIC))
+        header = json.loads(data[len(_MAGIC):header_end])
+        problem_set = cls(header["num_digits"], header["num_lines"])
+        terms_size = header["count"] * header["num_lines"] * problem_set._terms.itemsize
+        body = memoryview(data)[header_end + 1:]
+        if len(body) != terms_size + header["count"] * len(TECHNIQUE_NAMES):
+            raise ValueError("問題セットのデータが壊れています。")
+        problem_set._terms.frombytes(body[:terms_size])
+        problem_set._counts.frombytes(body[terms_size:])
+        if header.get("byteorder", sys.byteorder) != sys.byteorder:
+            problem_set._terms.byteswap()
+        return problem_set
+
+    def save(self, path):
+        # 書き込み途中で止まっても前の内容が残るよう、一時ファイルに書いてから置き換える
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(self.to_bytes())
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
@@ -0,0 +1,227 @@
+import cProfile
+import io
+import itertools
+import marshal
+import os
+import pstats
+import random
+import time
+import tracemalloc
+
+from pb_logic import count_pb_in_sequence
+from mb_logic import count_mb_in_sequence
+from p5_logic import count_p5_in_sequence
+from m5_logic import count_m5_in_sequence
+from p10_logic import count_p10_in_sequence
+from m10_logic import count_m10_in_sequence
+from p15_logic import count_p15_in_sequence
+from m15_logic import count_m15_in_sequence
+from problem_generater import (apply_signs, arrange_terms, create_digits_pool, create_non_zero_terms, create_zero_terms,
+                               generate_single_problem)
+
+# 環境変数 GENERATION_PROFILE=1 でプロファイルを有効にする（アプリでは隠しトグルの既定値になる）
+PROFILE_ENV = "GENERATION_PROFILE"
+# 表示する関数・メモリ確保箇所の数
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 10
+# 注目する関数ごとのメモリ確保量を測るときの呼び出し回数
+FOCUS_CALLS = 20
+
+COUNT_FUNCTIONS = [
+    count_pb_in_sequence, count_mb_in_sequence, count_p5_in_sequence, count_m5_in_sequence,
+    count_p10_in_sequence, count_m10_in_sequence, count_p15_in_sequence, count_m15_in_sequence,
+]
+# 報告で個別に取り上げる関数（生成本体、組み合わせ・符号の段階、各 count_*_in_sequence）
+FOCUS_FUNCTIONS = ["generate_single_problem", "create_non_zero_terms", "create_zero_terms", "apply_signs",
+                   "arrange_terms", "iter_arrangements", "classify_sequence", "classify_sequence_within"] + \
+                  [func.__name__ for func in COUNT_FUNCTIONS]
+
+
+def profiling_enabled():
+    """環境変数でプロファイルが有効にされているか"""
+    return os.environ.get(PROFILE_ENV, "").lower() in ("1", "true", "yes", "on")
+
+
+class GenerationProfiler:
+    """
+    生成処理を cProfile と tracemalloc で計測する
+    with ブロック（または wrap() した生成関数）の中で動いた処理だけを計測する
+    cProfile は計測を始めたスレッドしか見ないので、バックグラウンドで生成するときは wrap() を使う
+    （並列生成のワーカープロセスの中は計測されない）
+    """
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.peak_bytes = 0
+        self.snapshot = None
+        self.seconds = 0.0
+        self.focus_peaks = {}
+        self._started_tracemalloc = False
+        self._start_time = None
+
+    def __enter__(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        tracemalloc.reset_peak()
+        self._start_time = time.perf_counter()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.disable()
+        self.seconds += time.perf_counter() - self._start_time
+        self.peak_bytes = max(self.peak_bytes, tracemalloc.get_traced_memory()[1])
+        self.snapshot = tracemalloc.take_snapshot()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def wrap(self, produce, config=None):
+        """
+        GenerationJob に渡す produce(cancel_event) を、生成スレッドの中で計測するように包む
+        生成が終わったら（途中で打ち切られても）、見つかった問題で count_*_in_sequence なども計測する
+        """
+        def profiled(cancel_event):
+            problems = []
+            try:
+                with self:
+                    for problem in produce(cancel_event):
+                        problems.append(problem)
+                        yield problem
+            finally:
+                self.measure_focus(problems, config=config)
+        return profiled
+
+    def measure_focus(self, problems, num_digits=None, config=None):
+        """
+        注目する関数を見つかった問題で単独に呼び直し、1回あたりの時間とメモリ確保のピークを測る
+        生成では classify_sequence を使うので、count_*_in_sequence はここで同じ問題に対して呼んで計測する
+        （cProfile の記録には含めないので、生成全体の計測結果は変わらない）
+        problems: [(数列, 答え, カウント), ...] や ProblemSet
+        config: (桁数, 口数, 0の数, マイナスの数)（指定すると生成の各段階も測る）
+        """
+        sequences = [terms for terms, _, _ in itertools.islice(problems, FOCUS_CALLS)]
+        if not sequences:
+            return
+        if num_digits is None:
+            num_digits = config[0] if config is not None else len(str(abs(sequences[0][0])))
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        try:
+            for func in COUNT_FUNCTIONS:
+                self.focus_peaks[func.__name__] = _measure_calls(lambda: [func(seq, num_digits) for seq in sequences],
+                                                                 len(sequences))
+            if config is not None:
+                self._measure_generation_steps(config)
+        finally:
+            if started:
+                tracemalloc.stop()
+
+    def _measure_generation_steps(self, config):
+        num_digits, num_lines, zero_count, minus_count = config
+        rng = random.Random(0)
+
+        def pairing():
+            pool = create_digits_pool(num_digits, num_lines, zero_count, rng)
+            rng.shuffle(pool)
+            zero_terms = create_zero_terms(pool, zero_count, num_digits, rng)
+            return zero_terms, create_non_zero_terms(pool, num_digits, rng=rng)
+
+        paired = []
+        for _ in range(FOCUS_CALLS):
+            zero_terms, (terms, ok) = pairing()
+            if ok:
+                paired.append(zero_terms + terms)
+
+        self.focus_peaks["generate_single_problem"] = _measure_calls(
+            lambda: [generate_single_problem(num_digits, num_lines, zero_count, minus_count, rng=rng)
+                     for _ in range(FOCUS_CALLS)], FOCUS_CALLS)
+        self.focus_peaks["create_non_zero_terms"] = _measure_calls(
+            lambda: [pairing() for _ in range(FOCUS_CALLS)], FOCUS_CALLS)
+        self.focus_peaks["apply_signs"] = _measure_calls(
+            lambda: [apply_signs(terms[:], minus_count, rng) for terms in paired], len(paired))
+        self.focus_peaks["arrange_terms"] = _measure_calls(
+            lambda: [arrange_terms(terms[:], minus_count, num_digits, rng) for terms in paired], len(paired))
+
+    def stats(self):
+        return pstats.Stats(self.profile)
+
+    def top_functions(self, limit=TOP_FUNCTIONS):
+        """累積時間の長い順に [(関数, 呼び出し回数, 自身の時間, 累積時間), ...]"""
+        rows = []
+        for (filename, line, name), (_, calls, tottime, cumtime, _) in self.stats().stats.items():
+            rows.append((f"{name} ({os.path.basename(filename)}:{line})", calls, tottime, cumtime))
+        rows.sort(key=lambda row: row[3], reverse=True)
+        return rows[:limit]
+
+    def focus_rows(self):
+        """
+        注目する関数ごとの [(関数, 生成中の呼び出し回数, 生成中の累積時間,
+                             単独で測った1回あたりの時間, 1回あたりのメモリ確保のピーク[バイト]), ...]
+        単独で測っていない関数は、後ろの2つが None
+        """
+        totals = {}
+        for (_, _, name), (_, calls, _, cumtime, _) in self.stats().stats.items():
+            if name in FOCUS_FUNCTIONS:
+                previous_calls, previous_time = totals.get(name, (0, 0.0))
+                totals[name] = (previous_calls + calls, previous_time + cumtime)
+        rows = []
+        for name in FOCUS_FUNCTIONS:
+            if name in totals or name in self.focus_peaks:
+                calls, cumtime = totals.get(name, (0, 0.0))
+                per_call_seconds, peak = self.focus_peaks.get(name, (None, None))
+                rows.append((name, calls, cumtime, per_call_seconds, peak))
+        return rows
+
+    def top_allocations(self, limit=TOP_ALLOCATIONS):
+        """計測の終わりに残っていたメモリの多い箇所 [(ファイル:行, バイト数, 個数), ...]"""
+        if self.snapshot is None:
+            return []
+        rows = []
+        for stat in self.snapshot.statistics("lineno")[:limit]:
+            frame = stat.traceback[0]
+            rows.append((f"{os.path.basename(frame.filename)}:{frame.lineno}", stat.size, stat.count))
+        return rows
+
+    def report(self):
+        """人が読む形式の報告（バグ報告に貼り付ける用）"""
+        lines = [f"計測時間: {self.seconds:.3f}秒  メモリ確保のピーク: {self.peak_bytes / 1024:.1f} KB", ""]
+        lines.append("注目する関数: 生成中の呼び出し回数 / 累積時間[秒] / 単独で測った1回あたりの時間[ms]・メモリ確保のピーク[KB]")
+        for name, calls, cumtime, per_call_seconds, peak in self.focus_rows():
+            time_text = "-" if per_call_seconds is None else f"{per_call_seconds * 1000:.3f}"
+            peak_text = "-" if peak is None else f"{peak / 1024:.1f}"
+            lines.append(f"  {name:<28} {calls:>9} {cumtime:>10.4f} {time_text:>10} {peak_text:>10}")
+        lines.append("")
+        lines.append("累積時間の上位: 呼び出し回数 / 自身の時間[秒] / 累積時間[秒]")
+        for name, calls, tottime, cumtime in self.top_functions():
+            lines.append(f"  {calls:>9} {tottime:>10.4f} {cumtime:>10.4f}  {name}")
+        lines.append("")
+        lines.append("計測の終わりに残っていたメモリ: バイト数 / 個数")
+        for where, size, count in self.top_allocations():
+            lines.append(f"  {size:>10} {count:>7}  {where}")
+        return "\n".join(lines)
+
+    def pstats_text(self):
+        """pstats の標準形式（累積時間順）の文字列"""
+        buffer = io.StringIO()
+        pstats.Stats(self.profile, stream=buffer).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        return buffer.getvalue()
+
+    def to_bytes(self):
+        """pstats.Stats(ファイル名) や snakeviz で読み込める .prof 形式のバイト列"""
+        self.profile.create_stats()
+        return marshal.dumps(self.profile.stats)
+
+
+def _measure_calls(func, calls):
+    # tracemalloc が動いている前提で、func() の所要時間とメモリ確保のピークを呼び出し1回あたりにして返す
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    peak = max(tracemalloc.get_traced_memory()[1] - before, 0)
+    calls = max(calls, 1)
+    return seconds / calls, peak / calls
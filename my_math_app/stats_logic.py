@@ -0,0 +1,77 @@
+import json
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+# 表示用の名前
+STAT_LABELS = {
+    "candidates": "生成試行",
+    "generation_failures": "生成失敗（1000回試行で見つからず）",
+    "valid_candidates": "条件を満たした候補",
+    "accepted": "目標に一致して採用",
+    "rejected_by_targets": "目標に不一致で破棄",
+    "single_problem_iterations": "generate_single_problem 内の試行",
+    "pairing_shuffles": "組み合わせ作成のシャッフル",
+    "repdigit_rejections": "ゾロ目による組み合わせ失敗",
+    "pairing_failures": "組み合わせ失敗（50回シャッフルで作れず）",
+    "duplicate_absolute_values": "絶対値の重複",
+    "cumulative_sum_out_of_range": "並べ方・符号が見つからず（累積和が範囲外）",
+    "batch_rows": "一括生成の行数",
+    "duplicate_problems": "出題済みの問題と重複",
+    "exact_draw_rejections": "厳密抽出で破棄（絶対値の重複・数字の偏り）",
+    "adaptive_dead_ends": "適応生成で行き詰まり（条件を満たす最上位の数字がない）",
+    "generate": "生成時間",
+    "classify": "判定時間",
+    "count": "数え上げ時間",
+}
+
+
+class GenerationStats:
+    """
+    生成の各段階での棄却数と所要時間を集計する
+    生成関数に stats=None（既定）を渡したときは何も記録しない
+    """
+
+    def __init__(self):
+        self.counters = Counter()
+        self.timers = defaultdict(float)
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def add_time(self, name, seconds):
+        self.timers[name] += seconds
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] += time.perf_counter() - start
+
+    def merge(self, other):
+        """別の GenerationStats または to_dict() の結果を足し合わせる"""
+        data = other.to_dict() if isinstance(other, GenerationStats) else other
+        self.counters.update(data["counters"])
+        for name, seconds in data["timers"].items():
+            self.timers[name] += seconds
+
+    def to_dict(self):
+        return {"counters": dict(self.counters), "timers": dict(self.timers)}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+
+    def rows(self):
+        """画面表示用に (項目, 値) のリストを返す"""
+        rows = []
+        for name, value in sorted(self.counters.items()):
+            if name.startswith("target_mismatch_"):
+                label = f"目標に不一致: {name[len('target_mismatch_'):].upper()}"
+            else:
+                label = STAT_LABELS.get(name, name)
+            rows.append((label, value))
+        for name, seconds in sorted(self.timers.items()):
+            rows.append((STAT_LABELS.get(name, name) + " [秒]", round(seconds, 4)))
+        return rows
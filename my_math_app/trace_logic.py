@@ -0,0 +1,42 @@
+from collections import namedtuple
+
+# 1回の技法発生を表す記録
+# line: 何口目か(1始まり), column: 位(0=一の位), technique: "P10" など
+# before: 操作前の盤面の数字, operand: 足す/引く数字, after: 操作後の盤面の数字
+TraceEvent = namedtuple("TraceEvent", ["line", "column", "technique", "before", "operand", "after"])
+
+COLUMN_NAMES = ["一", "十", "百", "千", "万", "十万"]
+MINUS_TECHNIQUES = ("MB", "M5", "M10", "M15")
+
+
+class Tracer:
+    """
+    シミュレーターの操作記録を集める
+    シミュレーターには tracer=None（既定）を渡せば記録処理は一切行われないので、生成時の速度には影響しない
+    """
+    __slots__ = ("events", "line")
+
+    def __init__(self):
+        self.events = []
+        self.line = 0
+
+    def begin_line(self):
+        """次の口（項）に進む"""
+        self.line += 1
+
+    def record(self, column, technique, before, operand, after):
+        self.events.append(TraceEvent(self.line, column, technique, before, operand, after))
+
+    def render(self):
+        """記録を説明用の文字列リストにする"""
+        return [render_event(event) for event in self.events]
+
+
+def column_name(column):
+    return COLUMN_NAMES[column] if column < len(COLUMN_NAMES) else f"10^{column}"
+
+
+def render_event(event):
+    op = "-" if event.technique in MINUS_TECHNIQUES else "+"
+    return (f"{event.line}口目 {column_name(event.column)}の位: {event.technique} "
+            f"{event.before}{op}{event.operand} -> {event.after}")